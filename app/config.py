@@ -1,15 +1,46 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
 
 class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./bakery.db"
+    db_pool_size: int = 5  # 常に保持する接続数
+    db_max_overflow: int = 10  # pool_size を超えて一時的に作成できる接続数
+    db_pool_timeout: int = 30  # 接続が空くまで待つ秒数
+    db_pool_pre_ping: bool = True  # 接続を貸し出す前に生存確認する (切断された接続を使わない)
+    db_pool_recycle: int = 1800  # この秒数より古い接続は作り直す (-1 で無効)
+    database_replica_url: Optional[str] = None  # 読み込み専用のレプリカ (GETの読み込みに使用)
+    read_your_writes_seconds: float = 5.0  # 書き込み後、この秒数はその店舗の読み込みもプライマリで行う
+
+    # SQLite (接続ごとに PRAGMA で設定)
+    sqlite_tuning_enabled: bool = True  # Falseの場合はSQLiteの既定値のまま
+    sqlite_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"] = "WAL"
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000  # ロック解除を待つミリ秒数
+    sqlite_mmap_size: int = 268_435_456  # メモリマップI/Oのサイズ (バイト、0で無効)
+    sqlite_cache_size: int = -64_000  # ページキャッシュ (負の値はKiB単位)
+
+    # シャーディング (店舗のデータをユーザーとは別のデータベースに置く)
+    shard_urls: Dict[str, str] = {}  # シャードグループ (キー → 接続URL、JSONで指定)
+    shard_url_template: Optional[str] = None  # 店舗ごとに1つ (例: sqlite:///./shards/{shard}.db)
+    shard_id_range_size: int = 100_000_000  # PostgreSQL のシャードごとの ID の範囲 (n 番目のシャードは n × この値から)
+
+    # PostgreSQL
+    pg_statement_timeout_ms: int = 30_000  # 1文の実行時間の上限 (0 で無制限)
+    pg_copy_enabled: bool = True  # 一括登録・書き出しで COPY を使う
+
+    # 応答キャッシュ (一覧・詳細などの読み込み、書き込みのコミット時に無効化)
+    response_cache_enabled: Optional[bool] = None  # 未指定なら共有キャッシュ (RESPONSE_CACHE_BACKEND) がある場合のみ有効
+    response_cache_max_bytes: int = 64 * 1024 * 1024  # キャッシュの合計サイズの上限
+    response_cache_backend: Optional[str] = None  # 共有キャッシュの実装 ("モジュール:クラス"、既定はプロセス内)
+    response_cache_ttl_seconds: Optional[float] = 5.0  # プロセス内のキャッシュの有効期間 (他のワーカーの書き込みの反映までの上限)
 
     # Security
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    admin_store_ids: List[str] = []  # サーバー全体の診断を見られる店舗ID (JSONで指定、空なら誰も見られない)
     password_reset_token_expire_hours: int = 24
 
     # Email
@@ -22,6 +53,10 @@ class Settings(BaseSettings):
     # App
     app_name: str = "Bakery Cost Calculator"
 
+    # Monte Carlo simulation
+    monte_carlo_max_workers: Optional[int] = None  # Noneの場合はCPU数
+    monte_carlo_parallel_threshold: int = 2_000_000  # シナリオ数×商品数がこれ以上ならプロセスプールで実行
+
     class Config:
         env_file = ".env"
 
@@ -1,25 +1,257 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Callable, Dict, Optional
+from fastapi import Request
+from sqlalchemy import Select, create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.config import settings
+from app.sharding.registry import DIRECTORY_TABLES, ShardRegistry
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def is_postgresql(url: str) -> bool:
+    return make_url(url).get_backend_name() == "postgresql"
+
+
+def is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:"))
+
+
+def engine_options(url: str) -> dict:
+    """接続URLに応じたエンジンのオプション (接続プールの大きさなど)"""
+    if is_sqlite_memory(url):
+        # インメモリDBは接続ごとに別のDBになるため、1つの接続を共有する
+        return {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool}
+
+    options = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+    elif is_postgresql(url) and settings.pg_statement_timeout_ms:
+        # 接続ごとにサーバー側で設定 (長時間のクエリが接続を占有し続けないように)
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.pg_statement_timeout_ms}"}
+    return options
+
+
+def sqlite_pragmas() -> dict:
+    """接続ごとに設定する SQLite の PRAGMA"""
+    if not settings.sqlite_tuning_enabled:
+        return {}
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        "mmap_size": settings.sqlite_mmap_size,
+        "cache_size": settings.sqlite_cache_size,
+    }
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """新しい接続に PRAGMA を設定 (engine の connect イベント)"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+# ドライバの指定がない場合に使う同期ドライバ (PostgreSQL は非同期と同じ psycopg 3)
+SYNC_DRIVERS = {
+    "postgresql": "postgresql+psycopg",
+}
+
+
+def sync_database_url(url: str) -> str:
+    """ドライバの指定がない接続URLに既定の同期ドライバを設定"""
+    parsed = make_url(url)
+    if parsed.drivername in SYNC_DRIVERS:
+        parsed = parsed.set(drivername=SYNC_DRIVERS[parsed.drivername])
+    return parsed.render_as_string(hide_password=False)
+
+
+# 非同期ドライバ (同期用のURLのドライバを置き換える)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+psycopg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """同期用の接続URLを非同期ドライバのURLに変換"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"非同期ドライバに対応していないデータベースです: {backend}")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+class RecentWrites:
+    """店舗ごとの最後の書き込み時刻 (書き込み直後の読み込みをプライマリに向けるため)
+
+    プロセス内で保持するため、ワーカーごとに独立している。
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._written_at: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._written_at[user_id] = now
+            # 期限切れの記録を削除
+            expired = [uid for uid, at in self._written_at.items() if now - at > self.window_seconds]
+            for uid in expired:
+                del self._written_at[uid]
+
+    def is_recent(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            written_at = self._written_at.get(user_id)
+        return written_at is not None and time.monotonic() - written_at <= self.window_seconds
+
+
+recent_writes = RecentWrites(settings.read_your_writes_seconds)
+
+
+class RoutingSession(Session):
+    """読み込みをレプリカ、書き込みをプライマリに振り分けるセッション
+
+    info["use_replica"] が True の場合だけ SELECT をレプリカに送る (GET リクエスト)。
+    info["user_id"] の店舗が直近に書き込んだ場合は、読み込みもプライマリで行う。
+    info["shard"] が設定されている場合は、ユーザー以外のテーブルをその店舗のシャードで読み書きする。
+    """
+
+    def __init__(self, *args, primary: Engine = None, replica: Optional[Engine] = None,
+                 shard_engine: Optional[Callable[[str], Engine]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+        self.replica = replica
+        self.shard_engine = shard_engine
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        shard = self.info.get("shard")
+        if shard is not None and self.shard_engine is not None and not is_directory_mapper(mapper):
+            return self.shard_engine(shard)
+        if self.use_replica_for(clause):
+            return self.replica
+        return self.primary
+
+    def use_replica_for(self, clause) -> bool:
+        return (
+            self.replica is not None
+            and self.info.get("use_replica", False)
+            and not self._flushing
+            and isinstance(clause, Select)
+            and not recent_writes.is_recent(self.info.get("user_id"))
+        )
+
+
+def is_directory_mapper(mapper) -> bool:
+    """ユーザーなど、シャーディングしてもディレクトリに置くテーブルのモデルか"""
+    return mapper is not None and mapper.local_table.name in DIRECTORY_TABLES
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _record_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_recent_write(session):
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        recent_writes.mark(session.info["user_id"])
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _clear_write(session):
+    session.info.pop("wrote", None)
+
+
+def create_configured_engine(url: str) -> Engine:
+    """接続プールと SQLite の PRAGMA を設定したエンジンを作成"""
+    created = create_engine(sync_database_url(url), **engine_options(url))
+    if is_sqlite(url):
+        event.listen(created, "connect", apply_sqlite_pragmas)
+    return created
+
+
+def create_configured_async_engine(url: str) -> AsyncEngine:
+    """非同期ドライバのエンジンを作成 (接続設定は同期エンジンと同じ)"""
+    created = create_async_engine(async_database_url(url), **engine_options(url))
+    if is_sqlite(url):
+        event.listen(created.sync_engine, "connect", apply_sqlite_pragmas)
+    return created
+
 
 # Create engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
+engine = create_configured_engine(settings.database_url)
+replica_engine = (
+    create_configured_engine(settings.database_replica_url) if settings.database_replica_url else None
+)
+
+# 非同期エンジン (一覧取得などの読み込み用)
+async_engine = create_configured_async_engine(settings.database_url)
+async_replica_engine = (
+    create_configured_async_engine(settings.database_replica_url) if settings.database_replica_url else None
+)
+
+# 店舗ごとのシャード (SHARD_URLS / SHARD_URL_TEMPLATE を設定した場合だけ使う)
+shards = ShardRegistry(
+    settings.shard_urls, settings.shard_url_template,
+    create_configured_engine, create_configured_async_engine
 )
 
 # Create session
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False,
+    primary=engine, replica=replica_engine,
+    shard_engine=shards.engine if shards.enabled else None
+)
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False,
+    primary=async_engine.sync_engine,
+    replica=async_replica_engine.sync_engine if async_replica_engine else None,
+    shard_engine=shards.async_sync_engine if shards.enabled else None
+)
 
 # Base class for models
 Base = declarative_base()
 
 
+def is_read_request(request: Request) -> bool:
+    return request.method in ("GET", "HEAD")
+
+
 # Dependency to get DB session
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    db.info["use_replica"] = is_read_request(request)
     try:
         yield db
     finally:
         db.close()
+
+
+# Dependency to get async DB session
+async def get_async_db(request: Request):
+    async with AsyncSessionLocal() as db:
+        db.sync_session.info["use_replica"] = is_read_request(request)
+        yield db
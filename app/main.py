@@ -3,12 +3,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
-from app.database import engine, Base
-from app.routes import auth, materials, recipes, fixed_costs, products, labels
+from app.database import SessionLocal, engine, shards
+from app.routes import (
+    auth, materials, recipes, fixed_costs, products, labels, production, inventory, diagnostics, export
+)
 from app.config import settings
+from app.migrations import run_migrations
+from app.sharding.stores import migrate_shards
 
-# データベーステーブルの作成
-Base.metadata.create_all(bind=engine)
+# データベースのマイグレーション (未適用のものだけを適用)
+run_migrations(engine)
+if shards.enabled:
+    with SessionLocal() as db:
+        migrate_shards(db)
 
 # FastAPIアプリケーションの作成
 app = FastAPI(
@@ -24,6 +31,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # 静的ファイルとテンプレートの設定
@@ -37,6 +45,10 @@ app.include_router(recipes.router)
 app.include_router(fixed_costs.router)
 app.include_router(products.router)
 app.include_router(labels.router)
+app.include_router(production.router)
+app.include_router(inventory.router)
+app.include_router(diagnostics.router)
+app.include_router(export.router)
 
 
 @app.get("/", response_class=HTMLResponse)
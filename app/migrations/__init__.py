@@ -0,0 +1,92 @@
+"""
+データベースのスキーママイグレーション
+
+versions/ 以下の vNNNN_*.py を番号順に1回ずつ適用し、適用済みの番号を
+schema_migrations テーブルに記録する。各モジュールは upgrade(connection) を定義する。
+テーブルはモデルではなく各マイグレーションに書いた定義から作成するため、モデルを変更した場合は
+同じ変更をするマイグレーションを追加する。マイグレーション導入前のデータベースに対応するため、
+v0001・v0002 だけは存在しないテーブル・列だけを作成する。
+
+使用方法:
+python -m app.migrations          # 未適用のマイグレーションを適用
+python -m app.migrations --check  # インデックスが使われるかを EXPLAIN QUERY PLAN で確認
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+from types import ModuleType
+from typing import List, Tuple
+from sqlalchemy import Column, DateTime, MetaData, String, Table, select, text
+from sqlalchemy.engine import Connection, Engine
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", String(20), primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+
+def discover_migrations() -> List[Tuple[str, str, ModuleType]]:
+    """versions パッケージから (番号, 名前, モジュール) を番号順に返す"""
+    from app.migrations import versions
+
+    migrations = []
+    for module_info in pkgutil.iter_modules(versions.__path__):
+        if not module_info.name.startswith("v"):
+            continue
+        version, _, name = module_info.name[1:].partition("_")
+        module = importlib.import_module(f"{versions.__name__}.{module_info.name}")
+        migrations.append((version, name, module))
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def applied_versions(connection: Connection) -> List[str]:
+    """適用済みのマイグレーション番号"""
+    return [version for (version,) in connection.execute(
+        select(schema_migrations.c.version).order_by(schema_migrations.c.version)
+    )]
+
+
+def run_migrations(engine: Engine) -> List[str]:
+    """未適用のマイグレーションを1つずつトランザクション内で適用し、適用した番号を返す"""
+    with engine.begin() as connection:
+        metadata.create_all(connection)
+        applied = set(applied_versions(connection))
+
+    newly_applied = []
+    for version, name, module in discover_migrations():
+        if version in applied:
+            continue
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        newly_applied.append(version)
+    return newly_applied
+
+
+def explain_query_plan(connection: Connection, sql: str, params: dict = None) -> List[str]:
+    """SQLite の EXPLAIN QUERY PLAN の結果 (detail 列) を返す"""
+    rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params or {})
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(connection: Connection) -> List[dict]:
+    """各マイグレーションの QUERY_PLAN_CHECKS が想定どおりのインデックスを使うかを確認"""
+    results = []
+    for version, _, module in discover_migrations():
+        for sql, params, index_name in getattr(module, "QUERY_PLAN_CHECKS", ()):
+            plan = explain_query_plan(connection, sql, params)
+            results.append({
+                "version": version,
+                "sql": sql,
+                "index": index_name,
+                "plan": plan,
+                "ok": any(f"INDEX {index_name}" in detail for detail in plan)
+            })
+    return results
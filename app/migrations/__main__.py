@@ -0,0 +1,24 @@
+import sys
+from app.database import engine
+from app.migrations import check_query_plans, run_migrations
+
+
+def main(argv) -> int:
+    if "--check" not in argv:
+        applied = run_migrations(engine)
+        print(f"適用したマイグレーション: {', '.join(applied) if applied else 'なし'}")
+
+    if engine.dialect.name != "sqlite":
+        return 0
+
+    failed = 0
+    with engine.connect() as connection:
+        for result in check_query_plans(connection):
+            status = "OK" if result["ok"] else "NG"
+            failed += not result["ok"]
+            print(f"[{status}] {result['index']}: {' / '.join(result['plan'])}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
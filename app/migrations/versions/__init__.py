@@ -0,0 +1 @@
+# マイグレーション (vNNNN_名前.py を番号順に適用)
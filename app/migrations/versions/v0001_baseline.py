@@ -0,0 +1,122 @@
+"""初期スキーマ (マイグレーション導入前の最初のバージョンのテーブル)
+
+モデルは変更されていくため、ここではモデルを使わずに当時のテーブル定義を書き写しておく。
+マイグレーション導入前に作成したデータベースでは、存在するテーブルはそのまま残す。
+"""
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table
+)
+from sqlalchemy.engine import Connection
+
+metadata = MetaData()
+
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("store_id", String(100), unique=True, nullable=False, index=True),
+    Column("email", String(255), unique=True, nullable=False, index=True),
+    Column("hashed_password", String(255), nullable=False),
+    Column("store_name", String(255), nullable=False),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "password_reset_tokens", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("token", String(255), unique=True, nullable=False, index=True),
+    Column("is_used", Boolean),
+    Column("expires_at", DateTime, nullable=False),
+    Column("created_at", DateTime),
+)
+
+Table(
+    "materials", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("name", String(255), nullable=False),
+    Column("purchase_price", Float, nullable=False),
+    Column("purchase_quantity", Float, nullable=False),
+    Column("unit", String(50), nullable=False),
+    Column("unit_price", Float, nullable=False),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "recipes", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("name", String(255), nullable=False),
+    Column("description", String(1000)),
+    Column("material_cost", Float),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "recipe_materials", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("recipe_id", Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False),
+    Column("material_id", Integer, ForeignKey("materials.id", ondelete="CASCADE"), nullable=False),
+    Column("quantity", Float, nullable=False),
+)
+
+Table(
+    "fixed_costs", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("name", String(255), nullable=False),
+    Column("monthly_amount", Float, nullable=False),
+    Column("is_active", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("recipe_id", Integer, ForeignKey("recipes.id", ondelete="SET NULL")),
+    Column("name", String(255), nullable=False),
+    Column("include_fixed_cost", Boolean),
+    Column("fixed_cost_per_unit", Float),
+    Column("material_cost", Float),
+    Column("total_cost", Float),
+    Column("profit_margin", Float),
+    Column("suggested_price", Float),
+    Column("selling_price", Float),
+    Column("actual_profit_margin", Float),
+    Column("actual_profit_amount", Float),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+Table(
+    "label_settings", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("preset_name", String(255), nullable=False),
+    Column("label_width", Float, nullable=False),
+    Column("label_height", Float, nullable=False),
+    Column("margin_top", Float),
+    Column("margin_bottom", Float),
+    Column("margin_left", Float),
+    Column("margin_right", Float),
+    Column("show_price", Boolean),
+    Column("show_ingredients", Boolean),
+    Column("show_expiry_date", Boolean),
+    Column("show_store_name", Boolean),
+    Column("show_logo", Boolean),
+    Column("logo_path", String(500)),
+    Column("is_default", Boolean),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+
+def upgrade(connection: Connection) -> None:
+    # create_all は存在しないテーブルだけを作成する
+    metadata.create_all(connection)
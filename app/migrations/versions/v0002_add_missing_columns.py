@@ -0,0 +1,84 @@
+"""マイグレーション導入前に追加した列とテーブル (原価計算・価格履歴・在庫)
+
+マイグレーション導入前のデータベースは、作成したときのバージョンによって
+一部の列・テーブルをすでに持っているため、このマイグレーションだけは存在しないものだけを追加する。
+テーブルの定義は導入直前のものを書き写しておく (モデルは変更されていくため)。
+"""
+from sqlalchemy import (
+    Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, inspect, text
+)
+from sqlalchemy.engine import Connection
+
+# テーブル → (列名, 列定義)
+COLUMNS = {
+    "materials": [
+        ("density", "FLOAT"),
+    ],
+    "recipes": [
+        ("yield_quantity", "FLOAT DEFAULT 1"),
+        ("loss_rate", "FLOAT DEFAULT 0"),
+    ],
+    "recipe_materials": [
+        ("input_quantity", "FLOAT"),
+        ("input_unit", "VARCHAR(50)"),
+    ],
+}
+
+metadata = MetaData()
+
+# 外部キーの参照先 (既存のテーブル、列は参照に必要なものだけ)
+for name in ("users", "materials", "recipes"):
+    Table(name, metadata, Column("id", Integer, primary_key=True))
+
+Table(
+    "recipe_sub_recipes", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("recipe_id", Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False),
+    Column("sub_recipe_id", Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False),
+    Column("quantity", Float, nullable=False),
+)
+
+Table(
+    "material_price_history", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("material_id", Integer, ForeignKey("materials.id", ondelete="CASCADE"), nullable=False),
+    Column("purchase_price", Float, nullable=False),
+    Column("purchase_quantity", Float, nullable=False),
+    Column("unit_price", Float, nullable=False),
+    Column("effective_at", DateTime, nullable=False),
+    Index("ix_material_price_history_material_effective", "material_id", "effective_at"),
+)
+
+Table(
+    "inventory_transactions", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+    Column("material_id", Integer, ForeignKey("materials.id", ondelete="CASCADE"), nullable=False),
+    Column("transaction_type", String(20), nullable=False),
+    Column("quantity", Float, nullable=False),
+    Column("note", String(500)),
+    Column("created_at", DateTime),
+    Index("ix_inventory_transactions_material_created", "material_id", "created_at"),
+)
+
+Table(
+    "inventory_balances", metadata,
+    Column("material_id", Integer, ForeignKey("materials.id", ondelete="CASCADE"), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True),
+    Column("quantity", Float, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+NEW_TABLES = ["recipe_sub_recipes", "material_price_history", "inventory_transactions", "inventory_balances"]
+
+
+def upgrade(connection: Connection) -> None:
+    inspector = inspect(connection)
+    for table, columns in COLUMNS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        for name, definition in columns:
+            if name not in existing:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+
+    metadata.create_all(connection, tables=[metadata.tables[name] for name in NEW_TABLES])
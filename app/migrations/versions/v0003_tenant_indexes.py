@@ -0,0 +1,51 @@
+"""店舗 (user_id) で絞り込むクエリと、レシピの中間テーブル用のインデックス"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# (インデックス名, テーブル, 列)
+INDEXES = [
+    ("ix_materials_user_id_id", "materials", ("user_id", "id")),
+    ("ix_recipes_user_id_id", "recipes", ("user_id", "id")),
+    ("ix_products_user_id_id", "products", ("user_id", "id")),
+    ("ix_products_recipe_id", "products", ("recipe_id",)),
+    ("ix_fixed_costs_user_id_id", "fixed_costs", ("user_id", "id")),
+    ("ix_fixed_costs_user_id_is_active", "fixed_costs", ("user_id", "is_active")),
+    ("ix_label_settings_user_id_id", "label_settings", ("user_id", "id")),
+    ("ix_label_settings_user_id_is_default", "label_settings", ("user_id", "is_default")),
+    ("ix_recipe_materials_recipe_id", "recipe_materials", ("recipe_id",)),
+    ("ix_recipe_materials_material_id", "recipe_materials", ("material_id",)),
+    ("ix_recipe_sub_recipes_recipe_id", "recipe_sub_recipes", ("recipe_id",)),
+    ("ix_recipe_sub_recipes_sub_recipe_id", "recipe_sub_recipes", ("sub_recipe_id",)),
+    ("ix_inventory_transactions_user_created", "inventory_transactions", ("user_id", "created_at")),
+]
+
+# (SQL, パラメータ, 使われるべきインデックス) ― アプリが発行する代表的なクエリ
+QUERY_PLAN_CHECKS = [
+    ("SELECT * FROM materials WHERE user_id = :user_id LIMIT 100 OFFSET 0",
+     {"user_id": 1}, "ix_materials_user_id_id"),
+    ("SELECT * FROM recipes WHERE user_id = :user_id LIMIT 100 OFFSET 0",
+     {"user_id": 1}, "ix_recipes_user_id_id"),
+    ("SELECT * FROM products WHERE user_id = :user_id LIMIT 100 OFFSET 0",
+     {"user_id": 1}, "ix_products_user_id_id"),
+    ("SELECT * FROM products WHERE recipe_id IN (1, 2, 3)",
+     {}, "ix_products_recipe_id"),
+    ("SELECT SUM(monthly_amount) FROM fixed_costs WHERE user_id = :user_id AND is_active = 1",
+     {"user_id": 1}, "ix_fixed_costs_user_id_is_active"),
+    ("SELECT * FROM label_settings WHERE user_id = :user_id AND is_default = 1",
+     {"user_id": 1}, "ix_label_settings_user_id_is_default"),
+    ("SELECT * FROM recipe_materials WHERE recipe_id IN (1, 2, 3)",
+     {}, "ix_recipe_materials_recipe_id"),
+    ("SELECT DISTINCT recipe_id FROM recipe_materials WHERE material_id IN (1, 2, 3)",
+     {}, "ix_recipe_materials_material_id"),
+    ("SELECT DISTINCT recipe_id FROM recipe_sub_recipes WHERE sub_recipe_id IN (1, 2, 3)",
+     {}, "ix_recipe_sub_recipes_sub_recipe_id"),
+    ("SELECT * FROM inventory_transactions WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 100",
+     {"user_id": 1}, "ix_inventory_transactions_user_created"),
+]
+
+
+def upgrade(connection: Connection) -> None:
+    for name, table, columns in INDEXES:
+        connection.execute(text(
+            f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+        ))
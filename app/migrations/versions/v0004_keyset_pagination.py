@@ -0,0 +1,30 @@
+"""キーセット方式のページング (WHERE user_id = ? AND id > ? ORDER BY id) 用のインデックス"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# (インデックス名, テーブル, 列)
+INDEXES = [
+    ("ix_inventory_transactions_user_id_id", "inventory_transactions", ("user_id", "id")),
+]
+
+# 一覧取得は (user_id, id) のインデックスを範囲検索し、並べ替えを行わないこと
+QUERY_PLAN_CHECKS = [
+    ("SELECT * FROM materials WHERE user_id = :user_id AND id > :after ORDER BY id LIMIT 101",
+     {"user_id": 1, "after": 100}, "ix_materials_user_id_id"),
+    ("SELECT * FROM recipes WHERE user_id = :user_id AND id > :after ORDER BY id LIMIT 101",
+     {"user_id": 1, "after": 100}, "ix_recipes_user_id_id"),
+    ("SELECT * FROM products WHERE user_id = :user_id AND id > :after ORDER BY id LIMIT 101",
+     {"user_id": 1, "after": 100}, "ix_products_user_id_id"),
+    ("SELECT * FROM fixed_costs WHERE user_id = :user_id AND id > :after ORDER BY id LIMIT 101",
+     {"user_id": 1, "after": 100}, "ix_fixed_costs_user_id_id"),
+    ("SELECT * FROM inventory_transactions WHERE user_id = :user_id AND id < :before "
+     "ORDER BY id DESC LIMIT 101",
+     {"user_id": 1, "before": 100}, "ix_inventory_transactions_user_id_id"),
+]
+
+
+def upgrade(connection: Connection) -> None:
+    for name, table, columns in INDEXES:
+        connection.execute(text(
+            f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+        ))
@@ -0,0 +1,8 @@
+"""店舗のシャード (users.shard_key) の列とインデックス"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text("ALTER TABLE users ADD COLUMN shard_key VARCHAR(100)"))
+    connection.execute(text("CREATE INDEX ix_users_shard_key ON users (shard_key)"))
@@ -0,0 +1,12 @@
+"""価格履歴に記録時の単位 (単価の基準) を追加"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text("ALTER TABLE material_price_history ADD COLUMN unit VARCHAR(50)"))
+    # 既存の履歴は記録時の単位が分からないため、材料の現在の単位とみなす
+    connection.execute(text(
+        "UPDATE material_price_history SET unit = ("
+        "SELECT materials.unit FROM materials WHERE materials.id = material_price_history.material_id)"
+    ))
@@ -0,0 +1,7 @@
+"""店舗のシャード移動中のフラグ (users.shard_moving)"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text("ALTER TABLE users ADD COLUMN shard_moving BOOLEAN DEFAULT FALSE"))
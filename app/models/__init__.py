@@ -1,18 +1,24 @@
 from app.models.user import User
 from app.models.password_reset_token import PasswordResetToken
 from app.models.material import Material
-from app.models.recipe import Recipe, RecipeMaterial
+from app.models.material_price_history import MaterialPriceHistory
+from app.models.recipe import Recipe, RecipeMaterial, RecipeSubRecipe
 from app.models.fixed_cost import FixedCost
 from app.models.product import Product
 from app.models.label_setting import LabelSetting
+from app.models.inventory import InventoryTransaction, InventoryBalance
 
 __all__ = [
     "User",
     "PasswordResetToken",
     "Material",
+    "MaterialPriceHistory",
     "Recipe",
     "RecipeMaterial",
+    "RecipeSubRecipe",
     "FixedCost",
     "Product",
     "LabelSetting",
+    "InventoryTransaction",
+    "InventoryBalance",
 ]
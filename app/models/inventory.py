@@ -0,0 +1,38 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+
+class InventoryTransaction(Base):
+    """在庫の入出庫記録 (追記のみ)"""
+    __tablename__ = "inventory_transactions"
+    __table_args__ = (
+        Index("ix_inventory_transactions_material_created", "material_id", "created_at"),
+        Index("ix_inventory_transactions_user_created", "user_id", "created_at"),
+        Index("ix_inventory_transactions_user_id_id", "user_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    material_id = Column(Integer, ForeignKey("materials.id", ondelete="CASCADE"), nullable=False)
+    transaction_type = Column(String(20), nullable=False)  # purchase, production, waste, adjustment
+    quantity = Column(Float, nullable=False)  # 増減量 (材料の単位、出庫はマイナス)
+    note = Column(String(500), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    material = relationship("Material", back_populates="inventory_transactions")
+
+
+class InventoryBalance(Base):
+    """材料ごとの現在の在庫数 (入出庫記録から差分で更新)"""
+    __tablename__ = "inventory_balances"
+
+    material_id = Column(Integer, ForeignKey("materials.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    quantity = Column(Float, nullable=False, default=0)  # 在庫数 (材料の単位)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    material = relationship("Material", back_populates="inventory_balance")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -6,6 +6,9 @@ from app.database import Base
 
 class Material(Base):
     __tablename__ = "materials"
+    __table_args__ = (
+        Index("ix_materials_user_id_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -13,6 +16,7 @@ class Material(Base):
     purchase_price = Column(Float, nullable=False)  # 購入金額
     purchase_quantity = Column(Float, nullable=False)  # 購入容量
     unit = Column(String(50), nullable=False)  # 単位 (g, ml, 個など)
+    density = Column(Float, nullable=True)  # 密度 (g/ml、質量と体積の換算用)
     unit_price = Column(Float, nullable=False)  # 単価 (自動計算)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -20,6 +24,13 @@ class Material(Base):
     # Relationships
     user = relationship("User", back_populates="materials")
     recipe_materials = relationship("RecipeMaterial", back_populates="material", cascade="all, delete-orphan")
+    price_history = relationship("MaterialPriceHistory", back_populates="material", cascade="all, delete-orphan")
+    inventory_transactions = relationship(
+        "InventoryTransaction", back_populates="material", cascade="all, delete-orphan"
+    )
+    inventory_balance = relationship(
+        "InventoryBalance", back_populates="material", uselist=False, cascade="all, delete-orphan"
+    )
 
     def calculate_unit_price(self):
         """単価を計算"""
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from app.database import Base
+
+
+class MaterialPriceHistory(Base):
+    """材料価格の履歴 (追記のみ)"""
+    __tablename__ = "material_price_history"
+    __table_args__ = (
+        Index("ix_material_price_history_material_effective", "material_id", "effective_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    material_id = Column(Integer, ForeignKey("materials.id", ondelete="CASCADE"), nullable=False)
+    purchase_price = Column(Float, nullable=False)  # 購入金額
+    purchase_quantity = Column(Float, nullable=False)  # 購入容量
+    unit_price = Column(Float, nullable=False)  # 単価
+    unit = Column(String(50), nullable=True)  # 記録時の材料の単位 (単価の基準)
+    effective_at = Column(DateTime, default=datetime.utcnow, nullable=False)  # 適用開始日時
+
+    # Relationships
+    material = relationship("Material", back_populates="price_history")
+
+    @classmethod
+    def from_material(cls, material, effective_at=None):
+        """材料の現在の価格から履歴レコードを作成"""
+        return cls(
+            user_id=material.user_id,
+            material_id=material.id,
+            purchase_price=material.purchase_price,
+            purchase_quantity=material.purchase_quantity,
+            unit_price=material.unit_price,
+            unit=material.unit,
+            effective_at=effective_at or datetime.utcnow()
+        )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -6,6 +6,10 @@ from app.database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_user_id_id", "user_id", "id"),
+        Index("ix_products_recipe_id", "recipe_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -34,9 +38,9 @@ class Product(Base):
 
     def calculate_costs(self, total_monthly_fixed_cost=0, total_monthly_production=1):
         """原価を計算"""
-        # レシピから材料費を取得
+        # レシピから1個あたりの材料費を取得
         if self.recipe:
-            self.material_cost = self.recipe.material_cost
+            self.material_cost = self.recipe.cost_per_unit
 
         # 固定費の計算
         if self.include_fixed_cost and total_monthly_production > 0:
@@ -44,6 +48,10 @@ class Product(Base):
         else:
             self.fixed_cost_per_unit = 0
 
+        self.calculate_prices()
+
+    def calculate_prices(self):
+        """材料費と単位固定費から総原価・販売価格・利益を計算"""
         # 総原価
         self.total_cost = self.material_cost + self.fixed_cost_per_unit
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -6,39 +6,117 @@ from app.database import Base
 
 class Recipe(Base):
     __tablename__ = "recipes"
+    __table_args__ = (
+        Index("ix_recipes_user_id_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String(255), nullable=False)
     description = Column(String(1000), nullable=True)
-    material_cost = Column(Float, default=0)  # 材料費合計 (自動計算)
+    material_cost = Column(Float, default=0)  # 材料費合計 (1バッチ分、自動計算)
+    yield_quantity = Column(Float, default=1)  # 1バッチの出来上がり数
+    loss_rate = Column(Float, default=0)  # ロス率 (%)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user = relationship("User", back_populates="recipes")
     recipe_materials = relationship("RecipeMaterial", back_populates="recipe", cascade="all, delete-orphan")
+    sub_recipes = relationship(
+        "RecipeSubRecipe", foreign_keys="RecipeSubRecipe.recipe_id",
+        back_populates="recipe", cascade="all, delete-orphan"
+    )
+    used_in = relationship(
+        "RecipeSubRecipe", foreign_keys="RecipeSubRecipe.sub_recipe_id",
+        back_populates="sub_recipe", cascade="all, delete-orphan"
+    )
     products = relationship("Product", back_populates="recipe")
 
-    def calculate_material_cost(self):
-        """材料費を計算"""
+    def calculate_material_cost(self, memo=None):
+        """材料費を計算 (サブレシピは再帰的に計算し、memoで1回だけ計算する)"""
+        if memo is None:
+            memo = {}
+        if self in memo:
+            return memo[self]
+
         total = 0
         for rm in self.recipe_materials:
             if rm.material:
                 total += rm.material.unit_price * rm.quantity
+        for rs in self.sub_recipes:
+            if rs.sub_recipe:
+                rs.sub_recipe.calculate_material_cost(memo)
+                total += rs.sub_recipe.cost_per_unit * rs.quantity
         self.material_cost = total
+        memo[self] = total
         return total
 
+    @property
+    def effective_yield(self):
+        """ロスを差し引いた1バッチあたりの出来上がり数"""
+        yield_quantity = self.yield_quantity if self.yield_quantity is not None else 1
+        loss_rate = self.loss_rate or 0
+        return yield_quantity * (1 - loss_rate / 100)
+
+    @property
+    def cost_per_unit(self):
+        """出来上がり1個あたりの材料費"""
+        effective_yield = self.effective_yield
+        if effective_yield > 0:
+            return (self.material_cost or 0) / effective_yield
+        return self.material_cost or 0
+
+    def iter_materials(self):
+        """サブレシピを含めて使用する材料を順に返す (重複は除く)"""
+        seen = set()
+        stack = [self]
+        visited_recipes = set()
+        while stack:
+            recipe = stack.pop(0)
+            if recipe.id in visited_recipes:
+                continue
+            visited_recipes.add(recipe.id)
+            for rm in recipe.recipe_materials:
+                if rm.material and rm.material_id not in seen:
+                    seen.add(rm.material_id)
+                    yield rm.material
+            stack.extend(rs.sub_recipe for rs in recipe.sub_recipes if rs.sub_recipe)
+
 
 class RecipeMaterial(Base):
     """レシピと材料の中間テーブル"""
     __tablename__ = "recipe_materials"
+    __table_args__ = (
+        Index("ix_recipe_materials_recipe_id", "recipe_id"),
+        Index("ix_recipe_materials_material_id", "material_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False)
     material_id = Column(Integer, ForeignKey("materials.id", ondelete="CASCADE"), nullable=False)
-    quantity = Column(Float, nullable=False)  # 使用量
+    quantity = Column(Float, nullable=False)  # 使用量 (材料の単位に換算済み)
+    input_quantity = Column(Float, nullable=True)  # 入力された使用量
+    input_unit = Column(String(50), nullable=True)  # 入力された単位
 
     # Relationships
     recipe = relationship("Recipe", back_populates="recipe_materials")
     material = relationship("Material", back_populates="recipe_materials")
+
+
+class RecipeSubRecipe(Base):
+    """レシピと、その中で使うサブレシピ (生地、クリームなど) の中間テーブル"""
+    __tablename__ = "recipe_sub_recipes"
+    __table_args__ = (
+        Index("ix_recipe_sub_recipes_recipe_id", "recipe_id"),
+        Index("ix_recipe_sub_recipes_sub_recipe_id", "sub_recipe_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False)
+    sub_recipe_id = Column(Integer, ForeignKey("recipes.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Float, nullable=False)  # 使用量 (サブレシピの出来上がり何個分か)
+
+    # Relationships
+    recipe = relationship("Recipe", foreign_keys=[recipe_id], back_populates="sub_recipes")
+    sub_recipe = relationship("Recipe", foreign_keys=[sub_recipe_id], back_populates="used_in")
@@ -13,6 +13,8 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     store_name = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True)
+    shard_key = Column(String(100), nullable=True, index=True)  # 店舗のデータを置くシャード (空ならディレクトリ)
+    shard_moving = Column(Boolean, default=False)  # シャードの移動中 (店舗のデータへの書き込みを止める)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -4,6 +4,7 @@ from datetime import timedelta
 from app.database import get_db
 from app.models.user import User
 from app.models.password_reset_token import PasswordResetToken
+from app.sharding.stores import assign_shard
 from app.schemas.user import (
     UserCreate, UserLogin, UserResponse, Token,
     PasswordResetRequest, PasswordReset
@@ -48,6 +49,9 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
     db.commit()
     db.refresh(new_user)
 
+    # シャーディングが有効な場合は、店舗のデータを置くシャードを割り当てる
+    assign_shard(db, new_user)
+
     return new_user
 
 
@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from app.database import engine, replica_engine, sqlite_pragmas
+from app.models.user import User
+from app.schemas.diagnostics import CacheStats, DatabaseDiagnostics
+from app.utils.cache import response_cache
+from app.utils.dependencies import get_admin_user
+from app.config import settings
+
+router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
+
+# 確認する SQLite の PRAGMA
+SQLITE_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size")
+
+
+def pool_status() -> dict:
+    """接続プールの状態"""
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    # QueuePool 以外 (StaticPool など) は大きさの情報を持たない
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=settings.db_max_overflow,
+            timeout=pool.timeout()
+        )
+    return status
+
+
+@router.get("/database", response_model=DatabaseDiagnostics)
+def get_database_diagnostics(current_user: User = Depends(get_admin_user)):
+    """データベース接続の設定と、接続で実際に有効な値を取得 (管理者のみ)
+
+    有効な値はディレクトリ (DATABASE_URL) のエンジンの接続で確認する
+    (セッションを使うと、シャーディングが有効な場合に店舗のシャードに送られるため)。
+    """
+    dialect = engine.dialect.name
+    diagnostics = {
+        "dialect": dialect,
+        "url": engine.url.render_as_string(hide_password=True),
+        "pool": pool_status()
+    }
+    if replica_engine is not None:
+        diagnostics["replica_url"] = replica_engine.url.render_as_string(hide_password=True)
+        diagnostics["read_your_writes_seconds"] = settings.read_your_writes_seconds
+
+    with engine.connect() as connection:
+        if dialect == "sqlite":
+            diagnostics["sqlite_tuning_enabled"] = settings.sqlite_tuning_enabled
+            diagnostics["configured_pragmas"] = sqlite_pragmas()
+            diagnostics["active_pragmas"] = {
+                name: connection.execute(text(f"PRAGMA {name}")).scalar()
+                for name in SQLITE_PRAGMAS
+            }
+
+        if dialect == "postgresql":
+            diagnostics["statement_timeout"] = connection.execute(text("SHOW statement_timeout")).scalar()
+
+    return diagnostics
+
+
+@router.get("/cache", response_model=CacheStats)
+def get_cache_stats(current_user: User = Depends(get_admin_user)):
+    """応答キャッシュのヒット・ミス・追い出しの回数 (プロセス全体の値)"""
+    return response_cache.backend.stats()
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Iterator, Literal, Optional
+from app.database import SessionLocal
+from app.models.user import User
+from app.utils.dependencies import get_current_user
+from app.utils.export import EXPORTERS, iter_csv, iter_ndjson
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def stream_with_session(iter_chunks, user_id: int, shard_key: Optional[str], *args) -> Iterator[bytes]:
+    """レスポンスの送信中だけ使う専用のセッションで書き出す
+
+    リクエストのセッション (get_db) はレスポンスの送信前に閉じられることがあるため使わない。
+    読み込みのみなので、レプリカがあればレプリカから読む。
+    """
+    db = SessionLocal()
+    db.info.update(use_replica=True, user_id=user_id, shard=shard_key)
+    try:
+        yield from iter_chunks(db, user_id, *args)
+    finally:
+        db.close()
+
+
+@router.get("/{resource}")
+def export_resource(
+    resource: Literal["materials", "recipes", "products", "fixed-costs", "all"],
+    format: Literal["csv", "ndjson"] = "csv",
+    current_user: User = Depends(get_current_user)
+):
+    """材料・レシピ (明細付き)・商品・固定費を CSV / NDJSON で書き出す
+
+    行はサーバーサイドカーソルから少しずつ読み込んで送信するため、
+    件数に関係なくメモリ使用量は一定。all は NDJSON のみ (各行に type を付ける)。
+    """
+    if resource == "all":
+        if format != "ndjson":
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="すべてのデータの書き出しは NDJSON 形式のみ対応しています"
+            )
+        chunks = stream_with_session(iter_ndjson, current_user.id, current_user.shard_key, list(EXPORTERS))
+    elif format == "csv":
+        chunks = stream_with_session(iter_csv, current_user.id, current_user.shard_key, resource)
+    else:
+        chunks = stream_with_session(iter_ndjson, current_user.id, current_user.shard_key, [resource])
+
+    filename = f"{resource}.{format}"
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.database import get_db
 from app.models.user import User
 from app.models.fixed_cost import FixedCost
 from app.schemas.fixed_cost import FixedCostCreate, FixedCostUpdate, FixedCostResponse
 from app.utils.dependencies import get_current_user
+from app.utils.pagination import paginate, finish_page
+from app.utils.etag import check_etag
+from app.utils.cache import response_cache
 
 router = APIRouter(prefix="/api/fixed-costs", tags=["fixed-costs"])
 
@@ -33,25 +36,47 @@ def create_fixed_cost(
 
 @router.get("/", response_model=List[FixedCostResponse])
 def get_fixed_costs(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """固定費一覧を取得"""
-    fixed_costs = db.query(FixedCost).filter(
-        FixedCost.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    """固定費一覧を取得 (cursor を指定するとキーセット方式、X-Next-Cursor ヘッダー)"""
+    cache_key = response_cache.key(request, "fixed-costs", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    not_modified = check_etag(db, request, response, "fixed-costs", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    fixed_costs = paginate(
+        db.query(FixedCost).filter(FixedCost.user_id == current_user.id),
+        FixedCost.id, cursor, skip, limit
+    ).all()
+
+    fixed_costs = finish_page(fixed_costs, limit, response)
 
-    return fixed_costs
+    return response_cache.store(cache_key, response, List[FixedCostResponse], fixed_costs)
 
 
 @router.get("/total", response_model=dict)
 def get_total_fixed_cost(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """有効な固定費の合計を取得"""
+    cache_key = response_cache.key(request, "fixed-costs", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
     total = db.query(FixedCost).filter(
         FixedCost.user_id == current_user.id,
         FixedCost.is_active == True
@@ -59,16 +84,24 @@ def get_total_fixed_cost(
 
     total_amount = sum([fc[0] for fc in total]) if total else 0
 
-    return {"total_monthly_fixed_cost": total_amount}
+    return response_cache.store(cache_key, response, dict, {"total_monthly_fixed_cost": total_amount})
 
 
 @router.get("/{fixed_cost_id}", response_model=FixedCostResponse)
 def get_fixed_cost(
     fixed_cost_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """特定の固定費を取得"""
+    cache_key = response_cache.key(request, "fixed-costs", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    # ETag は一覧全体とパスから作るため、存在しない ID に 304 を返さないよう先に確認する
     fixed_cost = db.query(FixedCost).filter(
         FixedCost.id == fixed_cost_id,
         FixedCost.user_id == current_user.id
@@ -80,7 +113,11 @@ def get_fixed_cost(
             detail="固定費が見つかりません"
         )
 
-    return fixed_cost
+    not_modified = check_etag(db, request, response, "fixed-costs", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    return response_cache.store(cache_key, response, FixedCostResponse, fixed_cost)
 
 
 @router.put("/{fixed_cost_id}", response_model=FixedCostResponse)
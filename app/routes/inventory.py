@@ -0,0 +1,187 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional
+import numpy as np
+from app.database import get_db
+from app.models.user import User
+from app.models.material import Material
+from app.models.inventory import InventoryTransaction, InventoryBalance
+from app.schemas.production import ProductionPlan
+from app.schemas.inventory import (
+    InventoryTransactionBatch, InventoryProductionRequest, InventoryTransactionResponse,
+    InventoryBalanceResponse, InventoryRecordResponse
+)
+from app.routes.production import build_product_quantities
+from app.utils.dependencies import get_current_user
+from app.utils.cost_engine import CostCatalog
+from app.utils.inventory import record_transactions
+from app.utils.pagination import paginate, finish_page
+from app.utils.cache import response_cache
+
+router = APIRouter(prefix="/api/inventory", tags=["inventory"])
+
+
+def query_balances(db: Session, user_id: int, material_ids: Optional[Iterable[int]] = None):
+    """材料名・単位付きで在庫数を取得"""
+    query = db.query(
+        InventoryBalance.material_id,
+        Material.name,
+        Material.unit,
+        InventoryBalance.quantity,
+        InventoryBalance.updated_at
+    ).join(Material, Material.id == InventoryBalance.material_id).filter(
+        InventoryBalance.user_id == user_id
+    )
+    if material_ids is not None:
+        query = query.filter(InventoryBalance.material_id.in_(list(material_ids)))
+
+    return [
+        {
+            "material_id": material_id,
+            "material_name": name,
+            "unit": unit,
+            "quantity": quantity,
+            "updated_at": updated_at
+        }
+        for material_id, name, unit, quantity, updated_at in query.order_by(Material.name)
+    ]
+
+
+@router.post("/transactions", response_model=InventoryRecordResponse, status_code=status.HTTP_201_CREATED)
+def create_inventory_transactions(
+    batch: InventoryTransactionBatch,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """入庫・廃棄・棚卸調整をまとめて記録"""
+    material_ids = {entry.material_id for entry in batch.entries}
+    found_ids = {
+        material_id for (material_id,) in db.query(Material.id).filter(
+            Material.id.in_(material_ids),
+            Material.user_id == current_user.id
+        )
+    }
+    missing = sorted(material_ids - found_ids)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"材料ID {missing[0]} が見つかりません"
+        )
+
+    entries = []
+    for entry in batch.entries:
+        if entry.transaction_type == "adjustment":
+            if entry.quantity == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="棚卸調整の数量に0は指定できません"
+                )
+            quantity = entry.quantity
+        else:
+            if entry.quantity <= 0:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="入庫・廃棄の数量は正の数で指定してください"
+                )
+            # 廃棄は出庫としてマイナスで記録
+            quantity = entry.quantity if entry.transaction_type == "purchase" else -entry.quantity
+        entries.append({
+            "material_id": entry.material_id,
+            "transaction_type": entry.transaction_type,
+            "quantity": quantity,
+            "note": entry.note
+        })
+
+    deltas = record_transactions(db, current_user.id, entries)
+    db.commit()
+
+    return {
+        "recorded_count": len(entries),
+        "balances": query_balances(db, current_user.id, deltas.keys())
+    }
+
+
+@router.post("/production", response_model=InventoryRecordResponse, status_code=status.HTTP_201_CREATED)
+def record_production(
+    request: InventoryProductionRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """生産実績を記録し、レシピの材料 (サブレシピを含む) を在庫から差し引く"""
+    catalog = CostCatalog.load(db, current_user.id)
+    product_quantities = build_product_quantities(catalog, ProductionPlan(items=request.items))
+
+    # 生産計画と同じ展開で材料ごとの消費量を計算し、1回の一括INSERTで記録
+    requirements = catalog.material_requirements(product_quantities)
+    entries = [
+        {
+            "material_id": int(catalog.material_ids[m]),
+            "transaction_type": "production",
+            "quantity": -float(requirements[m]),
+            "note": request.note
+        }
+        for m in np.flatnonzero(requirements)
+    ]
+
+    deltas = record_transactions(db, current_user.id, entries)
+    db.commit()
+
+    planned = product_quantities > 0
+    products_without_recipe = catalog.product_ids[planned & (catalog.product_recipe_idx < 0)].tolist()
+
+    return {
+        "recorded_count": len(entries),
+        "balances": query_balances(db, current_user.id, deltas.keys()),
+        "products_without_recipe": products_without_recipe
+    }
+
+
+@router.get("/balances", response_model=List[InventoryBalanceResponse])
+def get_inventory_balances(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """材料ごとの現在の在庫数を取得 (集計済みの在庫テーブルから読み込む)"""
+    cache_key = response_cache.key(request, "inventory", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    return response_cache.store(
+        cache_key, response, List[InventoryBalanceResponse], query_balances(db, current_user.id)
+    )
+
+
+@router.get("/transactions", response_model=List[InventoryTransactionResponse])
+def get_inventory_transactions(
+    request: Request,
+    response: Response,
+    material_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """入出庫の履歴を新しい順に取得 (cursor を指定するとキーセット方式、X-Next-Cursor ヘッダー)"""
+    cache_key = response_cache.key(request, "inventory", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    query = db.query(InventoryTransaction).filter(
+        InventoryTransaction.user_id == current_user.id
+    )
+    if material_id is not None:
+        query = query.filter(InventoryTransaction.material_id == material_id)
+
+    # 記録は追記のみなので、IDの降順が新しい順になる
+    transactions = paginate(
+        query, InventoryTransaction.id, cursor, skip, limit, descending=True
+    ).all()
+
+    transactions = finish_page(transactions, limit, response, descending=True)
+
+    return response_cache.store(cache_key, response, List[InventoryTransactionResponse], transactions)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List
 from app.database import get_db
 from app.models.user import User
@@ -12,6 +12,7 @@ from app.schemas.label import (
 )
 from app.utils.dependencies import get_current_user
 from app.utils.pdf_generator import LabelPDFGenerator
+from app.utils.loaders import recipe_detail_options, preload_sub_recipes
 
 router = APIRouter(prefix="/api/labels", tags=["labels"])
 
@@ -221,8 +222,10 @@ def print_labels(
             detail="ラベル設定が見つかりません"
         )
 
-    # 商品を取得
-    products = db.query(Product).filter(
+    # 商品を取得 (レシピの材料まで一括で読み込み、ラベルごとの遅延ロードを避ける)
+    products = db.query(Product).options(
+        *recipe_detail_options(joinedload(Product.recipe))
+    ).filter(
         Product.id.in_(print_request.product_ids),
         Product.user_id == current_user.id
     ).all()
@@ -233,6 +236,9 @@ def print_labels(
             detail="商品が見つかりません"
         )
 
+    if label_setting.show_ingredients:
+        preload_sub_recipes(db, [product.recipe for product in products if product.recipe])
+
     # PDFを生成
     generator = LabelPDFGenerator(label_setting, current_user.store_name)
     pdf_buffer = generator.generate_labels(products, print_request.expiry_date)
@@ -1,11 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from typing import List, Literal, Optional
+from app.database import get_db, get_async_db
 from app.models.user import User
 from app.models.material import Material
-from app.schemas.material import MaterialCreate, MaterialUpdate, MaterialResponse
-from app.utils.dependencies import get_current_user
+from app.models.material_price_history import MaterialPriceHistory
+from app.schemas.material import (
+    MaterialCreate, MaterialUpdate, MaterialResponse, MaterialPriceHistoryResponse,
+    MaterialImportResponse
+)
+from app.utils.dependencies import get_current_user, get_current_user_async
+from app.utils.cost_propagation import (
+    propagate_material_changes, propagate_recipe_changes, renormalize_material_quantities
+)
+from app.utils.units import UnitConversionError
+from app.utils.pagination import paginate, finish_page
+from app.utils.etag import check_etag, check_etag_async
+from app.utils.cache import response_cache
+from app.utils.material_import import import_materials, iter_csv_rows, iter_json_rows
 
 router = APIRouter(prefix="/api/materials", tags=["materials"])
 
@@ -23,6 +38,7 @@ def create_material(
         purchase_price=material_data.purchase_price,
         purchase_quantity=material_data.purchase_quantity,
         unit=material_data.unit,
+        density=material_data.density,
         unit_price=0  # 後で計算
     )
 
@@ -30,34 +46,101 @@ def create_material(
     material.calculate_unit_price()
 
     db.add(material)
+    db.flush()
+
+    # 価格履歴を記録
+    db.add(MaterialPriceHistory.from_material(material))
+
     db.commit()
     db.refresh(material)
 
     return material
 
 
+@router.post("/import", response_model=MaterialImportResponse)
+def import_materials_file(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "json"]] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """CSV または JSON 配列から材料を一括登録 (同じ名前の材料は更新)
+
+    列 (キー) は name, purchase_price, purchase_quantity, unit, density。
+    エラーの行 (同じ名前の行のうち前の行を含む) はスキップし、行番号とエラー内容を返す。
+    途中の行で読み込みに失敗した場合も、それまでに登録した件数とエラーの行を返す。
+    """
+    if format is None:
+        filename = (file.filename or "").lower()
+        if filename.endswith(".csv") or file.content_type == "text/csv":
+            format = "csv"
+        elif filename.endswith(".json") or file.content_type == "application/json":
+            format = "json"
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ファイル形式を判別できません (format に csv または json を指定してください)"
+            )
+
+    rows = iter_csv_rows(file.file) if format == "csv" else iter_json_rows(file.file)
+    try:
+        return import_materials(db, current_user.id, rows)
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"ファイルを読み込めません: {e}"
+        )
+
+
 @router.get("/", response_model=List[MaterialResponse])
-def get_materials(
+async def get_materials(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """材料一覧を取得"""
-    materials = db.query(Material).filter(
-        Material.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    """材料一覧を取得 (非同期セッションで読み込み、スレッドプールを占有しない)
+
+    cursor を指定するとキーセット方式でページングし、続きがあれば
+    X-Next-Cursor ヘッダーに次ページのカーソルを返す。
+    If-None-Match が ETag と一致する場合は、行を読み込まずに 304 を返す。
+    """
+    cache_key = response_cache.key(request, "materials", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
 
-    return materials
+    not_modified = await check_etag_async(db, request, response, "materials", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    result = await db.execute(paginate(
+        select(Material).where(Material.user_id == current_user.id),
+        Material.id, cursor, skip, limit
+    ))
+    materials = finish_page(result.scalars().all(), limit, response)
+
+    return response_cache.store(cache_key, response, List[MaterialResponse], materials)
 
 
 @router.get("/{material_id}", response_model=MaterialResponse)
 def get_material(
     material_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """特定の材料を取得"""
+    """特定の材料を取得 (ETag は材料一覧と同じ版から作成)"""
+    cache_key = response_cache.key(request, "materials", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    # ETag は一覧全体とパスから作るため、存在しない ID に 304 を返さないよう先に確認する
     material = db.query(Material).filter(
         Material.id == material_id,
         Material.user_id == current_user.id
@@ -69,7 +152,42 @@ def get_material(
             detail="材料が見つかりません"
         )
 
-    return material
+    not_modified = check_etag(db, request, response, "materials", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    return response_cache.store(cache_key, response, MaterialResponse, material)
+
+
+@router.get("/{material_id}/price-history", response_model=List[MaterialPriceHistoryResponse])
+def get_material_price_history(
+    material_id: int,
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """材料の価格履歴を取得"""
+    cache_key = response_cache.key(request, "materials", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    history = db.query(MaterialPriceHistory).filter(
+        MaterialPriceHistory.material_id == material_id,
+        MaterialPriceHistory.user_id == current_user.id
+    ).order_by(MaterialPriceHistory.effective_at).all()
+
+    if not history and not db.query(Material.id).filter(
+        Material.id == material_id,
+        Material.user_id == current_user.id
+    ).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="材料が見つかりません"
+        )
+
+    return response_cache.store(cache_key, response, List[MaterialPriceHistoryResponse], history)
 
 
 @router.put("/{material_id}", response_model=MaterialResponse)
@@ -91,14 +209,38 @@ def update_material(
             detail="材料が見つかりません"
         )
 
+    previous_unit = material.unit
+    previous_density = material.density
+    previous_price = (material.purchase_price, material.purchase_quantity, material.unit_price)
+
     # 更新するフィールドを設定
     update_data = material_data.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(material, field, value)
 
     # 単価を再計算
+    previous_unit_price = material.unit_price
     material.calculate_unit_price()
 
+    # 単位・密度が変わった場合、レシピの使用量を新しい単位に換算し直す
+    quantities_changed = False
+    if material.unit != previous_unit or material.density != previous_density:
+        try:
+            quantities_changed = renormalize_material_quantities(db, material, previous_unit) > 0
+        except UnitConversionError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"この材料を使うレシピの使用量を換算できません: {e}"
+            )
+
+    # 価格が変わった場合、価格履歴を記録
+    if (material.purchase_price, material.purchase_quantity, material.unit_price) != previous_price:
+        db.add(MaterialPriceHistory.from_material(material))
+
+    # 単価や使用量が変わった場合、影響を受けるレシピと商品の原価を更新
+    if material.unit_price != previous_unit_price or quantities_changed:
+        propagate_material_changes(db, [material.id])
+
     db.commit()
     db.refresh(material)
 
@@ -123,7 +265,12 @@ def delete_material(
             detail="材料が見つかりません"
         )
 
+    # 削除によって材料費が変わるレシピを記録
+    affected_recipe_ids = [rm.recipe_id for rm in material.recipe_materials]
+
     db.delete(material)
+    db.flush()
+    propagate_recipe_changes(db, affected_recipe_ids)
     db.commit()
 
     return None
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+import numpy as np
+from app.database import get_db
+from app.models.user import User
+from app.schemas.production import ProductionPlan, MaterialRequirementsResponse
+from app.utils.dependencies import get_current_user
+from app.utils.cost_engine import CostCatalog
+
+router = APIRouter(prefix="/api/production", tags=["production"])
+
+
+def build_product_quantities(catalog: CostCatalog, plan: ProductionPlan) -> np.ndarray:
+    """生産計画を商品ごとの生産数ベクトルに変換 (未登録の商品は404)"""
+    product_index = {product_id: p for p, product_id in enumerate(catalog.product_ids.tolist())}
+    product_quantities = np.zeros(len(catalog.product_ids))
+    for item in plan.items:
+        if item.product_id not in product_index:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"商品ID {item.product_id} が見つかりません"
+            )
+        product_quantities[product_index[item.product_id]] += item.quantity
+    return product_quantities
+
+
+@router.post("/requirements", response_model=MaterialRequirementsResponse)
+def get_material_requirements(
+    plan: ProductionPlan,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """生産計画 (商品ごとの生産数) から材料ごとの必要量と費用を計算"""
+    catalog = CostCatalog.load(db, current_user.id)
+    product_quantities = build_product_quantities(catalog, plan)
+
+    # サブレシピを展開した疎行列とベクトルの積で、材料の必要量を一括計算
+    requirements = catalog.material_requirements(product_quantities)
+    costs = requirements * catalog.unit_prices
+
+    materials = [
+        {
+            "material_id": int(catalog.material_ids[m]),
+            "material_name": catalog.material_names[m],
+            "unit": catalog.material_units[m],
+            "quantity": float(requirements[m]),
+            "cost": float(costs[m])
+        }
+        for m in np.flatnonzero(requirements)
+    ]
+
+    planned = product_quantities > 0
+    products_without_recipe = catalog.product_ids[planned & (catalog.product_recipe_idx < 0)].tolist()
+
+    return {
+        "materials": materials,
+        "total_cost": float(costs.sum()),
+        "products_without_recipe": products_without_recipe
+    }
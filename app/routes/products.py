@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import datetime
+import time
+import numpy as np
+from app.database import get_db, get_async_db
 from app.models.user import User
 from app.models.product import Product
 from app.models.recipe import Recipe
 from app.models.fixed_cost import FixedCost
 from app.schemas.product import (
-    ProductCreate, ProductUpdate, ProductResponse, ProductCostCalculation
+    ProductCreate, ProductUpdate, ProductResponse, ProductCostCalculation,
+    ProductBulkRecalculation, ProductBulkRecalculationResponse,
+    PriceSimulationRequest, PriceSimulationResponse, ProductCostSensitivity,
+    ProductCostAsOfResponse, MonteCarloRequest, MonteCarloResponse
 )
-from app.utils.dependencies import get_current_user
+from app.utils.dependencies import get_current_user, get_current_user_async
+from app.utils.pagination import paginate, finish_page
+from app.utils.etag import check_etag, check_etag_async
+from app.utils.cache import response_cache
+from app.utils.cost_engine import CostCatalog
+from app.utils.monte_carlo import PERCENTILES, simulate_total_costs, summarize
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
@@ -55,27 +69,284 @@ def create_product(
 
 
 @router.get("/", response_model=List[ProductResponse])
-def get_products(
+async def get_products(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """商品一覧を取得 (非同期セッションで読み込み、スレッドプールを占有しない)
+
+    cursor を指定するとキーセット方式でページングする (X-Next-Cursor ヘッダー)。
+    """
+    cache_key = response_cache.key(request, "products", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    not_modified = await check_etag_async(db, request, response, "products", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    result = await db.execute(paginate(
+        select(Product).where(Product.user_id == current_user.id),
+        Product.id, cursor, skip, limit
+    ))
+    products = finish_page(result.scalars().all(), limit, response)
+
+    return response_cache.store(cache_key, response, List[ProductResponse], products)
+
+
+@router.post("/recalculate", response_model=ProductBulkRecalculationResponse)
+def recalculate_products(
+    calc_data: ProductBulkRecalculation,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """商品一覧を取得"""
-    products = db.query(Product).filter(
-        Product.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    """店舗の全商品 (または指定した商品) の原価を一括で再計算"""
+    started_at = time.perf_counter()
+
+    # 固定費の合計は1回だけ取得
+    total_fixed_cost = get_total_fixed_cost(current_user.id, db)
+
+    # 材料・レシピ・商品を列単位で読み込み、配列演算で一括計算
+    catalog = CostCatalog.load(
+        db, current_user.id,
+        product_ids=calc_data.product_ids,
+        recipe_ids=calc_data.recipe_ids
+    )
+    result = catalog.calculate(total_fixed_cost, calc_data.total_monthly_production)
+
+    # レシピの材料費を書き戻す (絞り込み時は対象商品のレシピのみ)
+    recipe_costs = result["recipe_material_cost"]
+    if calc_data.product_ids is None and calc_data.recipe_ids is None:
+        recipe_idx = np.arange(len(catalog.recipe_ids))
+    else:
+        recipe_idx = np.unique(catalog.product_recipe_idx[catalog.product_recipe_idx >= 0])
+    recipe_rows = [
+        {"id": int(catalog.recipe_ids[i]), "material_cost": float(recipe_costs[i])}
+        for i in recipe_idx
+    ]
+    if recipe_rows:
+        db.execute(update(Recipe), recipe_rows)
+
+    # 商品の原価を一括UPDATE
+    fields = (
+        "material_cost", "fixed_cost_per_unit", "total_cost", "suggested_price",
+        "actual_profit_amount", "actual_profit_margin"
+    )
+    columns = [result[field].tolist() for field in fields]
+    product_rows = [
+        dict(zip(fields, values), id=product_id)
+        for product_id, *values in zip(catalog.product_ids.tolist(), *columns)
+    ]
+    if product_rows:
+        db.execute(update(Product), product_rows)
+
+    db.commit()
+
+    return {
+        "updated_count": len(product_rows),
+        "recipe_count": len(recipe_rows),
+        "elapsed_ms": (time.perf_counter() - started_at) * 1000
+    }
+
+
+@router.post("/simulate", response_model=PriceSimulationResponse)
+def simulate_price_changes(
+    simulation: PriceSimulationRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """材料価格の変更を仮定した場合の商品原価をシミュレーション (DBは更新しない)"""
+    catalog = CostCatalog.load(db, current_user.id)
+
+    # シナリオ×材料の単価行列を作成
+    scenario_count = len(simulation.scenarios)
+    purchase_prices = np.tile(catalog.purchase_prices, (scenario_count, 1))
+    unit_prices = np.tile(catalog.unit_prices, (scenario_count, 1))
+    changed = np.zeros(unit_prices.shape, dtype=bool)
+
+    for s, scenario in enumerate(simulation.scenarios):
+        for change in scenario.changes:
+            if change.material_id not in catalog.material_index:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"材料ID {change.material_id} が見つかりません"
+                )
+            if (change.purchase_price is None) == (change.percent_change is None):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="purchase_price と percent_change のどちらか一方を指定してください"
+                )
+
+            m = catalog.material_index[change.material_id]
+            if change.purchase_price is not None:
+                purchase_prices[s, m] = change.purchase_price
+            else:
+                purchase_prices[s, m] = catalog.purchase_prices[m] * (1 + change.percent_change / 100)
+            changed[s, m] = True
+
+    unit_prices = np.where(changed, catalog.unit_prices_from_purchase(purchase_prices), unit_prices)
+
+    # 現在の原価と変更後の原価を計算 (単位固定費は保存済みの値を使用)
+    current = catalog.price_products(catalog.product_material_costs_from(catalog.recipe_material_costs()))
+    simulated = catalog.price_products(
+        catalog.product_material_costs_from(catalog.recipe_material_costs(unit_prices))
+    )
+    affected = catalog.affected_products(changed)
+
+    results = []
+    for s, scenario in enumerate(simulation.scenarios):
+        products = []
+        for p in np.flatnonzero(affected[s]):
+            products.append({
+                "product_id": int(catalog.product_ids[p]),
+                "name": catalog.product_names[p],
+                "current_total_cost": float(current["total_cost"][p]),
+                "current_suggested_price": float(current["suggested_price"][p]),
+                "current_actual_profit_margin": float(current["actual_profit_margin"][p]),
+                "total_cost": float(simulated["total_cost"][s, p]),
+                "suggested_price": float(simulated["suggested_price"][s, p]),
+                "actual_profit_margin": float(simulated["actual_profit_margin"][s, p])
+            })
+        results.append({"name": scenario.name, "products": products})
+
+    return {"scenarios": results}
+
+
+@router.post("/monte-carlo", response_model=MonteCarloResponse)
+async def run_monte_carlo(
+    simulation: MonteCarloRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """材料価格の変動を仮定したモンテカルロ法で、商品ごとの原価と利益率の分布を計算"""
+    started_at = time.perf_counter()
+
+    # DBの読み込みと計算はスレッドプール/プロセスプールで行い、イベントループをブロックしない
+    catalog = await run_in_threadpool(CostCatalog.load, db, current_user.id)
 
-    return products
+    volatilities = np.full(len(catalog.material_ids), simulation.default_volatility)
+    for item in simulation.material_volatilities:
+        if item.material_id not in catalog.material_index:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"材料ID {item.material_id} が見つかりません"
+            )
+        volatilities[catalog.material_index[item.material_id]] = item.volatility
+
+    total_costs = await simulate_total_costs(
+        catalog, volatilities, simulation.distribution, simulation.n_scenarios, simulation.seed
+    )
+    summary = await run_in_threadpool(summarize, catalog, total_costs)
+
+    def percentiles(values, p):
+        return {f"p{q}": float(values[i, p]) for i, q in enumerate(PERCENTILES)}
+
+    products = []
+    for p, product_id in enumerate(catalog.product_ids.tolist()):
+        has_price = catalog.product_selling_prices[p] > 0
+        products.append({
+            "product_id": product_id,
+            "name": catalog.product_names[p],
+            "total_cost": percentiles(summary["total_cost"], p),
+            "suggested_price": percentiles(summary["suggested_price"], p),
+            "actual_profit_margin": percentiles(summary["actual_profit_margin"], p) if has_price else None
+        })
+
+    return {
+        "n_scenarios": simulation.n_scenarios,
+        "distribution": simulation.distribution,
+        "elapsed_ms": (time.perf_counter() - started_at) * 1000,
+        "products": products
+    }
+
+
+@router.get("/cost-sensitivity", response_model=List[ProductCostSensitivity])
+def get_cost_sensitivity(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """全商品について材料ごとの原価内訳と価格変動に対する感応度を取得"""
+    cache_key = response_cache.key(request, "products", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    catalog = CostCatalog.load(db, current_user.id)
+
+    # レシピ×材料の使用量行列と単価から、出来上がり1個あたりの材料ごとの費用を一括計算
+    entry_recipe_idx, entry_material_idx, entry_quantities = catalog.recipe_material_quantities()
+    entry_quantities = entry_quantities / catalog.recipe_effective_yields[entry_recipe_idx]
+    entry_costs = entry_quantities * catalog.unit_prices[entry_material_idx]
+    unit_costs = np.bincount(entry_recipe_idx, weights=entry_costs, minlength=len(catalog.recipe_ids))
+    entry_starts = np.searchsorted(entry_recipe_idx, np.arange(len(catalog.recipe_ids) + 1))
+
+    # 1バッチ分の材料費に戻して商品の原価を計算
+    material_costs = catalog.product_material_costs_from(unit_costs * catalog.recipe_effective_yields)
+    priced = catalog.price_products(material_costs)
+
+    # 利益率0以下の場合、推奨価格は総原価と同じ
+    margins = catalog.product_profit_margins
+    with np.errstate(divide="ignore"):
+        price_factors = np.where(margins > 0, 1 / (1 - margins / 100), 1.0)
+
+    report = []
+    for p, product_id in enumerate(catalog.product_ids.tolist()):
+        r = catalog.product_recipe_idx[p]
+        if r < 0:
+            continue
+
+        selling_price = catalog.product_selling_prices[p]
+        materials = []
+        for e in range(entry_starts[r], entry_starts[r + 1]):
+            cost = float(entry_costs[e])
+            cost_change = cost / 100
+            materials.append({
+                "material_id": int(catalog.material_ids[entry_material_idx[e]]),
+                "material_name": catalog.material_names[entry_material_idx[e]],
+                "quantity": float(entry_quantities[e]),
+                "cost": cost,
+                "share": cost / unit_costs[r] * 100 if unit_costs[r] > 0 else 0,
+                "cost_change_per_percent": cost_change,
+                "suggested_price_change_per_percent": float(cost_change * price_factors[p]),
+                "margin_change_per_percent": -cost_change / selling_price * 100 if selling_price > 0 else None
+            })
+
+        report.append({
+            "product_id": product_id,
+            "name": catalog.product_names[p],
+            "material_cost": float(priced["material_cost"][p]),
+            "total_cost": float(priced["total_cost"][p]),
+            "selling_price": float(selling_price) if selling_price > 0 else None,
+            "actual_profit_margin": float(priced["actual_profit_margin"][p]),
+            "materials": materials
+        })
+
+    return response_cache.store(cache_key, response, List[ProductCostSensitivity], report)
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
 def get_product(
     product_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """特定の商品を取得"""
+    cache_key = response_cache.key(request, "products", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    # ETag は一覧全体とパスから作るため、存在しない ID に 304 を返さないよう先に確認する
     product = db.query(Product).filter(
         Product.id == product_id,
         Product.user_id == current_user.id
@@ -87,7 +358,44 @@ def get_product(
             detail="商品が見つかりません"
         )
 
-    return product
+    not_modified = check_etag(db, request, response, "products", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    return response_cache.store(cache_key, response, ProductResponse, product)
+
+
+@router.get("/{product_id}/cost-as-of", response_model=ProductCostAsOfResponse)
+def get_product_cost_as_of(
+    product_id: int,
+    as_of: datetime,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """指定日時時点の材料価格で商品の原価を計算 (レシピの構成と単位固定費は現在のもの)"""
+    catalog = CostCatalog.load(db, current_user.id, product_ids=[product_id])
+    if len(catalog.product_ids) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="商品が見つかりません"
+        )
+
+    unit_prices, missing_material_ids = catalog.unit_prices_as_of(db, current_user.id, as_of)
+    material_costs = catalog.product_material_costs_from(catalog.recipe_material_costs(unit_prices))
+    result = catalog.price_products(material_costs)
+
+    r = catalog.product_recipe_idx[0]
+    return {
+        "product_id": product_id,
+        "as_of": as_of,
+        "material_cost": float(result["material_cost"][0]),
+        "fixed_cost_per_unit": float(result["fixed_cost_per_unit"][0]),
+        "total_cost": float(result["total_cost"][0]),
+        "suggested_price": float(result["suggested_price"][0]),
+        "actual_profit_amount": float(result["actual_profit_amount"][0]),
+        "actual_profit_margin": float(result["actual_profit_margin"][0]),
+        "missing_material_ids": catalog.materials_used_by(r, missing_material_ids) if r >= 0 else []
+    }
 
 
 @router.put("/{product_id}", response_model=ProductResponse)
@@ -198,11 +506,17 @@ def calculate_product_costs(
     # 固定費の合計を取得
     total_fixed_cost = 0
     if product.include_fixed_cost:
-        fixed_costs = db.query(FixedCost).filter(
-            FixedCost.user_id == user_id,
-            FixedCost.is_active == True
-        ).all()
-        total_fixed_cost = sum([fc.monthly_amount for fc in fixed_costs])
+        total_fixed_cost = get_total_fixed_cost(user_id, db)
 
     # 商品の原価を計算
     product.calculate_costs(total_fixed_cost, total_monthly_production)
+
+
+def get_total_fixed_cost(user_id: int, db: Session) -> float:
+    """有効な固定費の月額合計を取得"""
+    return db.query(
+        func.coalesce(func.sum(FixedCost.monthly_amount), 0)
+    ).filter(
+        FixedCost.user_id == user_id,
+        FixedCost.is_active == True
+    ).scalar()
@@ -1,12 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app.database import get_db
+from collections import defaultdict
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.database import get_db, get_async_db
 from app.models.user import User
-from app.models.recipe import Recipe, RecipeMaterial
+from app.models.recipe import Recipe, RecipeMaterial, RecipeSubRecipe
 from app.models.material import Material
-from app.schemas.recipe import RecipeCreate, RecipeUpdate, RecipeResponse, RecipeMaterialResponse
-from app.utils.dependencies import get_current_user
+from app.schemas.recipe import (
+    RecipeCreate, RecipeUpdate, RecipeResponse, RecipeMaterialResponse, RecipeMaterialCreate,
+    RecipeSubRecipeCreate, RecipeCostAsOfResponse
+)
+from app.utils.dependencies import get_current_user, get_current_user_async
+from app.utils.cost_propagation import propagate_recipe_changes
+from app.utils.recipe_graph import would_create_cycle
+from app.utils.units import UnitConversionError, to_material_quantity
+from app.utils.cost_engine import CostCatalog
+from app.utils.loaders import recipe_detail_options
+from app.utils.pagination import paginate, finish_page
+from app.utils.etag import check_etag, check_etag_async
+from app.utils.cache import response_cache
 
 router = APIRouter(prefix="/api/recipes", tags=["recipes"])
 
@@ -18,84 +33,141 @@ def create_recipe(
     db: Session = Depends(get_db)
 ):
     """レシピを新規登録"""
+    # 材料・サブレシピが存在し、かつ現在のユーザーのものであることを確認 (それぞれ1回のクエリ)
+    materials = load_materials_or_404(
+        db, current_user.id, [data.material_id for data in recipe_data.materials]
+    )
+    sub_recipes = load_sub_recipes_or_404(
+        db, current_user.id, [data.sub_recipe_id for data in recipe_data.sub_recipes]
+    )
+
     # レシピの作成
     recipe = Recipe(
         user_id=current_user.id,
         name=recipe_data.name,
         description=recipe_data.description,
-        material_cost=0
+        yield_quantity=recipe_data.yield_quantity,
+        loss_rate=recipe_data.loss_rate,
+        material_cost=0,
+        recipe_materials=[
+            build_recipe_material(materials[data.material_id], data)
+            for data in recipe_data.materials
+        ],
+        sub_recipes=[
+            RecipeSubRecipe(sub_recipe=sub_recipes[data.sub_recipe_id], quantity=data.quantity)
+            for data in recipe_data.sub_recipes
+        ]
     )
 
-    db.add(recipe)
-    db.flush()  # IDを取得するためにflush
-
-    # 材料の追加
-    for material_data in recipe_data.materials:
-        # 材料が存在し、かつ現在のユーザーのものであることを確認
-        material = db.query(Material).filter(
-            Material.id == material_data.material_id,
-            Material.user_id == current_user.id
-        ).first()
-
-        if not material:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"材料ID {material_data.material_id} が見つかりません"
-            )
-
-        recipe_material = RecipeMaterial(
-            recipe_id=recipe.id,
-            material_id=material_data.material_id,
-            quantity=material_data.quantity
-        )
-        db.add(recipe_material)
+    # 材料費を計算 (メモリ上の明細から計算するため再読み込みは不要)
+    recipe.calculate_material_cost()
 
-    # 材料費を計算
+    db.add(recipe)
     db.flush()
-    db.refresh(recipe)
-    recipe.calculate_material_cost()
 
+    # レスポンスの構築 (コミットで属性が失効する前に組み立てる)
+    response = format_recipe_response(recipe)
     db.commit()
-    db.refresh(recipe)
 
-    # レスポンスの構築
-    return format_recipe_response(recipe)
+    return response
 
 
 @router.get("/", response_model=List[RecipeResponse])
-def get_recipes(
+async def get_recipes(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """レシピ一覧を取得"""
-    recipes = db.query(Recipe).filter(
-        Recipe.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
-
-    return [format_recipe_response(recipe) for recipe in recipes]
+    """レシピ一覧を取得 (非同期セッションで読み込み、スレッドプールを占有しない)
+
+    cursor を指定するとキーセット方式でページングする (X-Next-Cursor ヘッダー)。
+    """
+    cache_key = response_cache.key(request, "recipes", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    not_modified = await check_etag_async(db, request, response, "recipes", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    result = await db.execute(paginate(
+        select(Recipe).options(*recipe_detail_options()).where(Recipe.user_id == current_user.id),
+        Recipe.id, cursor, skip, limit
+    ))
+    recipes = finish_page(result.scalars().all(), limit, response)
+
+    return response_cache.store(
+        cache_key, response, List[RecipeResponse], [format_recipe_response(recipe) for recipe in recipes]
+    )
 
 
 @router.get("/{recipe_id}", response_model=RecipeResponse)
 def get_recipe(
     recipe_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """特定のレシピを取得"""
-    recipe = db.query(Recipe).filter(
+    cache_key = response_cache.key(request, "recipes", current_user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    # ETag はレシピ一覧全体とパスから作るため、存在しない ID に 304 を返さないよう先に確認する
+    # (明細は 304 を返さない場合だけ読み込む)
+    exists = db.query(Recipe.id).filter(
         Recipe.id == recipe_id,
         Recipe.user_id == current_user.id
     ).first()
 
-    if not recipe:
+    if not exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="レシピが見つかりません"
         )
 
-    return format_recipe_response(recipe)
+    not_modified = check_etag(db, request, response, "recipes", current_user.id)
+    if not_modified is not None:
+        return not_modified
+
+    recipe = db.query(Recipe).options(*recipe_detail_options()).filter(Recipe.id == recipe_id).one()
+
+    return response_cache.store(cache_key, response, RecipeResponse, format_recipe_response(recipe))
+
+
+@router.get("/{recipe_id}/cost-as-of", response_model=RecipeCostAsOfResponse)
+def get_recipe_cost_as_of(
+    recipe_id: int,
+    as_of: datetime,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """指定日時時点の材料価格でレシピの材料費を計算 (レシピの構成は現在のもの)"""
+    catalog = CostCatalog.load(db, current_user.id, product_ids=[])
+    if recipe_id not in catalog.recipe_index:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="レシピが見つかりません"
+        )
+
+    unit_prices, missing_material_ids = catalog.unit_prices_as_of(db, current_user.id, as_of)
+    r = catalog.recipe_index[recipe_id]
+    material_cost = catalog.recipe_material_costs(unit_prices)[r]
+
+    return {
+        "recipe_id": recipe_id,
+        "as_of": as_of,
+        "material_cost": float(material_cost),
+        "cost_per_unit": float(material_cost / catalog.recipe_effective_yields[r]),
+        "missing_material_ids": catalog.materials_used_by(r, missing_material_ids)
+    }
 
 
 @router.put("/{recipe_id}", response_model=RecipeResponse)
@@ -105,8 +177,8 @@ def update_recipe(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """レシピを更新"""
-    recipe = db.query(Recipe).filter(
+    """レシピを更新 (材料・サブレシピは変更のあった明細だけを追加・更新・削除)"""
+    recipe = db.query(Recipe).options(*recipe_detail_options()).filter(
         Recipe.id == recipe_id,
         Recipe.user_id == current_user.id
     ).first()
@@ -123,43 +195,58 @@ def update_recipe(
     if recipe_data.description is not None:
         recipe.description = recipe_data.description
 
+    # 出来上がり数・ロス率の更新 (1個あたりの原価が変わる)
+    yield_changed = False
+    if recipe_data.yield_quantity is not None:
+        yield_changed = yield_changed or recipe.yield_quantity != recipe_data.yield_quantity
+        recipe.yield_quantity = recipe_data.yield_quantity
+    if recipe_data.loss_rate is not None:
+        yield_changed = yield_changed or recipe.loss_rate != recipe_data.loss_rate
+        recipe.loss_rate = recipe_data.loss_rate
+
+    lines_changed = False
+
     # 材料の更新
     if recipe_data.materials is not None:
-        # 既存の材料を削除
-        db.query(RecipeMaterial).filter(
-            RecipeMaterial.recipe_id == recipe_id
-        ).delete()
-
-        # 新しい材料を追加
-        for material_data in recipe_data.materials:
-            # 材料が存在し、かつ現在のユーザーのものであることを確認
-            material = db.query(Material).filter(
-                Material.id == material_data.material_id,
-                Material.user_id == current_user.id
-            ).first()
-
-            if not material:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"材料ID {material_data.material_id} が見つかりません"
-                )
-
-            recipe_material = RecipeMaterial(
-                recipe_id=recipe.id,
-                material_id=material_data.material_id,
-                quantity=material_data.quantity
+        materials = load_materials_or_404(
+            db, current_user.id, [data.material_id for data in recipe_data.materials]
+        )
+        lines_changed |= sync_recipe_materials(recipe, recipe_data.materials, materials)
+
+    # サブレシピの更新
+    if recipe_data.sub_recipes is not None:
+        sub_recipe_ids = [data.sub_recipe_id for data in recipe_data.sub_recipes]
+        sub_recipes = load_sub_recipes_or_404(db, current_user.id, sub_recipe_ids)
+
+        # 循環参照のチェック
+        edges = db.query(RecipeSubRecipe.recipe_id, RecipeSubRecipe.sub_recipe_id).join(
+            Recipe, Recipe.id == RecipeSubRecipe.recipe_id
+        ).filter(Recipe.user_id == current_user.id).all()
+        if would_create_cycle(edges, recipe.id, sub_recipe_ids):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="サブレシピが循環参照になっています"
             )
-            db.add(recipe_material)
 
-        # 材料費を再計算
-        db.flush()
-        db.refresh(recipe)
+        lines_changed |= sync_recipe_sub_recipes(recipe, recipe_data.sub_recipes, sub_recipes)
+
+    if lines_changed:
+        # 明細だけが変わった場合もレシピの更新日時を進める
+        recipe.updated_at = datetime.utcnow()
+
+    if lines_changed or yield_changed:
+        # メモリ上の明細から材料費を再計算し、このレシピを使うレシピと商品に反映
         recipe.calculate_material_cost()
+        db.flush()
+        propagate_recipe_changes(db, [recipe.id], loaded_recipes=[recipe])
+
+    db.flush()
 
+    # レスポンスの構築 (コミットで属性が失効する前に組み立てる)
+    response = format_recipe_response(recipe)
     db.commit()
-    db.refresh(recipe)
 
-    return format_recipe_response(recipe)
+    return response
 
 
 @router.delete("/{recipe_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -180,7 +267,12 @@ def delete_recipe(
             detail="レシピが見つかりません"
         )
 
+    # このレシピをサブレシピとして使うレシピは材料費が変わる
+    parent_recipe_ids = [rs.recipe_id for rs in recipe.used_in]
+
     db.delete(recipe)
+    db.flush()
+    propagate_recipe_changes(db, parent_recipe_ids)
     db.commit()
 
     return None
@@ -195,18 +287,172 @@ def format_recipe_response(recipe: Recipe) -> dict:
                 "id": rm.id,
                 "material_id": rm.material_id,
                 "quantity": rm.quantity,
+                "input_quantity": rm.input_quantity,
+                "input_unit": rm.input_unit,
                 "material_name": rm.material.name,
                 "material_unit": rm.material.unit,
                 "cost": rm.material.unit_price * rm.quantity
             })
 
+    sub_recipes = []
+    for rs in recipe.sub_recipes:
+        if rs.sub_recipe:
+            sub_recipes.append({
+                "id": rs.id,
+                "sub_recipe_id": rs.sub_recipe_id,
+                "quantity": rs.quantity,
+                "sub_recipe_name": rs.sub_recipe.name,
+                "cost": rs.sub_recipe.cost_per_unit * rs.quantity
+            })
+
     return {
         "id": recipe.id,
         "user_id": recipe.user_id,
         "name": recipe.name,
         "description": recipe.description,
+        "yield_quantity": recipe.yield_quantity if recipe.yield_quantity is not None else 1,
+        "loss_rate": recipe.loss_rate or 0,
         "material_cost": recipe.material_cost,
+        "cost_per_unit": recipe.cost_per_unit,
         "materials": materials,
+        "sub_recipes": sub_recipes,
         "created_at": recipe.created_at,
         "updated_at": recipe.updated_at
     }
+
+
+def load_materials_or_404(db: Session, user_id: int, material_ids: List[int]) -> Dict[int, Material]:
+    """材料が存在し、かつ現在のユーザーのものであることを1回のクエリで確認"""
+    if not material_ids:
+        return {}
+
+    materials = {
+        material.id: material
+        for material in db.query(Material).filter(
+            Material.id.in_(set(material_ids)),
+            Material.user_id == user_id
+        )
+    }
+
+    for material_id in material_ids:
+        if material_id not in materials:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"材料ID {material_id} が見つかりません"
+            )
+
+    return materials
+
+
+def load_sub_recipes_or_404(db: Session, user_id: int, sub_recipe_ids: List[int]) -> Dict[int, Recipe]:
+    """サブレシピが存在し、かつ現在のユーザーのものであることを1回のクエリで確認"""
+    if not sub_recipe_ids:
+        return {}
+
+    sub_recipes = {
+        sub_recipe.id: sub_recipe
+        for sub_recipe in db.query(Recipe).filter(
+            Recipe.id.in_(set(sub_recipe_ids)),
+            Recipe.user_id == user_id
+        )
+    }
+
+    for sub_recipe_id in sub_recipe_ids:
+        if sub_recipe_id not in sub_recipes:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"レシピID {sub_recipe_id} が見つかりません"
+            )
+
+    return sub_recipes
+
+
+def sync_recipe_materials(recipe: Recipe, materials_data: List[RecipeMaterialCreate],
+                          materials: Dict[int, Material]) -> bool:
+    """材料の明細を入力に合わせる (変更のあった行だけを追加・更新・削除)
+
+    既存の行は材料IDごとに先頭から対応付ける。変更があれば True を返す。
+    """
+    existing = defaultdict(list)
+    for rm in recipe.recipe_materials:
+        existing[rm.material_id].append(rm)
+
+    changed = False
+    for material_data in materials_data:
+        material = materials[material_data.material_id]
+        candidates = existing.get(material_data.material_id)
+        if not candidates:
+            recipe.recipe_materials.append(build_recipe_material(material, material_data))
+            changed = True
+            continue
+
+        # 既存の行と比べるだけなので、RecipeMaterial は作らない
+        # (作ると material の backref でセッションに追加されてしまう)
+        rm = candidates.pop(0)
+        values = recipe_material_values(material, material_data)
+        if (rm.quantity, rm.input_quantity, rm.input_unit) != (
+            values["quantity"], values["input_quantity"], values["input_unit"]
+        ):
+            rm.quantity = values["quantity"]
+            rm.input_quantity = values["input_quantity"]
+            rm.input_unit = values["input_unit"]
+            changed = True
+
+    # 入力にない行を削除 (delete-orphan により DELETE される)
+    for rm in [rm for lines in existing.values() for rm in lines]:
+        recipe.recipe_materials.remove(rm)
+        changed = True
+
+    return changed
+
+
+def sync_recipe_sub_recipes(recipe: Recipe, sub_recipes_data: List[RecipeSubRecipeCreate],
+                            sub_recipes: Dict[int, Recipe]) -> bool:
+    """サブレシピの明細を入力に合わせる (変更のあった行だけを追加・更新・削除)"""
+    existing = defaultdict(list)
+    for rs in recipe.sub_recipes:
+        existing[rs.sub_recipe_id].append(rs)
+
+    changed = False
+    for sub_recipe_data in sub_recipes_data:
+        candidates = existing.get(sub_recipe_data.sub_recipe_id)
+        if not candidates:
+            recipe.sub_recipes.append(RecipeSubRecipe(
+                sub_recipe=sub_recipes[sub_recipe_data.sub_recipe_id],
+                quantity=sub_recipe_data.quantity
+            ))
+            changed = True
+            continue
+
+        rs = candidates.pop(0)
+        if rs.quantity != sub_recipe_data.quantity:
+            rs.quantity = sub_recipe_data.quantity
+            changed = True
+
+    for rs in [rs for lines in existing.values() for rs in lines]:
+        recipe.sub_recipes.remove(rs)
+        changed = True
+
+    return changed
+
+
+def recipe_material_values(material: Material, material_data: RecipeMaterialCreate) -> dict:
+    """入力された使用量を材料の単位に換算した、レシピの材料行の値"""
+    try:
+        quantity = to_material_quantity(material, material_data.quantity, material_data.unit)
+    except UnitConversionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{material.name}: {e}"
+        )
+
+    return {
+        "quantity": quantity,
+        "input_quantity": material_data.quantity,
+        "input_unit": material_data.unit or material.unit
+    }
+
+
+def build_recipe_material(material: Material, material_data: RecipeMaterialCreate) -> RecipeMaterial:
+    """入力された使用量を材料の単位に換算してレシピの材料行を作成"""
+    return RecipeMaterial(material=material, **recipe_material_values(material, material_data))
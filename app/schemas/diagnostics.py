@@ -0,0 +1,36 @@
+from pydantic import BaseModel
+from typing import Dict, Optional, Union
+
+
+class PoolStatus(BaseModel):
+    pool_class: str
+    size: Optional[int] = None  # 常に保持する接続数
+    checked_out: Optional[int] = None  # 使用中の接続数
+    overflow: Optional[int] = None  # pool_size を超えて作成された接続数
+    max_overflow: Optional[int] = None
+    timeout: Optional[float] = None
+
+
+class DatabaseDiagnostics(BaseModel):
+    dialect: str
+    url: str  # パスワードは伏せ字
+    pool: PoolStatus
+    replica_url: Optional[str] = None  # 読み込み用レプリカ (未設定なら None)
+    read_your_writes_seconds: Optional[float] = None
+    sqlite_tuning_enabled: bool = False
+    configured_pragmas: Dict[str, Union[str, int]] = {}  # 設定値
+    active_pragmas: Dict[str, Union[str, int, None]] = {}  # 接続で実際に有効な値
+    statement_timeout: Optional[str] = None  # PostgreSQL の接続で有効な statement_timeout
+
+
+class CacheStats(BaseModel):
+    backend: str
+    entries: Optional[int] = None
+    bytes: Optional[int] = None  # キャッシュした応答の合計サイズ (概算)
+    max_bytes: Optional[int] = None
+    hits: Optional[int] = None
+    misses: Optional[int] = None
+    evictions: Optional[int] = None  # メモリ上限による追い出し
+    invalidations: Optional[int] = None  # 書き込みによって破棄した応答
+    ttl_seconds: Optional[float] = None
+    expirations: Optional[int] = None  # 有効期間が過ぎて使わなかった応答
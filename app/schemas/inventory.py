@@ -0,0 +1,47 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import datetime
+from app.schemas.production import ProductionPlanItem
+
+
+class InventoryEntry(BaseModel):
+    material_id: int
+    transaction_type: Literal["purchase", "waste", "adjustment"]
+    # purchase は入庫、waste は廃棄による出庫 (ともに正の数で指定)、adjustment は符号付きの棚卸調整
+    quantity: float
+    note: Optional[str] = Field(None, max_length=500)
+
+
+class InventoryTransactionBatch(BaseModel):
+    entries: List[InventoryEntry] = Field(..., min_items=1)
+
+
+class InventoryProductionRequest(BaseModel):
+    items: List[ProductionPlanItem] = Field(..., min_items=1)
+    note: Optional[str] = Field(None, max_length=500)
+
+
+class InventoryTransactionResponse(BaseModel):
+    id: int
+    material_id: int
+    transaction_type: str
+    quantity: float
+    note: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class InventoryBalanceResponse(BaseModel):
+    material_id: int
+    material_name: str
+    unit: str
+    quantity: float
+    updated_at: Optional[datetime] = None
+
+
+class InventoryRecordResponse(BaseModel):
+    recorded_count: int
+    balances: List[InventoryBalanceResponse] = []  # 今回の記録で変動した材料の在庫
+    products_without_recipe: List[int] = []
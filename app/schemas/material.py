@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -8,6 +8,7 @@ class MaterialBase(BaseModel):
     purchase_price: float = Field(..., gt=0)
     purchase_quantity: float = Field(..., gt=0)
     unit: str = Field(..., min_length=1, max_length=50)
+    density: Optional[float] = Field(None, gt=0)  # 密度 (g/ml)
 
 
 class MaterialCreate(MaterialBase):
@@ -19,6 +20,7 @@ class MaterialUpdate(BaseModel):
     purchase_price: Optional[float] = Field(None, gt=0)
     purchase_quantity: Optional[float] = Field(None, gt=0)
     unit: Optional[str] = Field(None, min_length=1, max_length=50)
+    density: Optional[float] = Field(None, gt=0)
 
 
 class MaterialResponse(MaterialBase):
@@ -30,3 +32,29 @@ class MaterialResponse(MaterialBase):
 
     class Config:
         from_attributes = True
+
+
+class MaterialPriceHistoryResponse(BaseModel):
+    id: int
+    material_id: int
+    purchase_price: float
+    purchase_quantity: float
+    unit_price: float
+    unit: Optional[str] = None  # 単価の基準の単位 (記録時の材料の単位)
+    effective_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class MaterialImportError(BaseModel):
+    row: int  # データ行の番号 (CSVは列名の行を除いて1から)
+    name: Optional[str] = None
+    message: str
+
+
+class MaterialImportResponse(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    errors: List[MaterialImportError] = []
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 
@@ -26,6 +26,120 @@ class ProductCostCalculation(BaseModel):
     total_monthly_production: int = Field(default=1, gt=0)
 
 
+class ProductBulkRecalculation(BaseModel):
+    total_monthly_production: int = Field(default=1, gt=0)
+    product_ids: Optional[List[int]] = None  # 指定した商品のみ再計算
+    recipe_ids: Optional[List[int]] = None  # 指定したレシピを使う商品のみ再計算
+
+
+class ProductBulkRecalculationResponse(BaseModel):
+    updated_count: int
+    recipe_count: int
+    elapsed_ms: float
+
+
+class MaterialPriceChange(BaseModel):
+    material_id: int
+    purchase_price: Optional[float] = Field(None, gt=0)  # 新しい購入金額
+    percent_change: Optional[float] = Field(None, gt=-100)  # 価格変動率 (%)
+
+
+class PriceScenario(BaseModel):
+    name: Optional[str] = Field(None, max_length=255)
+    changes: List[MaterialPriceChange] = Field(..., min_items=1)
+
+
+class PriceSimulationRequest(BaseModel):
+    scenarios: List[PriceScenario] = Field(..., min_items=1, max_items=100)
+
+
+class SimulatedProductCost(BaseModel):
+    product_id: int
+    name: str
+    current_total_cost: float
+    current_suggested_price: float
+    current_actual_profit_margin: float
+    total_cost: float
+    suggested_price: float
+    actual_profit_margin: float
+
+
+class PriceScenarioResult(BaseModel):
+    name: Optional[str] = None
+    products: List[SimulatedProductCost] = []
+
+
+class PriceSimulationResponse(BaseModel):
+    scenarios: List[PriceScenarioResult] = []
+
+
+class MaterialCostSensitivity(BaseModel):
+    material_id: int
+    material_name: str
+    quantity: float
+    cost: float
+    share: float  # 材料費に占める割合 (%)
+    cost_change_per_percent: float  # 材料価格1%変動あたりの原価の変化
+    suggested_price_change_per_percent: float  # 材料価格1%変動あたりの推奨価格の変化
+    margin_change_per_percent: Optional[float] = None  # 材料価格1%変動あたりの実際の利益率の変化 (ポイント)
+
+
+class ProductCostSensitivity(BaseModel):
+    product_id: int
+    name: str
+    material_cost: float
+    total_cost: float
+    selling_price: Optional[float] = None
+    actual_profit_margin: float
+    materials: List[MaterialCostSensitivity] = []
+
+
+class ProductCostAsOfResponse(BaseModel):
+    product_id: int
+    as_of: datetime
+    material_cost: float
+    fixed_cost_per_unit: float
+    total_cost: float
+    suggested_price: float
+    actual_profit_amount: float
+    actual_profit_margin: float
+    missing_material_ids: List[int] = []  # 指定日時以前の価格履歴がない、または単位を換算できない材料 (現在の単価で計算)
+
+
+class MaterialVolatility(BaseModel):
+    material_id: int
+    volatility: float = Field(..., ge=0, le=100)  # 価格の変動幅 (%)
+
+
+class MonteCarloRequest(BaseModel):
+    n_scenarios: int = Field(default=1000, gt=0, le=50000)
+    distribution: str = Field(default="lognormal", pattern="^(normal|lognormal|uniform)$")
+    default_volatility: float = Field(default=10, ge=0, le=100)  # 個別指定のない材料の変動幅 (%)
+    material_volatilities: List[MaterialVolatility] = []
+    seed: Optional[int] = None
+
+
+class PercentileSummary(BaseModel):
+    p50: float
+    p90: float
+    p99: float
+
+
+class ProductCostDistribution(BaseModel):
+    product_id: int
+    name: str
+    total_cost: PercentileSummary
+    suggested_price: PercentileSummary
+    actual_profit_margin: Optional[PercentileSummary] = None  # 販売価格が未設定の場合はなし
+
+
+class MonteCarloResponse(BaseModel):
+    n_scenarios: int
+    distribution: str
+    elapsed_ms: float
+    products: List[ProductCostDistribution] = []
+
+
 class ProductResponse(ProductBase):
     id: int
     user_id: int
@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class ProductionPlanItem(BaseModel):
+    product_id: int
+    quantity: float = Field(..., gt=0)  # 生産数
+
+
+class ProductionPlan(BaseModel):
+    items: List[ProductionPlanItem] = Field(..., min_items=1)
+
+
+class MaterialRequirement(BaseModel):
+    material_id: int
+    material_name: str
+    unit: str
+    quantity: float  # 必要量 (材料の単位)
+    cost: float
+
+
+class MaterialRequirementsResponse(BaseModel):
+    materials: List[MaterialRequirement] = []
+    total_cost: float
+    products_without_recipe: List[int] = []  # レシピが未設定で材料を計算できない商品
@@ -9,11 +9,13 @@ class RecipeMaterialBase(BaseModel):
 
 
 class RecipeMaterialCreate(RecipeMaterialBase):
-    pass
+    unit: Optional[str] = Field(None, min_length=1, max_length=50)  # 省略時は材料の単位
 
 
 class RecipeMaterialResponse(RecipeMaterialBase):
     id: int
+    input_quantity: Optional[float] = None
+    input_unit: Optional[str] = None
     material_name: Optional[str] = None
     material_unit: Optional[str] = None
     cost: Optional[float] = None
@@ -22,28 +24,62 @@ class RecipeMaterialResponse(RecipeMaterialBase):
         from_attributes = True
 
 
+class RecipeSubRecipeBase(BaseModel):
+    sub_recipe_id: int
+    quantity: float = Field(..., gt=0)
+
+
+class RecipeSubRecipeCreate(RecipeSubRecipeBase):
+    pass
+
+
+class RecipeSubRecipeResponse(RecipeSubRecipeBase):
+    id: int
+    sub_recipe_name: Optional[str] = None
+    cost: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
 class RecipeBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=255)
     description: Optional[str] = Field(None, max_length=1000)
+    yield_quantity: float = Field(default=1, gt=0)  # 1バッチの出来上がり数
+    loss_rate: float = Field(default=0, ge=0, lt=100)  # ロス率 (%)
 
 
 class RecipeCreate(RecipeBase):
     materials: List[RecipeMaterialCreate] = []
+    sub_recipes: List[RecipeSubRecipeCreate] = []
 
 
 class RecipeUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=255)
     description: Optional[str] = Field(None, max_length=1000)
+    yield_quantity: Optional[float] = Field(None, gt=0)
+    loss_rate: Optional[float] = Field(None, ge=0, lt=100)
     materials: Optional[List[RecipeMaterialCreate]] = None
+    sub_recipes: Optional[List[RecipeSubRecipeCreate]] = None
 
 
 class RecipeResponse(RecipeBase):
     id: int
     user_id: int
     material_cost: float
+    cost_per_unit: float
     materials: List[RecipeMaterialResponse] = []
+    sub_recipes: List[RecipeSubRecipeResponse] = []
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
+
+
+class RecipeCostAsOfResponse(BaseModel):
+    recipe_id: int
+    as_of: datetime
+    material_cost: float
+    cost_per_unit: float
+    missing_material_ids: List[int] = []  # 指定日時以前の価格履歴がない、または単位を換算できない材料 (現在の単価で計算)
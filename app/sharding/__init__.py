@@ -0,0 +1,15 @@
+"""
+店舗ごとのデータベースシャーディング
+
+ユーザー (認証情報) はディレクトリ (DATABASE_URL) に置き、材料・レシピなどの店舗のデータは
+users.shard_key が示すシャードに置く。shard_key が空の店舗はディレクトリのデータベースを使う。
+
+使用方法:
+python -m app.sharding status              # シャードごとの店舗数と行数
+python -m app.sharding migrate             # すべてのシャードにマイグレーションを適用
+python -m app.sharding rebalance [--dry-run]  # 店舗をシャード間で移動して偏りをなくす
+python -m app.sharding move STORE_ID SHARD    # 店舗を指定したシャードに移動
+"""
+from app.sharding.registry import DIRECTORY_TABLES, STORE_SHARD_PREFIX, ShardRegistry
+
+__all__ = ["DIRECTORY_TABLES", "STORE_SHARD_PREFIX", "ShardRegistry"]
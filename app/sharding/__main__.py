@@ -0,0 +1,90 @@
+import argparse
+import sys
+from collections import defaultdict
+from app.database import SessionLocal, shards
+from app.models.user import User
+from app.sharding.stores import current_weights, iter_rebalance, migrate_shards, move_store, rebalance_plan
+
+
+def shard_label(key) -> str:
+    return key if key is not None else "(ディレクトリ)"
+
+
+def show_status(db) -> int:
+    placements, weights = current_weights(db)
+    stores = defaultdict(int)
+    rows = defaultdict(int)
+    for user_id, key in placements.items():
+        stores[key] += 1
+        rows[key] += weights.get(user_id, 0)
+    keys = sorted(stores, key=str) if shards.per_store else [None, *shards.group_keys()]
+    for key in keys:
+        if key is None and not stores[key]:
+            continue
+        print(f"{shard_label(key)}: 店舗 {stores[key]} / 行 {rows[key]}")
+    return 0
+
+
+def rebalance(db, dry_run: bool) -> int:
+    plan = rebalance_plan(db)
+    if not plan:
+        print("移動する店舗はありません")
+        return 0
+    if dry_run:
+        for user_id, source, target in plan:
+            print(f"ユーザーID {user_id}: {shard_label(source)} → {target}")
+        return 0
+    try:
+        for user_id, source, target, copied in iter_rebalance(db, plan):
+            print(f"ユーザーID {user_id}: {shard_label(source)} → {target} ({sum(copied.values())} 行)")
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def move(db, store_id: str, target: str) -> int:
+    user = db.query(User).filter(User.store_id == store_id).first()
+    if user is None:
+        print(f"店舗 {store_id} が見つかりません", file=sys.stderr)
+        return 1
+    source = user.shard_key
+    try:
+        copied = move_store(db, user, target)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{store_id}: {shard_label(source)} → {target} ({sum(copied.values())} 行)")
+    return 0
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.sharding")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="シャードごとの店舗数と行数")
+    commands.add_parser("migrate", help="すべてのシャードにマイグレーションを適用")
+    rebalance_parser = commands.add_parser("rebalance", help="店舗をシャード間で移動して偏りをなくす")
+    rebalance_parser.add_argument("--dry-run", action="store_true", help="移動計画の表示のみ")
+    move_parser = commands.add_parser("move", help="店舗を指定したシャードに移動")
+    move_parser.add_argument("store_id")
+    move_parser.add_argument("shard")
+    args = parser.parse_args(argv)
+
+    if not shards.enabled:
+        print("シャーディングが設定されていません (SHARD_URLS / SHARD_URL_TEMPLATE)", file=sys.stderr)
+        return 1
+
+    with SessionLocal() as db:
+        if args.command == "status":
+            return show_status(db)
+        if args.command == "migrate":
+            for key, applied in migrate_shards(db).items():
+                print(f"{key}: {', '.join(applied) if applied else 'なし'}")
+            return 0
+        if args.command == "rebalance":
+            return rebalance(db, args.dry_run)
+        return move(db, args.store_id, args.shard)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
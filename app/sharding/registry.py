@@ -0,0 +1,76 @@
+import threading
+from typing import Callable, Dict, List, Mapping, Optional
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# シャードではなくディレクトリ (DATABASE_URL) に置くテーブル
+DIRECTORY_TABLES = frozenset({"users", "password_reset_tokens"})
+
+# 店舗ごとに1ファイルの場合のシャードキーの接頭辞
+STORE_SHARD_PREFIX = "store_"
+
+
+class ShardRegistry:
+    """シャードキー → エンジン (初回の利用時に作成し、以降は使い回す)
+
+    urls はシャードグループ (キー → 接続URL)。url_template を指定すると、
+    店舗ごとのシャード (store_<ユーザーID>) の接続URLを {shard} を置き換えて作る。
+    """
+
+    def __init__(self, urls: Mapping[str, str], url_template: Optional[str],
+                 engine_factory: Callable[[str], Engine],
+                 async_engine_factory: Callable[[str], AsyncEngine]):
+        self.urls = dict(urls)
+        self.url_template = url_template
+        self.engine_factory = engine_factory
+        self.async_engine_factory = async_engine_factory
+        self._engines: Dict[str, Engine] = {}
+        self._async_engines: Dict[str, AsyncEngine] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.urls or self.url_template)
+
+    @property
+    def per_store(self) -> bool:
+        return self.url_template is not None
+
+    def group_keys(self) -> List[str]:
+        return list(self.urls)
+
+    def store_key(self, user_id: int) -> str:
+        return f"{STORE_SHARD_PREFIX}{user_id}"
+
+    def is_known(self, key: str) -> bool:
+        return key in self.urls or (self.per_store and key.startswith(STORE_SHARD_PREFIX))
+
+    def url_for(self, key: str) -> str:
+        if key in self.urls:
+            return self.urls[key]
+        if self.per_store and key.startswith(STORE_SHARD_PREFIX):
+            return self.url_template.format(shard=key)
+        raise ValueError(f"シャード {key} は設定されていません")
+
+    def engine(self, key: str) -> Engine:
+        with self._lock:
+            if key not in self._engines:
+                self._engines[key] = self.engine_factory(self.url_for(key))
+            return self._engines[key]
+
+    def async_engine(self, key: str) -> AsyncEngine:
+        with self._lock:
+            if key not in self._async_engines:
+                self._async_engines[key] = self.async_engine_factory(self.url_for(key))
+            return self._async_engines[key]
+
+    def async_sync_engine(self, key: str) -> Engine:
+        """非同期セッションの振り分け用 (AsyncEngine の同期側のエンジン)"""
+        return self.async_engine(key).sync_engine
+
+    def dispose(self) -> None:
+        with self._lock:
+            for created in self._engines.values():
+                created.dispose()
+            self._engines.clear()
+            self._async_engines.clear()
@@ -0,0 +1,371 @@
+import hashlib
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from sqlalchemy import Column, Table, delete, func, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import Base, engine as directory_engine, shards
+from app.migrations import run_migrations
+from app.models.user import User
+from app.sharding.registry import DIRECTORY_TABLES
+from app.utils.cache import response_cache
+
+# マイグレーション済みのシャード (プロセスごとに1回だけ確認する)
+_migrated: Set[str] = set()
+
+# 移動先の ID の重なりを確認・コピーする行数 (IN の要素数・executemany の行数)
+COPY_BATCH_SIZE = 500
+
+
+def tenant_tables() -> List[Table]:
+    """店舗のデータのテーブル (外部キーの参照先が先になる順)"""
+    return [table for table in Base.metadata.sorted_tables if table.name not in DIRECTORY_TABLES]
+
+
+def shard_engine(key: Optional[str]) -> Engine:
+    """シャードのエンジン (キーが空ならディレクトリ)。初回はマイグレーションを適用する"""
+    if key is None:
+        return directory_engine
+    created = shards.engine(key)
+    if key not in _migrated:
+        run_migrations(created)
+        reserve_id_range(created, key)
+        _migrated.add(key)
+    return created
+
+
+def generated_id_column(table: Table) -> Optional[Column]:
+    """データベースが採番する ID の列 (なければ None)"""
+    generated = [
+        column for column in table.primary_key.columns
+        if column.autoincrement is not False and not column.foreign_keys
+    ]
+    return generated[0] if generated else None
+
+
+def reserve_id_range(engine: Engine, key: str) -> None:
+    """PostgreSQL のシャードグループの ID をシャードごとの範囲から採番する
+
+    SHARD_URLS の n 番目 (1から) のシャードは n × SHARD_ID_RANGE_SIZE から採番し、
+    店舗を ID を変えずに移動しても移動先の ID と重ならないようにする。
+    SQLite は最大の ID の次を採番するため範囲を分けられない (重なる場合は移動を断る)。
+    """
+    if engine.dialect.name != "postgresql" or key not in shards.group_keys():
+        return
+    start = (shards.group_keys().index(key) + 1) * settings.shard_id_range_size
+    with engine.begin() as connection:
+        for table in tenant_tables():
+            id_column = generated_id_column(table)
+            if id_column is None:
+                continue
+            # まだ範囲に達していない場合だけ進める (採番済みの ID は戻さない)
+            connection.execute(text(
+                "SELECT setval(seq, :start, false) FROM ("
+                "SELECT pg_get_serial_sequence(:table, :column)::regclass AS seq) AS s "
+                "WHERE coalesce(pg_sequence_last_value(seq), 0) < :start"
+            ), {"start": start, "table": table.name, "column": id_column.name})
+
+
+def migrate_shards(db: Session) -> Dict[str, List[str]]:
+    """設定済みのシャードと、店舗が使っているシャードにマイグレーションを適用"""
+    keys = set(shards.group_keys())
+    keys |= {key for (key,) in db.execute(
+        select(User.shard_key).where(User.shard_key.is_not(None)).distinct()
+    )}
+    applied = {}
+    for key in sorted(keys):
+        applied[key] = run_migrations(shards.engine(key))
+        reserve_id_range(shards.engine(key), key)
+        _migrated.add(key)
+        if shards.engine(key).url != directory_engine.url:
+            scrub_users(shards.engine(key))
+    return applied
+
+
+def scrub_users(engine: Engine) -> None:
+    """シャードのユーザー行を仮の値にする (以前の版で写した認証情報を消す)"""
+    table = User.__table__
+    with engine.begin() as connection:
+        for (user_id,) in connection.execute(select(table.c.id)).all():
+            connection.execute(update(table).where(table.c.id == user_id).values(placeholder_user(user_id)))
+
+
+def placeholder_user(user_id: int) -> dict:
+    """シャードに置くユーザー行の値 (外部キーの参照先としてだけ使う)
+
+    ユーザーはディレクトリから読むため、メールアドレス・パスワードなどは写さず、
+    必須の列は他の店舗と重ならない仮の値にする (ログインにも使えない)。
+    """
+    return {
+        "id": user_id,
+        "store_id": f"shard-user-{user_id}",
+        "email": f"shard-user-{user_id}@invalid",
+        "hashed_password": "!",
+        "store_name": "",
+        "is_active": False,
+    }
+
+
+def provision_store(user: User, key: str) -> Engine:
+    """シャードに店舗のユーザー行を作成 (店舗のテーブルの外部キーの参照先)
+
+    以前の版で写したユーザー行が残っている場合は、仮の値で上書きする (migrate_shards でも一括で上書きする)。
+    """
+    target = shard_engine(key)
+    table = User.__table__
+    values = placeholder_user(user.id)
+    with target.begin() as connection:
+        exists = connection.execute(select(table.c.id).where(table.c.id == user.id)).first()
+        if exists is None:
+            connection.execute(insert(table).values(values))
+        else:
+            connection.execute(update(table).where(table.c.id == user.id).values(values))
+    return target
+
+
+def store_counts(db: Session) -> Dict[Optional[str], int]:
+    """シャードごとの店舗数"""
+    return dict(db.execute(
+        select(User.shard_key, func.count(User.id)).group_by(User.shard_key)
+    ).all())
+
+
+def assign_shard(db: Session, user: User) -> Optional[str]:
+    """新しい店舗をシャードに割り当てる (シャーディングが無効なら何もしない)
+
+    店舗ごとのシャードでは専用のシャード、シャードグループでは店舗数が最も少ないシャードを使う。
+    """
+    if not shards.enabled:
+        return None
+    if shards.per_store:
+        key = shards.store_key(user.id)
+    else:
+        counts = store_counts(db)
+        key = min(shards.group_keys(), key=lambda shard: counts.get(shard, 0))
+
+    provision_store(user, key)
+    user.shard_key = key
+    db.commit()
+    return key
+
+
+def store_rows_filter(table: Table, user_id: int):
+    """テーブルから店舗の行を選ぶ条件 (user_id がない明細は親の行の user_id で判定)"""
+    if "user_id" in table.c:
+        return table.c.user_id == user_id
+    for foreign_key in table.foreign_keys:
+        parent = foreign_key.column.table
+        if "user_id" in parent.c:
+            return foreign_key.parent.in_(
+                select(parent.c.id).where(parent.c.user_id == user_id)
+            )
+    raise ValueError(f"テーブル {table.name} の行を店舗に対応付けられません")
+
+
+def store_weights(connection: Connection, user_ids: List[int]) -> Dict[int, int]:
+    """店舗ごとの行数 (user_id を持つテーブルの合計)"""
+    weights: Dict[int, int] = defaultdict(int)
+    if not user_ids:
+        return weights
+    for table in tenant_tables():
+        if "user_id" not in table.c:
+            continue
+        for user_id, count in connection.execute(
+            select(table.c.user_id, func.count()).where(
+                table.c.user_id.in_(user_ids)
+            ).group_by(table.c.user_id)
+        ):
+            weights[user_id] += count
+    return weights
+
+
+def check_id_conflicts(source: Connection, target: Connection, user_id: int) -> None:
+    """店舗の行と同じ ID の行が移動先にないことを確認 (あれば ValueError)"""
+    for table in tenant_tables():
+        id_column = generated_id_column(table)
+        if id_column is None:
+            continue
+        ids = source.execute(select(id_column).where(store_rows_filter(table, user_id))).scalars().all()
+        for start in range(0, len(ids), COPY_BATCH_SIZE):
+            taken = target.execute(
+                select(func.count()).select_from(table).where(id_column.in_(ids[start:start + COPY_BATCH_SIZE]))
+            ).scalar()
+            if taken:
+                raise ValueError(
+                    f"移動先のシャードに同じ ID の行 ({table.name}) があるため、ID を変えずに移動できません"
+                )
+
+
+def copy_store_rows(source: Connection, target: Connection, user_id: int) -> Dict[str, int]:
+    """店舗の行を ID を変えずにシャード間でコピーし、テーブルごとの行数を返す
+
+    クライアントが保持している ID (URL・ETag のキャッシュなど) が移動後も同じ行を指すように、
+    ID を振り直さない。移動先に同じ ID の行があれば、何も書き込まずに ValueError を送出する。
+    """
+    check_id_conflicts(source, target, user_id)
+    copied = {}
+    for table in tenant_tables():
+        count = 0
+        rows = source.execute(select(table).where(store_rows_filter(table, user_id))).mappings()
+        for batch in rows.partitions(COPY_BATCH_SIZE):
+            target.execute(insert(table), [dict(row) for row in batch])
+            count += len(batch)
+        copied[table.name] = count
+    return copied
+
+
+def delete_store_rows(connection: Connection, user_id: int) -> None:
+    """店舗の行を削除 (参照する側のテーブルから順に)"""
+    for table in reversed(tenant_tables()):
+        connection.execute(delete(table).where(store_rows_filter(table, user_id)))
+
+
+def store_checksum(connection: Connection, user_id: int) -> str:
+    """店舗の行のチェックサム (移動中に書き込まれていないかの確認に使う)"""
+    digest = hashlib.sha256()
+    for table in tenant_tables():
+        digest.update(table.name.encode())
+        rows = connection.execute(
+            select(table).where(store_rows_filter(table, user_id)).order_by(*table.primary_key.columns)
+        )
+        for row in rows:
+            digest.update(repr(tuple(row)).encode())
+    return digest.hexdigest()
+
+
+def set_moving(db: Session, user: User, moving: bool) -> None:
+    """店舗の移動中フラグを設定 (移動中は API からの書き込みを 423 で断る)"""
+    db.execute(update(User).where(User.id == user.id).values(shard_moving=moving))
+    db.commit()
+
+
+def move_store(db: Session, user: User, target_key: str) -> Dict[str, int]:
+    """店舗のデータを別のシャードに移動し、テーブルごとの行数を返す
+
+    移動中フラグの設定 → コピー先への書き込み → ディレクトリの shard_key の更新 → コピー元の削除の順に行う。
+    行は ID を変えずにコピーし、移動先に同じ ID の行があれば移動を断る (ValueError)。
+    フラグを設定する前に始まっていた書き込みに備え、コピーの前後と削除の前にコピー元の行を照合し、
+    変わっていれば ValueError を送出する (コピーの後ならコピー先に書き込まず、削除の前ならコピー元を残す)。
+    途中で失敗した場合は同じ移動をやり直せばよい (コピー先の行は先に削除してから書き込む)。
+    """
+    if not shards.is_known(target_key):
+        raise ValueError(f"シャード {target_key} は設定されていません")
+    source_key = user.shard_key
+    if source_key == target_key:
+        return {}
+
+    source_engine = shard_engine(source_key)
+    target_engine = provision_store(user, target_key)
+
+    set_moving(db, user, True)
+    try:
+        with source_engine.connect() as source:
+            checksum = store_checksum(source, user.id)
+        with source_engine.connect() as source, target_engine.begin() as target:
+            delete_store_rows(target, user.id)
+            copied = copy_store_rows(source, target, user.id)
+            with source_engine.connect() as current:
+                if store_checksum(current, user.id) != checksum:
+                    raise ValueError(f"店舗 {user.store_id} のデータがコピー中に変更されたため、移動を中止しました")
+    except Exception:
+        db.rollback()
+        set_moving(db, user, False)
+        raise
+
+    db.execute(update(User).where(User.id == user.id).values(shard_key=target_key, shard_moving=False))
+    db.commit()
+    # セッションを経由しない書き込みのため、店舗のキャッシュをまとめて無効化する
+    response_cache.invalidate_store(user.id)
+
+    with source_engine.begin() as source:
+        if store_checksum(source, user.id) != checksum:
+            raise ValueError(
+                f"店舗 {user.store_id} の移動元 ({source_key or 'ディレクトリ'}) のデータが移動中に変更されたため、"
+                "移動元の行を残しました。移動先に反映してから削除してください"
+            )
+        delete_store_rows(source, user.id)
+    return copied
+
+
+def plan_rebalance(placements: Dict[int, Optional[str]], weights: Dict[int, int],
+                   shard_keys: List[str]) -> List[Tuple[int, Optional[str], str]]:
+    """店舗の移動計画 [(ユーザーID, 移動元, 移動先)] を作成
+
+    シャードグループにない店舗 (ディレクトリや削除したシャード) は行数の多い順に
+    最も軽いシャードへ移す。その後、最も重いシャードから最も軽いシャードへ、
+    両者の差が縮まる店舗を1つずつ移し、縮まらなくなったら終了する。
+    """
+    loads = {key: 0 for key in shard_keys}
+    members: Dict[str, List[int]] = defaultdict(list)
+    moves: Dict[int, Tuple[Optional[str], str]] = {}
+
+    unplaced = []
+    for user_id, key in placements.items():
+        if key in loads:
+            loads[key] += weights.get(user_id, 0)
+            members[key].append(user_id)
+        else:
+            unplaced.append(user_id)
+
+    for user_id in sorted(unplaced, key=lambda uid: -weights.get(uid, 0)):
+        target = min(shard_keys, key=lambda key: loads[key])
+        loads[target] += weights.get(user_id, 0)
+        members[target].append(user_id)
+        moves[user_id] = (placements[user_id], target)
+
+    for _ in range(len(placements)):
+        heavy = max(shard_keys, key=lambda key: loads[key])
+        light = min(shard_keys, key=lambda key: loads[key])
+        gap = loads[heavy] - loads[light]
+        candidates = [uid for uid in members[heavy] if 0 < weights.get(uid, 0) < gap]
+        if not candidates:
+            break
+        # 移動後の差 |gap - 2w| が最も小さくなる店舗
+        user_id = min(candidates, key=lambda uid: abs(gap - 2 * weights[uid]))
+        members[heavy].remove(user_id)
+        members[light].append(user_id)
+        loads[heavy] -= weights[user_id]
+        loads[light] += weights[user_id]
+        source = moves.get(user_id, (placements[user_id], None))[0]
+        if source == light:
+            moves.pop(user_id, None)
+        else:
+            moves[user_id] = (source, light)
+
+    return [(user_id, source, target) for user_id, (source, target) in sorted(moves.items())]
+
+
+def current_weights(db: Session) -> Tuple[Dict[int, Optional[str]], Dict[int, int]]:
+    """店舗の配置 (ユーザーID → シャード) と行数"""
+    placements = dict(db.execute(select(User.id, User.shard_key)).all())
+    by_shard: Dict[Optional[str], List[int]] = defaultdict(list)
+    for user_id, key in placements.items():
+        by_shard[key].append(user_id)
+
+    weights: Dict[int, int] = {}
+    for key, user_ids in by_shard.items():
+        if key is not None and not shards.is_known(key):
+            continue
+        with shard_engine(key).connect() as connection:
+            weights.update(store_weights(connection, user_ids))
+    return placements, weights
+
+
+def rebalance_plan(db: Session) -> List[Tuple[int, Optional[str], str]]:
+    """現在の配置から移動計画を作成 (店舗ごとのシャードでは専用のシャードにない店舗を移す)"""
+    placements, weights = current_weights(db)
+    if shards.per_store:
+        return [
+            (user_id, key, shards.store_key(user_id))
+            for user_id, key in sorted(placements.items())
+            if key != shards.store_key(user_id)
+        ]
+    return plan_rebalance(placements, weights, shards.group_keys())
+
+
+def iter_rebalance(db: Session, plan) -> Iterator[Tuple[int, Optional[str], str, Dict[str, int]]]:
+    """移動計画を1店舗ずつ実行"""
+    for user_id, source, target in plan:
+        user = db.get(User, user_id)
+        yield user_id, source, target, move_store(db, user, target)
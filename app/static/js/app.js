@@ -4,6 +4,8 @@ let authToken = null;
 let allMaterials = [];
 let allRecipes = [];
 let allProducts = [];
+// 一覧の条件付き取得用のキャッシュ (URL → {etag, data})
+const etagCache = new Map();
 
 // ページ読み込み時の初期化
 document.addEventListener('DOMContentLoaded', () => {
@@ -139,10 +141,37 @@ async function handleRegister(e) {
 function handleLogout() {
     authToken = null;
     localStorage.removeItem('authToken');
+    etagCache.clear();
     showMessage('ログアウトしました', 'info');
     showAuthSection();
 }
 
+// GET を If-None-Match 付きで送り、304 の場合は前回のデータを返す (失敗時は null)
+async function fetchJsonWithETag(url) {
+    const headers = {'Authorization': `Bearer ${authToken}`};
+    const cached = etagCache.get(url);
+    if (cached) {
+        headers['If-None-Match'] = cached.etag;
+    }
+
+    const response = await fetch(url, {headers, cache: 'no-store'});
+    if (response.status === 304 && cached) {
+        return cached.data;
+    }
+    if (!response.ok) {
+        return null;
+    }
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        etagCache.set(url, {etag, data});
+    } else {
+        etagCache.delete(url);
+    }
+    return data;
+}
+
 // 初期データ読み込み
 async function loadInitialData() {
     loadSectionData('materials');
@@ -162,11 +191,9 @@ async function loadSectionData(section) {
 // === 材料管理 ===
 async function loadMaterials() {
     try {
-        const response = await fetch('/api/materials/', {
-            headers: {'Authorization': `Bearer ${authToken}`}
-        });
-        if (response.ok) {
-            allMaterials = await response.json();
+        const data = await fetchJsonWithETag('/api/materials/');
+        if (data) {
+            allMaterials = data;
             displayMaterials(allMaterials);
         }
     } catch (error) {
@@ -301,11 +328,9 @@ async function deleteMaterial(id) {
 // === レシピ管理 ===
 async function loadRecipes() {
     try {
-        const response = await fetch('/api/recipes/', {
-            headers: {'Authorization': `Bearer ${authToken}`}
-        });
-        if (response.ok) {
-            allRecipes = await response.json();
+        const data = await fetchJsonWithETag('/api/recipes/');
+        if (data) {
+            allRecipes = data;
             displayRecipes(allRecipes);
         }
     } catch (error) {
@@ -482,13 +507,12 @@ async function deleteRecipe(id) {
 // === 固定費管理 ===
 async function loadFixedCosts() {
     try {
-        const [costsRes, totalRes] = await Promise.all([
-            fetch('/api/fixed-costs/', {headers: {'Authorization': `Bearer ${authToken}`}}),
+        const [costs, totalRes] = await Promise.all([
+            fetchJsonWithETag('/api/fixed-costs/'),
             fetch('/api/fixed-costs/total', {headers: {'Authorization': `Bearer ${authToken}`}})
         ]);
 
-        if (costsRes.ok && totalRes.ok) {
-            const costs = await costsRes.json();
+        if (costs && totalRes.ok) {
             const total = await totalRes.json();
             displayFixedCosts(costs, total.total_monthly_fixed_cost);
         }
@@ -625,11 +649,9 @@ async function deleteFixedCost(id) {
 // === 商品管理 ===
 async function loadProducts() {
     try {
-        const response = await fetch('/api/products/', {
-            headers: {'Authorization': `Bearer ${authToken}`}
-        });
-        if (response.ok) {
-            allProducts = await response.json();
+        const data = await fetchJsonWithETag('/api/products/');
+        if (data) {
+            allProducts = data;
             displayProducts(allProducts);
         }
     } catch (error) {
@@ -794,11 +816,9 @@ let selectedProductIds = [];
 
 async function loadLabelProducts() {
     try {
-        const response = await fetch('/api/products/', {
-            headers: {'Authorization': `Bearer ${authToken}`}
-        });
-        if (response.ok) {
-            allProducts = await response.json();
+        const data = await fetchJsonWithETag('/api/products/');
+        if (data) {
+            allProducts = data;
             displayLabelProducts(allProducts);
         }
     } catch (error) {
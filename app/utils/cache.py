@@ -0,0 +1,319 @@
+import importlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain
+from time import monotonic
+from typing import Dict, Iterable, NamedTuple, Optional, Set, Tuple
+from fastapi import Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect
+from app.config import settings
+from app.database import RoutingSession
+from app.utils.etag import etag_matches
+
+# テーブル → キャッシュのリソース
+TABLE_RESOURCES = {
+    "materials": "materials",
+    "material_price_history": "materials",
+    "recipes": "recipes",
+    "recipe_materials": "recipes",
+    "recipe_sub_recipes": "recipes",
+    "products": "products",
+    "fixed_costs": "fixed-costs",
+    "inventory_transactions": "inventory",
+    "inventory_balances": "inventory",
+}
+
+# 書き込んだリソース → 応答が変わるリソース
+# (レシピは材料名・単価を、商品の原価は材料・レシピ・固定費を、在庫は材料名を含む)
+INVALIDATES = {
+    "materials": {"materials", "recipes", "products", "inventory"},
+    "recipes": {"recipes", "products"},
+    "products": {"products"},
+    "fixed-costs": {"fixed-costs", "products"},
+    "inventory": {"inventory"},
+}
+
+# 応答と一緒にキャッシュするヘッダー
+CACHED_HEADERS = ("etag", "cache-control", "x-next-cursor")
+
+# 1件あたりのキー・辞書などの概算のバイト数 (メモリ上限の計算用)
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class CacheKey(NamedTuple):
+    user_id: int
+    resource: str
+    generation: int  # 無効化のたびに増える番号 (古い番号のキーには二度とアクセスされない)
+    path: str
+    query: str
+
+    def as_string(self) -> str:
+        """共有キャッシュ用の文字列のキー"""
+        return f"{self.user_id}:{self.resource}:{self.generation}:{self.path}?{self.query}"
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers.items()) + ENTRY_OVERHEAD_BYTES
+
+
+class CacheBackend(ABC):
+    """応答キャッシュの保存先
+
+    複数のワーカーで動かす場合は、世代番号と応答を共有ストア (Redis など) に置く
+    実装を RESPONSE_CACHE_BACKEND に指定する。
+    """
+
+    @abstractmethod
+    def generation(self, user_id: int, resource: str) -> int:
+        """店舗・リソースの現在の世代番号"""
+
+    @abstractmethod
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        pass
+
+    @abstractmethod
+    def set(self, key: CacheKey, value: CachedResponse) -> None:
+        pass
+
+    @abstractmethod
+    def invalidate(self, user_id: int, resources: Iterable[str]) -> None:
+        """店舗のリソースの世代番号を進め、古い応答を使われなくする"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """ヒット・ミス・追い出しの回数など"""
+
+
+class LocalLRUCache(CacheBackend):
+    """プロセス内の LRU キャッシュ (合計サイズが max_bytes を超えたら古いものから追い出す)
+
+    ワーカー間では共有されないため、単一ワーカーとテスト用。他のワーカーの書き込みでは
+    破棄されないため、ttl_seconds を指定すると保存からその秒数が過ぎた応答は使わない。
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[CacheKey, CachedResponse]" = OrderedDict()
+        self._expires: Dict[CacheKey, float] = {}
+        self._generations: Dict[Tuple[int, str], int] = {}
+        # (ユーザーID, リソース) → キー (無効化のときに全件を走査しないため)
+        self._keys: Dict[Tuple[int, str], Set[CacheKey]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def generation(self, user_id: int, resource: str) -> int:
+        with self._lock:
+            return self._generations.get((user_id, resource), 0)
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            if key in self._expires and self._expires[key] <= monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: CacheKey, value: CachedResponse) -> None:
+        size = value.size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # 保存までの間に無効化された場合は保存しない
+            if key.generation != self._generations.get((key.user_id, key.resource), 0):
+                return
+            self._remove(key)
+            self._entries[key] = value
+            if self.ttl_seconds is not None:
+                self._expires[key] = monotonic() + self.ttl_seconds
+            self._keys.setdefault((key.user_id, key.resource), set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: CacheKey) -> None:
+        value = self._entries.pop(key, None)
+        if value is None:
+            return
+        self._bytes -= value.size
+        self._expires.pop(key, None)
+        tenant_keys = self._keys[(key.user_id, key.resource)]
+        tenant_keys.discard(key)
+        if not tenant_keys:
+            del self._keys[(key.user_id, key.resource)]
+
+    def invalidate(self, user_id: int, resources: Iterable[str]) -> None:
+        with self._lock:
+            for resource in set(resources):
+                tenant = (user_id, resource)
+                self._generations[tenant] = self._generations.get(tenant, 0) + 1
+                stale = self._keys.get(tenant, ())
+                self.invalidations += len(stale)
+                for key in list(stale):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._expires.clear()
+            self._keys.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": type(self).__name__,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl_seconds,
+                "expirations": self.expirations,
+            }
+
+
+class NullCache(CacheBackend):
+    """キャッシュしない (RESPONSE_CACHE_ENABLED=false の場合、既定では共有キャッシュがない場合も)"""
+
+    def generation(self, user_id: int, resource: str) -> int:
+        return 0
+
+    def get(self, key: CacheKey) -> Optional[CachedResponse]:
+        return None
+
+    def set(self, key: CacheKey, value: CachedResponse) -> None:
+        pass
+
+    def invalidate(self, user_id: int, resources: Iterable[str]) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__}
+
+
+def create_backend() -> CacheBackend:
+    """設定に応じたキャッシュの保存先を作成 (RESPONSE_CACHE_BACKEND は "モジュール:クラス")
+
+    RESPONSE_CACHE_ENABLED を指定しない場合は、共有キャッシュを設定したときだけ有効にする
+    (プロセス内のキャッシュは、複数のワーカーでは他のワーカーの書き込みを反映できないため)。
+    """
+    enabled = settings.response_cache_enabled
+    if enabled is None:
+        enabled = settings.response_cache_backend is not None
+    if not enabled:
+        return NullCache()
+    if settings.response_cache_backend:
+        module_name, _, class_name = settings.response_cache_backend.partition(":")
+        return getattr(importlib.import_module(module_name), class_name)()
+    return LocalLRUCache(settings.response_cache_max_bytes, settings.response_cache_ttl_seconds)
+
+
+class ResponseCache:
+    """店舗・リソース・URL ごとの応答キャッシュ (書き込みのコミット時に無効化)"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    def key(self, request: Request, resource: str, user_id: int) -> CacheKey:
+        """キャッシュのキー (DB を読む前に作成し、世代番号を固定する)"""
+        return CacheKey(
+            user_id, resource, self.backend.generation(user_id, resource),
+            request.url.path, request.url.query
+        )
+
+    def lookup(self, request: Request, key: CacheKey) -> Optional[Response]:
+        """キャッシュがあれば応答を返す (If-None-Match が一致すれば 304)"""
+        cached = self.backend.get(key)
+        if cached is None:
+            return None
+        etag = cached.headers.get("etag")
+        if etag and etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={
+                name: value for name, value in cached.headers.items() if name != "x-next-cursor"
+            })
+        return Response(content=cached.body, media_type="application/json", headers=cached.headers)
+
+    def store(self, key: CacheKey, response: Response, response_model, data) -> Response:
+        """応答をシリアライズしてキャッシュし、その応答を返す"""
+        body = type_adapter(response_model).dump_json(
+            type_adapter(response_model).validate_python(data, from_attributes=True)
+        )
+        headers = {
+            name: response.headers[name] for name in CACHED_HEADERS if name in response.headers
+        }
+        self.backend.set(key, CachedResponse(body, headers))
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def invalidate_tables(self, user_id: int, tables: Iterable[str]) -> None:
+        resources = set()
+        for table in tables:
+            resource = TABLE_RESOURCES.get(table)
+            if resource is not None:
+                resources |= INVALIDATES[resource]
+        if resources:
+            self.backend.invalidate(user_id, resources)
+
+    def invalidate_store(self, user_id: int) -> None:
+        """店舗のすべてのリソースを無効化 (セッションを経由しない書き込みの後に使う)"""
+        self.backend.invalidate(user_id, INVALIDATES)
+
+
+@lru_cache(maxsize=None)
+def type_adapter(response_model) -> TypeAdapter:
+    return TypeAdapter(response_model)
+
+
+response_cache = ResponseCache(create_backend())
+
+
+def written_tables(session) -> Set[str]:
+    return session.info.setdefault("written_tables", set())
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _record_flushed_tables(session, flush_context):
+    tables = written_tables(session)
+    for instance in chain(session.new, session.dirty, session.deleted):
+        tables.add(inspect(instance).mapper.local_table.name)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _record_dml_tables(orm_execute_state):
+    # session.execute(insert/update/delete) はフラッシュを経由しない
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        written_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _invalidate_written_tables(session):
+    # ロールバックした書き込みも次のコミットで無効化される (多めに無効化しても応答は正しい)
+    tables = session.info.pop("written_tables", None)
+    user_id = session.info.get("user_id")
+    if tables and user_id is not None:
+        response_cache.invalidate_tables(user_id, tables)
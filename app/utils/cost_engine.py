@@ -0,0 +1,337 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+from datetime import datetime
+import numpy as np
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from app.models.material import Material
+from app.models.material_price_history import MaterialPriceHistory
+from app.models.recipe import Recipe, RecipeMaterial, RecipeSubRecipe
+from app.models.product import Product
+from app.utils.recipe_graph import topological_levels
+from app.utils.units import UnitConversionError, conversion_factor
+
+
+class CostCatalog:
+    """店舗の材料・レシピ・商品を配列として保持し、原価をまとめて計算する
+
+    レシピ×材料の使用量は疎行列 (COO形式: 行=レシピ, 列=材料, 値=使用量) として
+    保持し、材料費は疎行列とベクトルの積で計算する。計算式は
+    Recipe.calculate_material_cost と Product.calculate_costs に一致させる。
+
+    サブレシピは依存関係のDAGを段数 (トポロジカル順) ごとに処理し、
+    各レシピの材料費を1回だけ計算して親レシピに加算する。
+    """
+
+    def __init__(self, materials, recipes, recipe_materials, products, sub_recipes=()):
+        # 材料
+        self.material_ids = np.array([m[0] for m in materials], dtype=np.int64)
+        self.purchase_prices = np.array([m[1] for m in materials], dtype=np.float64)
+        self.purchase_quantities = np.array([m[2] for m in materials], dtype=np.float64)
+        self.unit_prices = np.array([m[3] for m in materials], dtype=np.float64)
+        self.material_names = [m[4] for m in materials]
+        self.material_units = [m[5] for m in materials]
+        self.material_densities = [m[6] if len(m) > 6 else None for m in materials]
+        self.material_index = {int(material_id): i for i, material_id in enumerate(self.material_ids)}
+
+        # レシピ
+        self.recipe_ids = np.array([r[0] for r in recipes], dtype=np.int64)
+        self.recipe_index = {int(recipe_id): i for i, recipe_id in enumerate(self.recipe_ids)}
+        yield_quantities = np.array([1 if r[1] is None else r[1] for r in recipes], dtype=np.float64)
+        loss_rates = np.array([r[2] or 0 for r in recipes], dtype=np.float64)
+        effective_yields = yield_quantities * (1 - loss_rates / 100)
+        # 出来上がり数が0以下のレシピはバッチ全体を1個とみなす (Recipe.cost_per_unit と同じ)
+        self.recipe_effective_yields = np.where(effective_yields > 0, effective_yields, 1.0)
+
+        # レシピ×材料の疎行列 (存在しない材料・レシピを参照する行は除外)
+        lines = [
+            (self.recipe_index[recipe_id], self.material_index[material_id], quantity)
+            for recipe_id, material_id, quantity in recipe_materials
+            if recipe_id in self.recipe_index and material_id in self.material_index
+        ]
+        self.line_recipe_idx = np.array([line[0] for line in lines], dtype=np.int64)
+        self.line_material_idx = np.array([line[1] for line in lines], dtype=np.int64)
+        self.line_quantities = np.array([line[2] for line in lines], dtype=np.float64)
+
+        # サブレシピの辺 (親, 子, 使用量) を親の段数順に並べる
+        edges = [
+            (self.recipe_index[parent_id], self.recipe_index[child_id], quantity)
+            for parent_id, child_id, quantity in sub_recipes
+            if parent_id in self.recipe_index and child_id in self.recipe_index
+        ]
+        levels = topological_levels(range(len(self.recipe_ids)), [(e[0], e[1]) for e in edges])
+        edges.sort(key=lambda e: levels[e[0]])
+        self.edge_parent_idx = np.array([e[0] for e in edges], dtype=np.int64)
+        self.edge_child_idx = np.array([e[1] for e in edges], dtype=np.int64)
+        self.edge_quantities = np.array([e[2] for e in edges], dtype=np.float64)
+        # サブレシピの使用量は出来上がり個数単位なので、子のバッチ数に換算しておく
+        self.edge_batches = self.edge_quantities / self.recipe_effective_yields[self.edge_child_idx]
+        edge_levels = np.array([levels[e[0]] for e in edges], dtype=np.int64)
+        # 段数ごとの辺の範囲 (段数1から順に処理する)
+        self.edge_level_bounds = np.searchsorted(
+            edge_levels, np.arange(1, (edge_levels.max() if len(edges) else 0) + 2)
+        )
+
+        # 商品
+        self.product_ids = np.array([p[0] for p in products], dtype=np.int64)
+        self.product_recipe_idx = np.array(
+            [self.recipe_index.get(p[1], -1) if p[1] is not None else -1 for p in products],
+            dtype=np.int64
+        )
+        self.product_include_fixed_cost = np.array([bool(p[2]) for p in products], dtype=bool)
+        self.product_fixed_costs_per_unit = np.array([p[3] or 0 for p in products], dtype=np.float64)
+        self.product_material_costs = np.array([p[4] or 0 for p in products], dtype=np.float64)
+        self.product_profit_margins = np.array([p[5] or 0 for p in products], dtype=np.float64)
+        self.product_selling_prices = np.array([p[6] or 0 for p in products], dtype=np.float64)
+        self.product_names = [p[7] for p in products]
+
+    @classmethod
+    def load(cls, db: Session, user_id: int, product_ids: Optional[Sequence[int]] = None,
+             recipe_ids: Optional[Sequence[int]] = None) -> "CostCatalog":
+        """店舗のデータを列単位の少数のクエリで読み込む
+
+        product_ids / recipe_ids を指定した場合、対象の商品だけを読み込む。
+        """
+        materials = db.query(
+            Material.id, Material.purchase_price, Material.purchase_quantity,
+            Material.unit_price, Material.name, Material.unit, Material.density
+        ).filter(Material.user_id == user_id).order_by(Material.id).all()
+
+        recipes = db.query(
+            Recipe.id, Recipe.yield_quantity, Recipe.loss_rate
+        ).filter(Recipe.user_id == user_id).order_by(Recipe.id).all()
+
+        recipe_materials = db.query(
+            RecipeMaterial.recipe_id, RecipeMaterial.material_id, RecipeMaterial.quantity
+        ).join(Recipe, Recipe.id == RecipeMaterial.recipe_id).filter(
+            Recipe.user_id == user_id
+        ).all()
+
+        sub_recipes = db.query(
+            RecipeSubRecipe.recipe_id, RecipeSubRecipe.sub_recipe_id, RecipeSubRecipe.quantity
+        ).join(Recipe, Recipe.id == RecipeSubRecipe.recipe_id).filter(
+            Recipe.user_id == user_id
+        ).all()
+
+        product_query = db.query(
+            Product.id, Product.recipe_id, Product.include_fixed_cost,
+            Product.fixed_cost_per_unit, Product.material_cost,
+            Product.profit_margin, Product.selling_price, Product.name
+        ).filter(Product.user_id == user_id)
+        if product_ids is not None:
+            product_query = product_query.filter(Product.id.in_(product_ids))
+        if recipe_ids is not None:
+            product_query = product_query.filter(Product.recipe_id.in_(recipe_ids))
+        products = product_query.order_by(Product.id).all()
+
+        return cls(materials, recipes, recipe_materials, products, sub_recipes)
+
+    def unit_prices_as_of(self, db: Session, user_id: int, as_of: datetime) -> Tuple[np.ndarray, List[int]]:
+        """指定日時時点の材料単価を1回の範囲クエリで取得
+
+        履歴の単価は記録時の単位あたりなので、レシピの使用量 (現在の単位) に合わせて換算する。
+        戻り値は (単価の配列, 時点の単価を使えない材料IDのリスト)。履歴がない材料と、
+        記録時の単位から現在の単位に換算できない材料は現在の単価を使う。
+        """
+        latest = db.query(
+            MaterialPriceHistory.material_id,
+            func.max(MaterialPriceHistory.effective_at).label("effective_at")
+        ).filter(
+            MaterialPriceHistory.user_id == user_id,
+            MaterialPriceHistory.effective_at <= as_of
+        ).group_by(MaterialPriceHistory.material_id).subquery()
+
+        rows = db.query(
+            MaterialPriceHistory.material_id, MaterialPriceHistory.unit_price, MaterialPriceHistory.unit
+        ).join(
+            latest, and_(
+                MaterialPriceHistory.material_id == latest.c.material_id,
+                MaterialPriceHistory.effective_at == latest.c.effective_at
+            )
+        ).all()
+
+        unit_prices = self.unit_prices.copy()
+        found = np.zeros(len(self.material_ids), dtype=bool)
+        for material_id, unit_price, unit in rows:
+            m = self.material_index.get(material_id)
+            if m is None:
+                continue
+            try:
+                # 現在の単位1つが記録時の単位でいくつになるか
+                factor = 1.0 if unit is None else conversion_factor(
+                    self.material_units[m], unit, self.material_densities[m]
+                )
+            except UnitConversionError:
+                continue
+            unit_prices[m] = unit_price * factor
+            found[m] = True
+
+        return unit_prices, self.material_ids[~found].tolist()
+
+    def unit_prices_from_purchase(self, purchase_prices: np.ndarray) -> np.ndarray:
+        """購入金額から単価を計算 (Material.calculate_unit_price と同じ式)"""
+        quantities = self.purchase_quantities
+        safe_quantities = np.where(quantities > 0, quantities, 1)
+        return np.where(quantities > 0, purchase_prices / safe_quantities, 0.0)
+
+    def recipe_material_costs(self, unit_prices: Optional[np.ndarray] = None) -> np.ndarray:
+        """全レシピの材料費 (1バッチ分) を計算
+
+        unit_prices は材料数の1次元配列、またはシナリオ数×材料数の2次元配列。
+        2次元の場合はシナリオ数×レシピ数の配列を返す。
+        """
+        if unit_prices is None:
+            unit_prices = self.unit_prices
+        prices = np.asarray(unit_prices, dtype=np.float64).T
+
+        # 各行の費用 = 使用量 × 単価 を、レシピごとに合計 (疎行列×ベクトル)
+        quantities = self.line_quantities.reshape((-1,) + (1,) * (prices.ndim - 1))
+        line_costs = quantities * prices[self.line_material_idx]
+        costs = np.zeros((len(self.recipe_ids),) + prices.shape[1:])
+        np.add.at(costs, self.line_recipe_idx, line_costs)
+
+        return self._accumulate_sub_recipes(costs).T
+
+    def _accumulate_sub_recipes(self, values: np.ndarray) -> np.ndarray:
+        """サブレシピの値 (1バッチ分) を段数の低い順に親レシピへ加算する (先頭の軸がレシピ)"""
+        for level in range(len(self.edge_level_bounds) - 1):
+            start, end = self.edge_level_bounds[level], self.edge_level_bounds[level + 1]
+            if start == end:
+                continue
+            parents = self.edge_parent_idx[start:end]
+            children = self.edge_child_idx[start:end]
+            quantities = self.edge_batches[start:end].reshape((-1,) + (1,) * (values.ndim - 1))
+            np.add.at(values, parents, quantities * values[children])
+        return values
+
+    def recipe_material_quantities(self):
+        """レシピ×材料の使用量を (レシピ, 材料) ごとに集約した疎行列として返す
+
+        サブレシピで使う材料も親レシピの使用量として展開する。戻り値は (レシピ位置, 材料位置, 使用量) の配列で、レシピ位置・材料位置の順に並ぶ。
+        """
+        if len(self.edge_parent_idx):
+            # サブレシピがある場合は、サブレシピの材料を親レシピに展開する
+            dense = np.zeros((len(self.recipe_ids), len(self.material_ids)))
+            np.add.at(dense, (self.line_recipe_idx, self.line_material_idx), self.line_quantities)
+            dense = self._accumulate_sub_recipes(dense)
+            recipe_idx, material_idx = np.nonzero(dense)
+            return recipe_idx, material_idx, dense[recipe_idx, material_idx]
+
+        material_count = max(len(self.material_ids), 1)
+        keys = self.line_recipe_idx * material_count + self.line_material_idx
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        quantities = np.bincount(inverse, weights=self.line_quantities, minlength=len(unique_keys))
+        return unique_keys // material_count, unique_keys % material_count, quantities
+
+    def recipe_unit_costs(self, recipe_costs: np.ndarray) -> np.ndarray:
+        """1バッチ分の材料費を出来上がり1個あたりの材料費に換算"""
+        return np.asarray(recipe_costs, dtype=np.float64) / self.recipe_effective_yields
+
+    def material_requirements(self, product_quantities: np.ndarray) -> np.ndarray:
+        """商品ごとの生産数から、材料ごとの必要量 (材料の単位) を計算
+
+        商品 → レシピの必要個数を集計し、サブレシピは段数の高い順 (親から子) に展開してから、
+        レシピ×材料の疎行列とバッチ数ベクトルの積で材料の必要量を求める。
+        """
+        product_quantities = np.asarray(product_quantities, dtype=np.float64)
+        has_recipe = self.product_recipe_idx >= 0
+        demand = np.bincount(
+            self.product_recipe_idx[has_recipe],
+            weights=product_quantities[has_recipe],
+            minlength=len(self.recipe_ids)
+        ).astype(np.float64)
+
+        # 親レシピのバッチ数に応じて、サブレシピの必要個数を加算 (親の段数が高い順)
+        for level in reversed(range(len(self.edge_level_bounds) - 1)):
+            start, end = self.edge_level_bounds[level], self.edge_level_bounds[level + 1]
+            if start == end:
+                continue
+            parents = self.edge_parent_idx[start:end]
+            parent_batches = demand[parents] / self.recipe_effective_yields[parents]
+            np.add.at(demand, self.edge_child_idx[start:end], parent_batches * self.edge_quantities[start:end])
+
+        batches = demand / self.recipe_effective_yields
+        return np.bincount(
+            self.line_material_idx,
+            weights=batches[self.line_recipe_idx] * self.line_quantities,
+            minlength=len(self.material_ids)
+        )
+
+    def materials_used_by(self, recipe_position: int, material_ids: Sequence[int]) -> List[int]:
+        """指定した材料IDのうち、レシピ (サブレシピを含む) で使われているものを返す"""
+        if not material_ids:
+            return []
+        recipe_idx, material_idx, _ = self.recipe_material_quantities()
+        used = set(self.material_ids[material_idx[recipe_idx == recipe_position]].tolist())
+        return [material_id for material_id in material_ids if material_id in used]
+
+    def product_material_costs_from(self, recipe_costs: np.ndarray) -> np.ndarray:
+        """レシピの1個あたり材料費を商品に割り当てる (レシピのない商品は現在の材料費のまま)"""
+        recipe_costs = self.recipe_unit_costs(recipe_costs)
+        has_recipe = self.product_recipe_idx >= 0
+        safe_idx = np.where(has_recipe, self.product_recipe_idx, 0)
+        if len(self.recipe_ids) == 0:
+            return np.broadcast_to(
+                self.product_material_costs, recipe_costs.shape[:-1] + self.product_ids.shape
+            ).copy()
+        return np.where(has_recipe, recipe_costs[..., safe_idx], self.product_material_costs)
+
+    def fixed_costs_per_unit(self, total_monthly_fixed_cost: float = 0,
+                             total_monthly_production: float = 1) -> np.ndarray:
+        """商品ごとの単位固定費を計算"""
+        if total_monthly_production > 0:
+            per_unit = total_monthly_fixed_cost / total_monthly_production
+        else:
+            per_unit = 0
+        return np.where(self.product_include_fixed_cost, per_unit, 0.0)
+
+    def price_products(self, material_costs: np.ndarray,
+                       fixed_costs_per_unit: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """材料費と単位固定費から総原価・推奨価格・実際の利益を計算
+
+        Product.calculate_prices と同じ計算を配列演算で行う。
+        """
+        if fixed_costs_per_unit is None:
+            fixed_costs_per_unit = self.product_fixed_costs_per_unit
+        material_costs = np.asarray(material_costs, dtype=np.float64)
+        total_costs = material_costs + fixed_costs_per_unit
+
+        margins = self.product_profit_margins
+        selling_prices = self.product_selling_prices
+        with np.errstate(divide="ignore", invalid="ignore"):
+            suggested_prices = np.where(
+                margins > 0, total_costs / (1 - margins / 100), total_costs
+            )
+            has_price = selling_prices > 0
+            actual_profit_amounts = np.where(has_price, selling_prices - total_costs, 0.0)
+            actual_profit_margins = np.where(
+                has_price, actual_profit_amounts / np.where(has_price, selling_prices, 1) * 100, 0.0
+            )
+
+        return {
+            "material_cost": material_costs,
+            "fixed_cost_per_unit": np.broadcast_to(fixed_costs_per_unit, total_costs.shape),
+            "total_cost": total_costs,
+            "suggested_price": suggested_prices,
+            "actual_profit_amount": actual_profit_amounts,
+            "actual_profit_margin": actual_profit_margins,
+        }
+
+    def affected_products(self, changed_materials: np.ndarray) -> np.ndarray:
+        """指定した材料 (真偽値配列、シナリオ×材料も可) を使う商品の真偽値配列を返す"""
+        # 変更フラグを単価とみなして材料費を計算すると、変更された材料を使うレシピだけが正になる
+        touched_recipes = self.recipe_material_costs(np.asarray(changed_materials, dtype=np.float64)) > 0
+        has_recipe = self.product_recipe_idx >= 0
+        if len(self.recipe_ids) == 0:
+            return np.zeros(touched_recipes.shape[:-1] + self.product_ids.shape, dtype=bool)
+        safe_idx = np.where(has_recipe, self.product_recipe_idx, 0)
+        return has_recipe & touched_recipes[..., safe_idx]
+
+    def calculate(self, total_monthly_fixed_cost: float = 0, total_monthly_production: float = 1,
+                  unit_prices: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """全レシピ・全商品の原価を計算 (Product.calculate_costs 相当)"""
+        recipe_costs = self.recipe_material_costs(unit_prices)
+        material_costs = self.product_material_costs_from(recipe_costs)
+        fixed_costs = self.fixed_costs_per_unit(total_monthly_fixed_cost, total_monthly_production)
+        result = self.price_products(material_costs, fixed_costs)
+        result["recipe_material_cost"] = recipe_costs
+        return result
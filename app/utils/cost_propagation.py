@@ -0,0 +1,111 @@
+from typing import Dict, Iterable, Set
+from sqlalchemy.orm import Session
+from app.models.recipe import Recipe, RecipeMaterial, RecipeSubRecipe
+from app.models.product import Product
+from app.models.material import Material
+from app.utils.units import to_material_quantity
+from app.utils.loaders import recipe_detail_options
+from app.utils.recipe_graph import descendants, topological_levels
+
+
+def propagate_material_changes(db: Session, material_ids: Iterable[int]) -> Dict[str, int]:
+    """材料の価格変更を、その材料を使うレシピと商品にだけ反映する
+
+    RecipeMaterial を辿って影響を受けるレシピを、Product.recipe_id を辿って
+    影響を受ける商品をダーティとしてマークし、それらの行だけを再計算する。
+    コミットは呼び出し側で行い、1トランザクションにまとめる。
+    """
+    material_ids = set(material_ids)
+    if not material_ids:
+        return {"recipes": 0, "products": 0}
+
+    dirty_recipe_ids = {
+        recipe_id for (recipe_id,) in db.query(RecipeMaterial.recipe_id).filter(
+            RecipeMaterial.material_id.in_(material_ids)
+        ).distinct()
+    }
+
+    return propagate_recipe_changes(db, dirty_recipe_ids)
+
+
+def propagate_recipe_changes(db: Session, recipe_ids: Iterable[int],
+                             loaded_recipes: Iterable[Recipe] = ()) -> Dict[str, int]:
+    """ダーティなレシピの材料費と、それを使うレシピ・商品の原価を再計算する
+
+    loaded_recipes には材料・サブレシピを読み込み済みのレシピを渡せる (読み込み直さない)。
+    """
+    dirty_recipe_ids: Set[int] = set(recipe_ids)
+    if not dirty_recipe_ids:
+        return {"recipes": 0, "products": 0}
+
+    # サブレシピとして使っている親レシピを辿ってダーティにする (段数分のクエリ)
+    frontier = set(dirty_recipe_ids)
+    while frontier:
+        parent_ids = {
+            parent_id for (parent_id,) in db.query(RecipeSubRecipe.recipe_id).filter(
+                RecipeSubRecipe.sub_recipe_id.in_(frontier)
+            ).distinct()
+        }
+        frontier = parent_ids - dirty_recipe_ids
+        dirty_recipe_ids |= frontier
+
+    # ダーティなレシピを材料・サブレシピごと一括で読み込んで再計算
+    recipes = [recipe for recipe in loaded_recipes if recipe.id in dirty_recipe_ids]
+    ids_to_load = dirty_recipe_ids - {recipe.id for recipe in recipes}
+    if ids_to_load:
+        recipes += db.query(Recipe).options(*recipe_detail_options()).filter(
+            Recipe.id.in_(ids_to_load)
+        ).all()
+
+    if any(recipe.sub_recipes for recipe in recipes):
+        # 変更のないサブレシピ (孫以降を含む) も計算に使うため、1回のクエリでまとめて読み込む
+        # (読み込んだレシピは親の sub_recipes が保持し、計算中に遅延ロードが発生しない)
+        edges = db.query(RecipeSubRecipe.recipe_id, RecipeSubRecipe.sub_recipe_id).join(
+            Recipe, Recipe.id == RecipeSubRecipe.recipe_id
+        ).filter(Recipe.user_id.in_({recipe.user_id for recipe in recipes})).all()
+        clean_ids = descendants(edges, dirty_recipe_ids) - dirty_recipe_ids
+        if clean_ids:
+            db.query(Recipe).options(*recipe_detail_options()).filter(Recipe.id.in_(clean_ids)).all()
+
+        # 子から親の順 (トポロジカル順) に計算する
+        levels = topological_levels(dirty_recipe_ids, edges)
+        recipes.sort(key=lambda recipe: levels[recipe.id])
+
+    # 共有サブレシピはmemoで1回だけ計算
+    memo = {}
+    unit_costs = {}
+    for recipe in recipes:
+        recipe.calculate_material_cost(memo)
+        unit_costs[recipe.id] = recipe.cost_per_unit
+
+    # ダーティなレシピを使う商品を再計算 (単位固定費はそのまま維持)
+    products = db.query(Product).filter(
+        Product.recipe_id.in_(unit_costs.keys())
+    ).all()
+
+    for product in products:
+        product.material_cost = unit_costs[product.recipe_id]
+        product.calculate_prices()
+
+    db.flush()
+
+    return {"recipes": len(recipes), "products": len(products)}
+
+
+def renormalize_material_quantities(db: Session, material: Material, previous_unit: str) -> int:
+    """材料の単位・密度の変更に合わせて、レシピの使用量を材料の単位に換算し直す
+
+    入力単位が記録されていない行は、変更前の材料の単位で入力されたものとみなす。
+    換算できない場合は UnitConversionError を送出する。
+    """
+    lines = db.query(RecipeMaterial).filter(
+        RecipeMaterial.material_id == material.id
+    ).all()
+
+    for rm in lines:
+        if rm.input_unit is None:
+            rm.input_quantity = rm.quantity
+            rm.input_unit = previous_unit
+        rm.quantity = to_material_quantity(material, rm.input_quantity, rm.input_unit)
+
+    return len(lines)
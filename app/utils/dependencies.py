@@ -1,7 +1,10 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, get_async_db, is_read_request
 from app.models.user import User
 from app.utils.security import decode_access_token
 
@@ -9,29 +12,80 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
 def get_current_user(
+    request: Request,
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
     """現在のユーザーを取得"""
-    credentials_exception = HTTPException(
+    user_id = get_token_user_id(token)
+    # 以降の読み込みで、この店舗の直近の書き込みを判定する
+    db.info["user_id"] = user_id
+
+    # ユーザーの取得 (登録直後でもレプリカの遅延で認証に失敗しないようにプライマリから)
+    user = db.get(User, user_id, bind_arguments={"bind": db.primary})
+    user = check_user(user)
+    check_not_moving(request, user)
+    # 以降の店舗のデータはこの店舗のシャードで読み書きする
+    db.info["shard"] = user.shard_key
+
+    return user
+
+
+async def get_current_user_async(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    """現在のユーザーを取得 (非同期セッション用)"""
+    user_id = get_token_user_id(token)
+    db.sync_session.info["user_id"] = user_id
+
+    # ユーザーの取得 (プライマリから)
+    result = await db.execute(
+        select(User).where(User.id == user_id), bind_arguments={"bind": db.sync_session.primary}
+    )
+    user = check_user(result.scalar_one_or_none())
+    check_not_moving(request, user)
+    db.sync_session.info["shard"] = user.shard_key
+
+    return user
+
+
+def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+    """管理者の店舗 (ADMIN_STORE_IDS) のユーザーを取得"""
+    if current_user.store_id not in settings.admin_store_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="この操作には管理者の権限が必要です"
+        )
+    return current_user
+
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="認証情報が無効です",
         headers={"WWW-Authenticate": "Bearer"}
     )
 
-    # トークンのデコード
+
+def get_token_user_id(token: str) -> int:
+    """トークンをデコードしてユーザーIDを取得"""
     payload = decode_access_token(token)
     if payload is None:
-        raise credentials_exception
+        raise credentials_exception()
 
     user_id: str = payload.get("sub")
     if user_id is None:
-        raise credentials_exception
+        raise credentials_exception()
 
-    # ユーザーの取得
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    return int(user_id)
+
+
+def check_user(user: User) -> User:
+    """ユーザーが存在し、有効であることを確認"""
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
 
     if not user.is_active:
         raise HTTPException(
@@ -40,3 +94,12 @@ def get_current_user(
         )
 
     return user
+
+
+def check_not_moving(request: Request, user: User) -> None:
+    """シャードの移動中の店舗には書き込ませない (読み込みはコピー元から行える)"""
+    if user.shard_moving and not is_read_request(request):
+        raise HTTPException(
+            status_code=status.HTTP_423_LOCKED,
+            detail="店舗のデータを移動中のため、現在は変更できません。しばらくしてから再度お試しください"
+        )
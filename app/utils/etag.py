@@ -0,0 +1,75 @@
+import hashlib
+from typing import Optional
+from fastapi import Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.material import Material
+from app.models.recipe import Recipe
+from app.models.product import Product
+from app.models.fixed_cost import FixedCost
+
+# リソース → 応答の内容が依存するモデル (レシピは材料名・単価を含む)
+RESOURCE_MODELS = {
+    "materials": (Material,),
+    "recipes": (Recipe, Material),
+    "products": (Product,),
+    "fixed-costs": (FixedCost,),
+}
+
+# ブラウザのキャッシュは使わず、毎回 ETag で確認させる
+CACHE_CONTROL = "private, no-cache"
+
+
+def version_statement(resource: str, user_id: int):
+    """リソースの版 (モデルごとの件数・最大ID・最大更新日時) を1回の集計クエリで取得
+
+    行の追加・削除で件数と最大IDが、更新で最大更新日時が変わる。
+    """
+    columns = []
+    for model in RESOURCE_MODELS[resource]:
+        for aggregate in (func.count(model.id), func.max(model.id), func.max(model.updated_at)):
+            columns.append(select(aggregate).where(model.user_id == user_id).scalar_subquery())
+    return select(*columns)
+
+
+def make_etag(resource: str, user_id: int, version, request: Request) -> str:
+    """版とURL (パス・クエリ) から強い ETag を作成"""
+    key = repr((resource, user_id, tuple(version), request.url.path, request.url.query))
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match が ETag と一致するか (弱い比較、複数指定と * に対応)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def conditional_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """一致すれば 304 を返し、一致しなければ応答に ETag を設定して None を返す"""
+    if etag_matches(request, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": CACHE_CONTROL}
+        )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return None
+
+
+def check_etag(db: Session, request: Request, response: Response,
+               resource: str, user_id: int) -> Optional[Response]:
+    """行を読み込む前に ETag を確認 (変更がなければ 304 の応答を返す)"""
+    version = db.execute(version_statement(resource, user_id)).one()
+    return conditional_response(request, response, make_etag(resource, user_id, version, request))
+
+
+async def check_etag_async(db: AsyncSession, request: Request, response: Response,
+                           resource: str, user_id: int) -> Optional[Response]:
+    """check_etag の非同期セッション版"""
+    version = (await db.execute(version_statement(resource, user_id))).one()
+    return conditional_response(request, response, make_etag(resource, user_id, version, request))
@@ -0,0 +1,267 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Tuple
+from sqlalchemy import BigInteger, Boolean, DateTime, Float, String, Text, case, cast, func, literal, select
+from sqlalchemy.orm import Session
+from app.models.material import Material
+from app.models.recipe import Recipe, RecipeMaterial, RecipeSubRecipe
+from app.models.product import Product
+from app.models.fixed_cost import FixedCost
+from app.utils.pg_copy import copy_enabled, copy_out_csv
+
+# サーバーサイドカーソルから一度に取得する行数
+EXPORT_YIELD_PER = 1000
+# レスポンスに書き出すまでにためるバイト数
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+MATERIAL_COLUMNS = [
+    "id", "name", "purchase_price", "purchase_quantity", "unit", "density", "unit_price",
+    "created_at", "updated_at"
+]
+PRODUCT_COLUMNS = [
+    "id", "name", "recipe_id", "include_fixed_cost", "fixed_cost_per_unit", "material_cost",
+    "total_cost", "profit_margin", "suggested_price", "selling_price", "actual_profit_margin",
+    "actual_profit_amount", "created_at", "updated_at"
+]
+FIXED_COST_COLUMNS = ["id", "name", "monthly_amount", "is_active", "created_at", "updated_at"]
+RECIPE_COLUMNS = ["id", "name", "description", "yield_quantity", "loss_rate", "material_cost",
+                  "created_at", "updated_at"]
+RECIPE_LINE_COLUMNS = ["line_type", "item_id", "item_name", "quantity", "unit",
+                       "input_quantity", "input_unit"]
+# CSV ではレシピの行ごとに1行 (材料・サブレシピのないレシピは明細を空欄にした1行)
+RECIPE_CSV_COLUMNS = [f"recipe_{column}" for column in RECIPE_COLUMNS] + RECIPE_LINE_COLUMNS
+
+
+def stream_rows(db: Session, statement) -> Iterator:
+    """yield_per で少しずつ取得しながら行を返す (結果全体をメモリに載せない)"""
+    return db.execute(statement.execution_options(yield_per=EXPORT_YIELD_PER))
+
+
+def column_select(model, columns: List[str], user_id: int):
+    return select(*[getattr(model, column) for column in columns]).where(
+        model.user_id == user_id
+    ).order_by(model.id)
+
+
+def csv_text(column):
+    """列を format_csv_value と csv.writer が書き出すのと同じ文字列にする式 (PostgreSQL の COPY 用)
+
+    COPY はサーバーのテキスト表現 (真偽値は t/f、日時は空白区切り、整数値の float は "1000") で
+    書き出すため、Python の str() と同じ表記に変換してから書き出す。
+    """
+    if isinstance(column.type, Boolean):
+        return case((column.is_(None), None), (column, literal("True")), else_=literal("False"))
+    if isinstance(column.type, DateTime):
+        # datetime.isoformat() はマイクロ秒が0なら省略する
+        seconds = func.to_char(column, 'YYYY-MM-DD"T"HH24:MI:SS')
+        return case(
+            (func.to_char(column, "US") == "000000", seconds),
+            else_=func.to_char(column, 'YYYY-MM-DD"T"HH24:MI:SS.US')
+        )
+    if isinstance(column.type, Float):
+        # 整数値は Python と同じく "1000.0" (1e16 以上は Python も指数表記)
+        return case(
+            ((column == func.trunc(column)) & (func.abs(column) < 1e16),
+             func.concat(cast(cast(column, BigInteger), Text), ".0")),
+            else_=cast(column, Text)
+        )
+    if isinstance(column.type, String):
+        # COPY は空文字列を "" と引用符付きで書き出すが、csv.writer は空欄にする
+        return func.nullif(column, "")
+    return column
+
+
+def copy_select(model, columns: List[str], user_id: int):
+    """COPY で書き出す SELECT (column_select と同じ行を csv_text の表記で)"""
+    return select(*[csv_text(getattr(model, column)).label(column) for column in columns]).where(
+        model.user_id == user_id
+    ).order_by(model.id)
+
+
+def iter_materials(db: Session, user_id: int) -> Iterator[dict]:
+    for row in stream_rows(db, column_select(Material, MATERIAL_COLUMNS, user_id)):
+        yield row._asdict()
+
+
+def iter_products(db: Session, user_id: int) -> Iterator[dict]:
+    for row in stream_rows(db, column_select(Product, PRODUCT_COLUMNS, user_id)):
+        yield row._asdict()
+
+
+def iter_fixed_costs(db: Session, user_id: int) -> Iterator[dict]:
+    for row in stream_rows(db, column_select(FixedCost, FIXED_COST_COLUMNS, user_id)):
+        yield row._asdict()
+
+
+def iter_recipes(db: Session, user_id: int) -> Iterator[dict]:
+    """レシピを材料・サブレシピの明細付きで返す
+
+    レシピ・材料の明細・サブレシピの明細をそれぞれレシピID順のカーソルで読み、
+    マージしながら1レシピずつ組み立てる (メモリに載るのは1レシピ分だけ)。
+    """
+    recipes = stream_rows(db, column_select(Recipe, RECIPE_COLUMNS, user_id))
+    material_lines = stream_rows(db, select(
+        RecipeMaterial.recipe_id, RecipeMaterial.material_id, Material.name, RecipeMaterial.quantity,
+        Material.unit, RecipeMaterial.input_quantity, RecipeMaterial.input_unit
+    ).join(Material, Material.id == RecipeMaterial.material_id).join(
+        Recipe, Recipe.id == RecipeMaterial.recipe_id
+    ).where(Recipe.user_id == user_id).order_by(RecipeMaterial.recipe_id, RecipeMaterial.id))
+    sub_recipe_lines = stream_rows(db, select(
+        RecipeSubRecipe.recipe_id, RecipeSubRecipe.sub_recipe_id, Recipe.name, RecipeSubRecipe.quantity
+    ).join(Recipe, Recipe.id == RecipeSubRecipe.sub_recipe_id).where(
+        Recipe.user_id == user_id
+    ).order_by(RecipeSubRecipe.recipe_id, RecipeSubRecipe.id))
+
+    material_groups = group_by_recipe(material_lines)
+    sub_recipe_groups = group_by_recipe(sub_recipe_lines)
+    next_materials = next(material_groups, None)
+    next_sub_recipes = next(sub_recipe_groups, None)
+
+    for recipe in recipes:
+        document = recipe._asdict()
+        document["materials"] = []
+        document["sub_recipes"] = []
+
+        if next_materials is not None and next_materials[0] == recipe.id:
+            document["materials"] = [
+                {
+                    "material_id": material_id, "material_name": name, "quantity": quantity,
+                    "unit": unit, "input_quantity": input_quantity, "input_unit": input_unit
+                }
+                for _, material_id, name, quantity, unit, input_quantity, input_unit in next_materials[1]
+            ]
+            next_materials = next(material_groups, None)
+
+        if next_sub_recipes is not None and next_sub_recipes[0] == recipe.id:
+            document["sub_recipes"] = [
+                {"sub_recipe_id": sub_recipe_id, "sub_recipe_name": name, "quantity": quantity}
+                for _, sub_recipe_id, name, quantity in next_sub_recipes[1]
+            ]
+            next_sub_recipes = next(sub_recipe_groups, None)
+
+        yield document
+
+
+def group_by_recipe(rows) -> Iterator[Tuple[int, List]]:
+    """レシピID順の明細を (レシピID, 明細のリスト) にまとめる"""
+    current_id = None
+    group: List = []
+    for row in rows:
+        if row[0] != current_id:
+            if group:
+                yield current_id, group
+            current_id, group = row[0], []
+        group.append(row)
+    if group:
+        yield current_id, group
+
+
+def flatten_recipe(document: dict) -> Iterator[dict]:
+    """レシピを CSV 用に明細1行ずつに展開"""
+    base = {f"recipe_{column}": document[column] for column in RECIPE_COLUMNS}
+    lines = [
+        {
+            "line_type": "material", "item_id": line["material_id"], "item_name": line["material_name"],
+            "quantity": line["quantity"], "unit": line["unit"],
+            "input_quantity": line["input_quantity"], "input_unit": line["input_unit"]
+        }
+        for line in document["materials"]
+    ] + [
+        {
+            "line_type": "sub_recipe", "item_id": line["sub_recipe_id"], "item_name": line["sub_recipe_name"],
+            "quantity": line["quantity"]
+        }
+        for line in document["sub_recipes"]
+    ]
+    if not lines:
+        yield base
+    for line in lines:
+        yield {**base, **line}
+
+
+# CSV を COPY TO STDOUT で書き出せるリソース (明細の展開がなく1テーブルで完結するもの)
+COPY_EXPORTS: Dict[str, Tuple[object, List[str]]] = {
+    "materials": (Material, MATERIAL_COLUMNS),
+    "products": (Product, PRODUCT_COLUMNS),
+    "fixed-costs": (FixedCost, FIXED_COST_COLUMNS),
+}
+
+# リソース名 → (行を返す関数, CSVの列, CSV用の展開)
+EXPORTERS: Dict[str, Tuple[Callable, List[str], Callable]] = {
+    "materials": (iter_materials, MATERIAL_COLUMNS, None),
+    "recipes": (iter_recipes, RECIPE_CSV_COLUMNS, flatten_recipe),
+    "products": (iter_products, PRODUCT_COLUMNS, None),
+    "fixed-costs": (iter_fixed_costs, FIXED_COST_COLUMNS, None),
+}
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} はJSONに変換できません")
+
+
+def format_csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def buffered(chunks: Iterator[str]) -> Iterator[bytes]:
+    """小さな文字列をまとめて EXPORT_FLUSH_BYTES 程度ずつ返す"""
+    buffer = io.StringIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+        if buffer.tell() >= EXPORT_FLUSH_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_csv(db: Session, user_id: int, resource: str) -> Iterator[bytes]:
+    """リソースを CSV (1行目は列名) で少しずつ返す
+
+    PostgreSQL では1テーブルのリソースを COPY TO STDOUT で書き出す (どちらでも同じ内容になる)。
+    """
+    iter_rows, columns, flatten = EXPORTERS[resource]
+
+    if resource in COPY_EXPORTS:
+        statement = copy_select(*COPY_EXPORTS[resource], user_id)
+        if copy_enabled(db, statement):
+            yield "\ufeff".encode("utf-8")
+            yield from copy_out_csv(db, statement, EXPORT_FLUSH_BYTES)
+            return
+
+    def lines():
+        line = io.StringIO()
+        # 改行は COPY と同じ LF
+        writer = csv.DictWriter(line, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        for row in iter_rows(db, user_id):
+            for flat in (flatten(row) if flatten else (row,)):
+                writer.writerow({key: format_csv_value(value) for key, value in flat.items()})
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate()
+        yield line.getvalue()
+
+    # Excel でも文字化けしないように BOM を付ける
+    yield "\ufeff".encode("utf-8")
+    yield from buffered(lines())
+
+
+def iter_ndjson(db: Session, user_id: int, resources: List[str]) -> Iterator[bytes]:
+    """リソースを NDJSON (1行1件) で少しずつ返す (複数の場合は type で区別)"""
+    def lines():
+        for resource in resources:
+            iter_rows = EXPORTERS[resource][0]
+            for row in iter_rows(db, user_id):
+                if len(resources) > 1:
+                    row = {"type": resource, **row}
+                yield json.dumps(row, ensure_ascii=False, default=json_default) + "\n"
+
+    yield from buffered(lines())
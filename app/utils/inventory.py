@@ -0,0 +1,80 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.inventory import InventoryTransaction, InventoryBalance
+
+# INSERT ... ON CONFLICT DO NOTHING を使える方言
+ON_CONFLICT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def record_transactions(db: Session, user_id: int, entries: List[dict]) -> Dict[int, float]:
+    """入出庫記録を一括で追加し、在庫数を差分で更新する
+
+    entries は material_id, transaction_type, quantity (符号付き), note を持つ辞書のリスト。
+    在庫数は履歴を集計し直さず、材料ごとの増減量を加算するだけで更新する。
+    戻り値は材料IDごとの増減量。コミットは呼び出し側で行う。
+    """
+    if not entries:
+        return {}
+
+    now = datetime.utcnow()
+
+    # 入出庫記録を1回の一括INSERTで追加
+    db.execute(insert(InventoryTransaction), [
+        {
+            "user_id": user_id,
+            "material_id": entry["material_id"],
+            "transaction_type": entry["transaction_type"],
+            "quantity": entry["quantity"],
+            "note": entry.get("note"),
+            "created_at": now
+        }
+        for entry in entries
+    ])
+
+    # 材料ごとの増減量を集計
+    deltas: Dict[int, float] = defaultdict(float)
+    for entry in entries:
+        deltas[entry["material_id"]] += entry["quantity"]
+
+    # 在庫行がない材料は0で作成
+    # (同じ材料の最初の入出庫が同時に届いても一意制約で失敗しないよう、既存の行は無視する)
+    dialect = db.get_bind(mapper=InventoryBalance.__mapper__).dialect.name
+    insert_on_conflict = ON_CONFLICT_INSERTS.get(dialect)
+    if insert_on_conflict is not None:
+        db.execute(
+            insert_on_conflict(InventoryBalance).on_conflict_do_nothing(index_elements=["material_id"]),
+            [
+                {"material_id": material_id, "user_id": user_id, "quantity": 0, "updated_at": now}
+                for material_id in deltas
+            ]
+        )
+    else:
+        existing = {
+            material_id for (material_id,) in db.query(InventoryBalance.material_id).filter(
+                InventoryBalance.material_id.in_(deltas.keys())
+            )
+        }
+        missing = [material_id for material_id in deltas if material_id not in existing]
+        if missing:
+            db.execute(insert(InventoryBalance), [
+                {"material_id": material_id, "user_id": user_id, "quantity": 0, "updated_at": now}
+                for material_id in missing
+            ])
+
+    # quantity = quantity + 増減量 を executemany で更新
+    balances = InventoryBalance.__table__
+    db.execute(
+        update(balances).where(
+            balances.c.material_id == bindparam("b_material_id")
+        ).values(
+            quantity=balances.c.quantity + bindparam("b_delta"),
+            updated_at=now
+        ),
+        [{"b_material_id": material_id, "b_delta": delta} for material_id, delta in deltas.items()]
+    )
+
+    return dict(deltas)
@@ -0,0 +1,44 @@
+from typing import Iterable, List
+from sqlalchemy.orm import Session, selectinload
+from app.models.recipe import Recipe, RecipeMaterial, RecipeSubRecipe
+
+
+def recipe_detail_options(path=None) -> List:
+    """レシピの材料・サブレシピを一括で読み込むローダーオプション
+
+    path には Product.recipe のような、レシピに至るリレーションのローダーを渡せる。
+    材料はレシピ件数に関係なく selectin で1回、材料マスタはそこに JOIN して読み込む。
+    """
+    if path is None:
+        materials = selectinload(Recipe.recipe_materials)
+        sub_recipes = selectinload(Recipe.sub_recipes)
+    else:
+        materials = path.selectinload(Recipe.recipe_materials)
+        sub_recipes = path.selectinload(Recipe.sub_recipes)
+    return [
+        materials.joinedload(RecipeMaterial.material),
+        sub_recipes.joinedload(RecipeSubRecipe.sub_recipe)
+    ]
+
+
+def preload_sub_recipes(db: Session, recipes: Iterable[Recipe]) -> None:
+    """サブレシピ (孫以降を含む) の材料・サブレシピを段ごとにまとめて読み込む
+
+    読み込んだレシピはセッションのアイデンティティマップに入るため、
+    以降の iter_materials() などで遅延ロードが発生しない。クエリ数は段数に比例する。
+    """
+    loaded_ids = set()
+    frontier = list(recipes)
+    while frontier:
+        loaded_ids.update(recipe.id for recipe in frontier)
+        next_ids = {
+            rs.sub_recipe_id
+            for recipe in frontier
+            for rs in recipe.sub_recipes
+            if rs.sub_recipe_id not in loaded_ids
+        }
+        if not next_ids:
+            break
+        frontier = db.query(Recipe).options(*recipe_detail_options()).filter(
+            Recipe.id.in_(next_ids)
+        ).all()
@@ -0,0 +1,304 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+from app.models.material import Material
+from app.models.material_price_history import MaterialPriceHistory
+from app.schemas.material import MaterialCreate
+from app.utils.cost_propagation import propagate_material_changes, renormalize_material_quantities
+from app.utils.pg_copy import copy_enabled, copy_in, copy_insert_returning
+from app.utils.units import UnitConversionError
+
+# 1トランザクションで処理する行数
+IMPORT_CHUNK_SIZE = 500
+
+# JSON を一度に読み込む文字数
+JSON_READ_SIZE = 64 * 1024
+JSON_WHITESPACE = " \t\n\r"
+
+# 新しい材料・価格履歴として書き込む列 (PostgreSQL では COPY で書き込む)
+MATERIAL_INSERT_COLUMNS = [
+    "user_id", "name", "purchase_price", "purchase_quantity", "unit", "density", "unit_price"
+]
+HISTORY_COLUMNS = [
+    "user_id", "material_id", "purchase_price", "purchase_quantity", "unit_price", "unit", "effective_at"
+]
+
+
+def iter_csv_rows(file: BinaryIO) -> Iterator[dict]:
+    """CSV (1行目は列名) を1行ずつ読み込む (BOM付きUTF-8にも対応、空欄はNone)"""
+    reader = csv.DictReader(codecs.getreader("utf-8-sig")(file))
+    for row in reader:
+        yield {
+            key.strip(): (value.strip() or None) if isinstance(value, str) else value
+            for key, value in row.items() if key
+        }
+
+
+def iter_json_rows(file: BinaryIO, read_size: int = JSON_READ_SIZE) -> Iterator[dict]:
+    """JSON 配列の要素を1つずつ読み込んで返す (ファイル全体をメモリに読み込まない)
+
+    read_size 文字ずつ読み込み、要素が読み込んだ範囲の途中で切れていれば続きを読み込んで
+    デコードし直す。形式が正しくない場合は ValueError (json.JSONDecodeError) を送出する。
+    """
+    reader = codecs.getreader("utf-8-sig")(file)
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def read_more() -> bool:
+        """続きを読み込む (読み込んだ部分は捨てる)。ファイルの終わりなら False"""
+        nonlocal buffer, position, eof
+        text = "" if eof else reader.read(read_size)
+        if not text:
+            eof = True
+            return False
+        buffer = buffer[position:] + text
+        position = 0
+        return True
+
+    def next_char() -> str:
+        """空白を読み飛ばして次の文字を返す (ファイルの終わりなら空文字)"""
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in JSON_WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not read_more():
+                return ""
+
+    if next_char() != "[":
+        raise ValueError("JSON は材料の配列で指定してください")
+    position += 1
+    if next_char() == "]":
+        position += 1
+    else:
+        while True:
+            next_char()
+            while True:
+                try:
+                    row, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if read_more():
+                        continue
+                    raise
+                # 数値などは読み込んだ範囲の終わりで切れている可能性がある
+                if end == len(buffer) and read_more():
+                    continue
+                break
+            position = end
+            yield row
+
+            char = next_char()
+            position += 1
+            if char == "]":
+                break
+            if not char:
+                raise ValueError("JSON の配列が閉じられていません")
+            if char != ",":
+                raise ValueError("JSON の配列の要素の区切りが正しくありません")
+
+    if next_char():
+        raise ValueError("JSON の配列の後に余分なデータがあります")
+
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in e['loc']) or '行'}: {e['msg']}" for e in error.errors()
+    )
+
+
+def import_materials(db: Session, user_id: int, rows: Iterable[dict],
+                     chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """材料を一括で登録・更新 (同じ名前の材料があれば更新)
+
+    各行を MaterialCreate で検証し、エラーの行は記録して残りの行の処理を続ける。
+    有効な行は chunk_size 行ごとにまとめて INSERT/UPDATE し、チャンクごとにコミットする。
+
+    ファイルの途中で読み込みに失敗した場合 (文字コード・CSV/JSON の形式)、まだ何もコミットしていなければ
+    例外をそのまま送出する。コミット済みのチャンクがあれば、読み込めた行までを登録し、
+    失敗した行をエラーとして記録する (登録済みの件数と合わせて返す)。
+    """
+    result = {"created": 0, "updated": 0, "unchanged": 0, "errors": []}
+    chunk: List[Tuple[int, MaterialCreate]] = []
+    committed = False
+    rows = iter(rows)
+    row_number = 0
+
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except (ValueError, csv.Error) as e:
+            if not committed:
+                raise
+            result["errors"].append({
+                "row": row_number + 1,
+                "name": None,
+                "message": f"ファイルを読み込めません (この行以降は登録していません): {e}"
+            })
+            break
+        row_number += 1
+
+        try:
+            data = MaterialCreate.model_validate(row)
+        except ValidationError as e:
+            result["errors"].append({
+                "row": row_number,
+                "name": row.get("name") if isinstance(row, dict) else None,
+                "message": format_validation_error(e)
+            })
+            continue
+
+        chunk.append((row_number, data))
+        if len(chunk) >= chunk_size:
+            import_chunk(db, user_id, chunk, result)
+            committed = True
+            chunk = []
+
+    if chunk:
+        import_chunk(db, user_id, chunk, result)
+
+    result["errors"].sort(key=lambda error: error["row"])
+    return result
+
+
+def import_chunk(db: Session, user_id: int, chunk: List[Tuple[int, MaterialCreate]], result: dict) -> None:
+    """検証済みの行をまとめて登録・更新してコミット"""
+    # 同じ名前の行が複数ある場合は後の行を使い、前の行はエラーとして記録
+    by_name: Dict[str, Tuple[int, MaterialCreate]] = {}
+    for row_number, data in chunk:
+        if data.name in by_name:
+            result["errors"].append({
+                "row": by_name[data.name][0],
+                "name": data.name,
+                "message": f"同じ名前の材料が {row_number} 行目にもあるため、この行は使われません"
+            })
+        by_name[data.name] = (row_number, data)
+    rows = list(by_name.values())
+
+    # 単価をまとめて計算
+    purchase_prices = np.array([data.purchase_price for _, data in rows], dtype=float)
+    purchase_quantities = np.array([data.purchase_quantity for _, data in rows], dtype=float)
+    unit_prices = purchase_prices / purchase_quantities
+
+    # 既存の材料を名前で検索 (同名が複数ある場合は最初に登録されたもの)
+    existing = {}
+    for material in db.execute(
+        select(
+            Material.id, Material.name, Material.unit, Material.density,
+            Material.purchase_price, Material.purchase_quantity, Material.unit_price
+        ).where(
+            Material.user_id == user_id,
+            Material.name.in_(by_name.keys())
+        ).order_by(Material.id)
+    ):
+        existing.setdefault(material.name, material)
+
+    inserts, updates, unit_changes = [], [], []
+    for (row_number, data), unit_price in zip(rows, unit_prices.tolist()):
+        values = {
+            "name": data.name,
+            "purchase_price": data.purchase_price,
+            "purchase_quantity": data.purchase_quantity,
+            "unit": data.unit,
+            "density": data.density,
+            "unit_price": unit_price
+        }
+        current = existing.get(data.name)
+        if current is None:
+            inserts.append({"user_id": user_id, **values})
+        elif (current.unit, current.density) != (data.unit, data.density):
+            # 単位・密度の変更はレシピの使用量の換算が必要なため1件ずつ処理
+            unit_changes.append((row_number, current.id, values))
+        elif (current.purchase_price, current.purchase_quantity, current.unit_price) != (
+            data.purchase_price, data.purchase_quantity, unit_price
+        ):
+            updates.append({"id": current.id, **values})
+        else:
+            result["unchanged"] += 1
+
+    now = datetime.utcnow()
+    history = []
+    changed_ids = []
+    use_copy = copy_enabled(db)
+
+    if inserts:
+        # 名前はチャンク内で一意なので、RETURNING の行は名前で対応付ける
+        # (sort_by_parameter_order を指定すると SQLite では1行ずつの INSERT になる)
+        if use_copy:
+            returned = copy_insert_returning(
+                db, Material.__table__, MATERIAL_INSERT_COLUMNS,
+                [[values[column] for column in MATERIAL_INSERT_COLUMNS] for values in inserts],
+                returning=["id", "name"]
+            )
+        else:
+            returned = db.execute(insert(Material).returning(Material.id, Material.name), inserts)
+        new_ids = dict((name, material_id) for material_id, name in returned)
+        history.extend(
+            {"material_id": new_ids[values["name"]], **values} for values in inserts
+        )
+        result["created"] += len(inserts)
+
+    if updates:
+        db.execute(update(Material), updates)
+        history.extend({"material_id": values["id"], **values} for values in updates)
+        changed_ids.extend(values["id"] for values in updates)
+        result["updated"] += len(updates)
+
+    for row_number, material_id, values in unit_changes:
+        savepoint = db.begin_nested()
+        try:
+            material = db.get(Material, material_id)
+            previous_unit = material.unit
+            previous_price = (material.purchase_price, material.purchase_quantity, material.unit_price)
+            for field, value in values.items():
+                setattr(material, field, value)
+            renormalize_material_quantities(db, material, previous_unit)
+            db.flush()
+            savepoint.commit()
+        except UnitConversionError as e:
+            savepoint.rollback()
+            result["errors"].append({
+                "row": row_number,
+                "name": values["name"],
+                "message": f"この材料を使うレシピの使用量を換算できません: {e}"
+            })
+            continue
+        if (values["purchase_price"], values["purchase_quantity"], values["unit_price"]) != previous_price:
+            history.append({"material_id": material_id, **values})
+        changed_ids.append(material_id)
+        result["updated"] += 1
+
+    # 価格履歴をまとめて記録
+    if history:
+        history_rows = [
+            {
+                "user_id": user_id,
+                "material_id": values["material_id"],
+                "purchase_price": values["purchase_price"],
+                "purchase_quantity": values["purchase_quantity"],
+                "unit_price": values["unit_price"],
+                "unit": values["unit"],
+                "effective_at": now
+            }
+            for values in history
+        ]
+        if use_copy:
+            copy_in(db, MaterialPriceHistory.__tablename__, HISTORY_COLUMNS,
+                    ([row[column] for column in HISTORY_COLUMNS] for row in history_rows))
+        else:
+            db.execute(insert(MaterialPriceHistory), history_rows)
+
+    # 単価や使用量が変わった材料を使うレシピと商品の原価を更新
+    propagate_material_changes(db, changed_ids)
+
+    db.commit()
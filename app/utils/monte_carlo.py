@@ -0,0 +1,95 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.utils.cost_engine import CostCatalog
+
+PERCENTILES = (50, 90, 99)
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """シミュレーション用のプロセスプールを取得 (初回のみ作成)"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.monte_carlo_max_workers)
+    return _process_pool
+
+
+def sample_unit_prices(base_unit_prices: np.ndarray, volatilities: np.ndarray, distribution: str,
+                       n: int, rng: np.random.Generator) -> np.ndarray:
+    """材料単価のシナリオ (n×材料数) を生成
+
+    volatilities は材料ごとの変動幅 (%)。normal/lognormal では標準偏差、uniform では上下の幅。
+    """
+    sigma = volatilities / 100
+    shape = (n, len(base_unit_prices))
+    if distribution == "normal":
+        factors = 1 + sigma * rng.standard_normal(shape)
+    elif distribution == "uniform":
+        factors = 1 + sigma * rng.uniform(-1, 1, shape)
+    else:
+        # 平均が現在の単価になる対数正規分布
+        factors = np.exp(sigma * rng.standard_normal(shape) - sigma ** 2 / 2)
+    return base_unit_prices * np.clip(factors, 0, None)
+
+
+def simulate_chunk(catalog: CostCatalog, volatilities: np.ndarray, distribution: str,
+                   n: int, seed) -> np.ndarray:
+    """n個のシナリオについて商品ごとの総原価 (n×商品数) を計算
+
+    プロセスプールから呼ばれるため、モジュールのトップレベルに定義する。
+    """
+    rng = np.random.default_rng(seed)
+    unit_prices = sample_unit_prices(catalog.unit_prices, volatilities, distribution, n, rng)
+    material_costs = catalog.product_material_costs_from(catalog.recipe_material_costs(unit_prices))
+    total_costs = material_costs + catalog.product_fixed_costs_per_unit
+    return total_costs.astype(np.float32)
+
+
+async def simulate_total_costs(catalog: CostCatalog, volatilities: np.ndarray, distribution: str,
+                               n: int, seed: Optional[int] = None) -> np.ndarray:
+    """総原価のシナリオを計算 (イベントループはブロックしない)
+
+    シナリオ数×商品数が閾値を超える場合はプロセスプールに分割して実行する。
+    """
+    seed_sequence = np.random.SeedSequence(seed)
+    cells = n * max(len(catalog.product_ids), 1)
+    if cells < settings.monte_carlo_parallel_threshold:
+        return await run_in_threadpool(simulate_chunk, catalog, volatilities, distribution, n, seed_sequence)
+
+    workers = settings.monte_carlo_max_workers or os.cpu_count() or 1
+    chunk_sizes = [len(chunk) for chunk in np.array_split(np.arange(n), workers) if len(chunk)]
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    chunks = await asyncio.gather(*[
+        loop.run_in_executor(pool, simulate_chunk, catalog, volatilities, distribution, size, child_seed)
+        for size, child_seed in zip(chunk_sizes, seed_sequence.spawn(len(chunk_sizes)))
+    ])
+    return np.concatenate(chunks, axis=0)
+
+
+def summarize(catalog: CostCatalog, total_costs: np.ndarray,
+              percentiles: Sequence[int] = PERCENTILES) -> Dict[str, np.ndarray]:
+    """総原価のシナリオから、原価・推奨価格・利益率のパーセンタイルを計算
+
+    推奨価格は原価の増加関数、利益率は減少関数なので、原価のパーセンタイルから変換する。
+    利益率の P90 は原価の P10 に対応する。
+    """
+    cost_percentiles = np.percentile(total_costs, percentiles, axis=0)
+    reversed_percentiles = np.percentile(total_costs, [100 - p for p in percentiles], axis=0)
+
+    priced = catalog.price_products(
+        reversed_percentiles - catalog.product_fixed_costs_per_unit
+    )
+    suggested = catalog.price_products(cost_percentiles - catalog.product_fixed_costs_per_unit)
+
+    return {
+        "total_cost": cost_percentiles,
+        "suggested_price": suggested["suggested_price"],
+        "actual_profit_margin": priced["actual_profit_margin"],
+    }
@@ -0,0 +1,57 @@
+import base64
+import binascii
+import json
+from typing import List, Optional
+from fastapi import HTTPException, Response, status
+
+# 次ページのカーソルを返すレスポンスヘッダー
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int, descending: bool = False) -> str:
+    """ページ最後の行のIDを、中身を意識させない文字列 (base64) にする"""
+    payload = json.dumps({"id": last_id, "desc": descending}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, descending: bool = False) -> int:
+    """カーソルからIDを取り出す (不正なカーソルや並び順が異なるカーソルは400)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = payload["id"]
+        if not isinstance(last_id, int) or payload.get("desc", False) != descending:
+            raise ValueError
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="カーソルが不正です"
+        )
+    return last_id
+
+
+def paginate(statement, id_column, cursor: Optional[str], skip: int, limit: int,
+             descending: bool = False):
+    """一覧取得のクエリにページングを適用 (Query と select のどちらにも使える)
+
+    cursor を指定した場合は (user_id, id) のインデックスを使ったキーセット方式、
+    指定しない場合は従来どおり skip による offset 方式。
+    次ページの有無を判定するため limit + 1 行を取得する (finish_page で切り詰める)。
+    """
+    order = id_column.desc() if descending else id_column
+    statement = statement.order_by(order)
+    if cursor is not None:
+        last_id = decode_cursor(cursor, descending)
+        statement = statement.where(id_column < last_id if descending else id_column > last_id)
+    else:
+        statement = statement.offset(skip)
+    return statement.limit(limit + 1)
+
+
+def finish_page(rows: List, limit: int, response: Response, descending: bool = False) -> List:
+    """limit 件に切り詰め、続きがある場合は次ページのカーソルをヘッダーに設定"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id, descending)
+    return rows
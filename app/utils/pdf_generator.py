@@ -100,11 +100,8 @@ class LabelPDFGenerator:
             c.drawString(content_x, current_y, "原材料:")
             current_y -= 12
 
-            # 材料を列挙
-            materials = []
-            for rm in product.recipe.recipe_materials:
-                if rm.material:
-                    materials.append(rm.material.name)
+            # 材料を列挙 (サブレシピの材料を含む)
+            materials = [material.name for material in product.recipe.iter_materials()]
 
             # 材料を3つずつ表示
             material_text = ", ".join(materials[:5])
@@ -0,0 +1,74 @@
+from typing import Iterable, Iterator, List, Sequence
+from sqlalchemy import Table, column, insert, select, table
+from sqlalchemy.orm import Session
+from app.config import settings
+
+
+def copy_enabled(db: Session, statement=None) -> bool:
+    """COPY を使えるか (PostgreSQL に接続していて、設定で有効な場合)"""
+    return settings.pg_copy_enabled and db.get_bind(clause=statement).dialect.name == "postgresql"
+
+
+def driver_connection(db: Session, statement=None):
+    """セッションのトランザクションで使っている psycopg の接続"""
+    connection = db.connection(bind_arguments={"clause": statement})
+    return connection.connection.driver_connection
+
+
+def quote(db: Session, name: str) -> str:
+    return db.get_bind().dialect.identifier_preparer.quote(name)
+
+
+def copy_in(db: Session, table_name: str, columns: Sequence[str], rows: Iterable[Sequence]) -> None:
+    """行をまとめて COPY FROM STDIN で書き込む (セッションのトランザクション内)"""
+    column_list = ", ".join(quote(db, name) for name in columns)
+    with driver_connection(db).cursor() as cursor:
+        with cursor.copy(f"COPY {quote(db, table_name)} ({column_list}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def copy_insert_returning(db: Session, target: Table, columns: Sequence[str],
+                          rows: List[Sequence], returning: Sequence[str]) -> List:
+    """COPY で一時テーブルに書き込んでから INSERT ... SELECT ... RETURNING で本テーブルに移す
+
+    COPY は生成されたIDを返せないため、RETURNING が必要な場合はこの2文で登録する。
+    一時テーブルはトランザクションの終了時に削除される。列の Python 側の既定値
+    (created_at など) は INSERT ... SELECT に埋め込まれる。
+    """
+    staging_name = f"staging_{target.name}"
+    column_list = ", ".join(quote(db, name) for name in columns)
+    with driver_connection(db).cursor() as cursor:
+        # 本テーブルの列の型だけを写した一時テーブル (制約・既定値は持たない)
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {quote(db, staging_name)} ON COMMIT DROP AS "
+            f"SELECT {column_list} FROM {quote(db, target.name)} WITH NO DATA"
+        )
+        cursor.execute(f"TRUNCATE {quote(db, staging_name)}")
+    copy_in(db, staging_name, columns, rows)
+
+    staging = table(staging_name, *[column(name) for name in columns])
+    statement = insert(target).from_select(
+        list(columns), select(*[staging.c[name] for name in columns])
+    ).returning(*[target.c[name] for name in returning])
+    return db.execute(statement).all()
+
+
+def copy_out_csv(db: Session, statement, flush_bytes: int = 64 * 1024) -> Iterator[bytes]:
+    """SELECT の結果を COPY TO STDOUT の CSV (1行目は列名) で flush_bytes 程度ずつ返す
+
+    値は PostgreSQL のテキスト表現になる (日時は空白区切り、真偽値は t/f)。
+    """
+    dialect = db.get_bind(clause=statement).dialect
+    # 値は店舗IDなどの数値だけなので、リテラルとして埋め込む (COPY はバインド変数を使えない)
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    with driver_connection(db, statement).cursor() as cursor:
+        with cursor.copy(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)") as copy:
+            buffer = bytearray()
+            for data in copy:
+                buffer += data
+                if len(buffer) >= flush_bytes:
+                    yield bytes(buffer)
+                    buffer.clear()
+            if buffer:
+                yield bytes(buffer)
@@ -0,0 +1,74 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def build_children(edges: Iterable[Tuple[int, int]]) -> Dict[int, Set[int]]:
+    """(親レシピ, サブレシピ) の辺から、親 → サブレシピ集合の隣接リストを作成"""
+    children = defaultdict(set)
+    for parent_id, child_id in edges:
+        children[parent_id].add(child_id)
+    return children
+
+
+def descendants(edges: Iterable[Tuple[int, int]], recipe_ids: Iterable[int]) -> Set[int]:
+    """指定したレシピから (間接的に) 使われるサブレシピをすべて返す"""
+    children = build_children(edges)
+    found = set()
+    stack = list(recipe_ids)
+    while stack:
+        recipe_id = stack.pop()
+        for child_id in children.get(recipe_id, ()):
+            if child_id not in found:
+                found.add(child_id)
+                stack.append(child_id)
+    return found
+
+
+def would_create_cycle(edges: Iterable[Tuple[int, int]], recipe_id: int,
+                       sub_recipe_ids: Iterable[int]) -> bool:
+    """recipe_id にサブレシピを追加すると循環参照になるかを判定"""
+    sub_recipe_ids = set(sub_recipe_ids)
+    if recipe_id in sub_recipe_ids:
+        return True
+    # 既存の親子関係 (このレシピ自身の辺は置き換えられるので除外) で、
+    # 追加するサブレシピから recipe_id に到達できれば循環する
+    other_edges = [(parent_id, child_id) for parent_id, child_id in edges if parent_id != recipe_id]
+    return recipe_id in descendants(other_edges, sub_recipe_ids)
+
+
+def topological_levels(recipe_ids: Iterable[int], edges: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """各レシピの段数を返す (サブレシピを持たないレシピが0、親は子より必ず大きい)
+
+    循環参照がある場合は ValueError を送出する。
+    """
+    edges = list(edges)
+    children = build_children(edges)
+    levels: Dict[int, int] = {}
+    visiting: Set[int] = set()
+
+    for root_id in recipe_ids:
+        if root_id in levels:
+            continue
+        # 再帰を使わない深さ優先探索 (帰りがけ順に段数を確定)
+        stack: List[Tuple[int, bool]] = [(root_id, False)]
+        while stack:
+            recipe_id, expanded = stack.pop()
+            if expanded:
+                visiting.discard(recipe_id)
+                levels[recipe_id] = max(
+                    (levels[child_id] + 1 for child_id in children.get(recipe_id, ())), default=0
+                )
+                continue
+            if recipe_id in levels:
+                continue
+            if recipe_id in visiting:
+                raise ValueError(f"レシピID {recipe_id} で循環参照が検出されました")
+            visiting.add(recipe_id)
+            stack.append((recipe_id, True))
+            for child_id in children.get(recipe_id, ()):
+                if child_id not in levels:
+                    if child_id in visiting:
+                        raise ValueError(f"レシピID {child_id} で循環参照が検出されました")
+                    stack.append((child_id, False))
+
+    return levels
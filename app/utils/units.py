@@ -0,0 +1,83 @@
+from typing import Dict, Optional, Tuple
+
+
+class UnitConversionError(ValueError):
+    """単位を換算できない場合のエラー"""
+
+
+# 単位ごとの次元と基準単位への換算係数 (質量: g, 体積: ml, 個数: 個)
+UNIT_DEFINITIONS: Dict[str, Tuple[str, float]] = {
+    # 質量
+    "mg": ("mass", 0.001),
+    "g": ("mass", 1),
+    "kg": ("mass", 1000),
+    # 体積
+    "ml": ("volume", 1),
+    "cc": ("volume", 1),
+    "dl": ("volume", 100),
+    "l": ("volume", 1000),
+    "小さじ": ("volume", 5),
+    "大さじ": ("volume", 15),
+    "カップ": ("volume", 200),
+    # 個数
+    "個": ("count", 1),
+    "枚": ("count", 1),
+    "本": ("count", 1),
+    "ダース": ("count", 12),
+}
+
+
+def normalize_unit(unit: Optional[str]) -> Optional[str]:
+    """単位の表記を正規化 (前後の空白を除き、英字は小文字にする)"""
+    if unit is None:
+        return None
+    return unit.strip().lower()
+
+
+# 同じ次元の単位同士の換算係数を事前に計算しておく
+CONVERSION_FACTORS: Dict[Tuple[str, str], float] = {
+    (from_unit, to_unit): from_factor / to_factor
+    for from_unit, (from_dimension, from_factor) in UNIT_DEFINITIONS.items()
+    for to_unit, (to_dimension, to_factor) in UNIT_DEFINITIONS.items()
+    if from_dimension == to_dimension
+}
+
+
+def conversion_factor(from_unit: str, to_unit: str, density: Optional[float] = None) -> float:
+    """from_unit の数量を to_unit に換算する係数を返す
+
+    質量と体積の換算には密度 (g/ml) が必要。換算できない場合は UnitConversionError。
+    """
+    from_key = normalize_unit(from_unit)
+    to_key = normalize_unit(to_unit)
+    if from_key == to_key:
+        return 1.0
+
+    factor = CONVERSION_FACTORS.get((from_key, to_key))
+    if factor is not None:
+        return factor
+
+    if from_key not in UNIT_DEFINITIONS or to_key not in UNIT_DEFINITIONS:
+        raise UnitConversionError(f"単位 {from_unit} を {to_unit} に換算できません")
+
+    from_dimension, from_factor = UNIT_DEFINITIONS[from_key]
+    to_dimension, to_factor = UNIT_DEFINITIONS[to_key]
+    if {from_dimension, to_dimension} == {"mass", "volume"}:
+        if not density:
+            raise UnitConversionError(
+                f"単位 {from_unit} を {to_unit} に換算するには材料の密度 (g/ml) が必要です"
+            )
+        if from_dimension == "volume":
+            # ml → g
+            return from_factor * density / to_factor
+        # g → ml
+        return from_factor / density / to_factor
+
+    raise UnitConversionError(f"単位 {from_unit} を {to_unit} に換算できません")
+
+
+def to_material_quantity(material, quantity: float, unit: Optional[str]) -> float:
+    """レシピの使用量を材料の単位に換算 (単位の指定がなければそのまま)"""
+    if unit is None:
+        return quantity
+    return quantity * conversion_factor(unit, material.unit, material.density)
@@ -0,0 +1,171 @@
+"""
+一覧取得エンドポイントの同期/非同期パスのスループット比較
+
+非同期版 (アプリの GET /api/materials/ など) と、同じクエリ・同じ response_model を同期セッションで
+実行するベンチマーク用エンドポイントに、同時接続数を変えてリクエストを送る。
+データベースは一時ファイルを使うため、既存の bakery.db には影響しない。
+
+使用方法:
+python -m benchmarks.bench_async_reads --requests 500 --concurrency 1 10 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+
+# アプリを読み込む前に一時データベースを設定
+# (応答キャッシュはデータベースを読まずに応答するため、I/O を比較できるように無効にする)
+_tmpdir = tempfile.mkdtemp(prefix="bakery-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+
+from typing import List  # noqa: E402
+import httpx  # noqa: E402
+from fastapi import APIRouter, Depends, Request, Response  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from app.main import app  # noqa: E402
+from app.database import get_db  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.models.material import Material  # noqa: E402
+from app.models.recipe import Recipe  # noqa: E402
+from app.models.product import Product  # noqa: E402
+from app.routes.recipes import format_recipe_response  # noqa: E402
+from app.schemas.material import MaterialResponse  # noqa: E402
+from app.schemas.product import ProductResponse  # noqa: E402
+from app.schemas.recipe import RecipeResponse  # noqa: E402
+from app.utils.cache import response_cache  # noqa: E402
+from app.utils.dependencies import get_current_user  # noqa: E402
+from app.utils.etag import check_etag  # noqa: E402
+from app.utils.loaders import recipe_detail_options  # noqa: E402
+from app.utils.pagination import finish_page, paginate  # noqa: E402
+
+# 比較用の同期エンドポイント (非同期版と同じクエリ・ETag の確認・response_model で、セッションだけが違う)
+sync_router = APIRouter(prefix="/bench/sync")
+
+
+def sync_list(db: Session, request: Request, response: Response, user: User,
+              resource: str, model, response_model, options=(), format_row=None):
+    cache_key = response_cache.key(request, resource, user.id)
+    cached = response_cache.lookup(request, cache_key)
+    if cached is not None:
+        return cached
+
+    not_modified = check_etag(db, request, response, resource, user.id)
+    if not_modified is not None:
+        return not_modified
+
+    result = db.execute(paginate(
+        select(model).options(*options).where(model.user_id == user.id), model.id, None, 0, 100
+    ))
+    rows = finish_page(result.scalars().all(), 100, response)
+    if format_row is not None:
+        rows = [format_row(row) for row in rows]
+    return response_cache.store(cache_key, response, response_model, rows)
+
+
+@sync_router.get("/materials", response_model=List[MaterialResponse])
+def sync_materials(request: Request, response: Response,
+                   current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return sync_list(db, request, response, current_user, "materials", Material, List[MaterialResponse])
+
+
+@sync_router.get("/recipes", response_model=List[RecipeResponse])
+def sync_recipes(request: Request, response: Response,
+                 current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return sync_list(db, request, response, current_user, "recipes", Recipe, List[RecipeResponse],
+                     options=recipe_detail_options(), format_row=format_recipe_response)
+
+
+@sync_router.get("/products", response_model=List[ProductResponse])
+def sync_products(request: Request, response: Response,
+                  current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    return sync_list(db, request, response, current_user, "products", Product, List[ProductResponse])
+
+
+app.include_router(sync_router)
+
+ENDPOINTS = [
+    ("materials", "/api/materials/", "/bench/sync/materials"),
+    ("recipes", "/api/recipes/", "/bench/sync/recipes"),
+    ("products", "/api/products/", "/bench/sync/products"),
+]
+
+
+async def seed(client: httpx.AsyncClient, materials: int, recipes: int) -> dict:
+    """ベンチマーク用の店舗とデータを作成し、Authorizationヘッダーを返す"""
+    suffix = uuid.uuid4().hex[:8]
+    email = f"bench_{suffix}@example.com"
+    await client.post("/api/auth/register", json={
+        "store_id": f"bench_{suffix}", "store_name": "ベンチマーク",
+        "email": email, "password": "benchpassword123"
+    })
+    token = (await client.post(
+        "/api/auth/login", json={"email": email, "password": "benchpassword123"}
+    )).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    material_ids = []
+    for i in range(materials):
+        response = await client.post("/api/materials/", headers=headers, json={
+            "name": f"材料{i}", "purchase_price": 100 + i, "purchase_quantity": 1000, "unit": "g"
+        })
+        material_ids.append(response.json()["id"])
+
+    for i in range(recipes):
+        recipe = (await client.post("/api/recipes/", headers=headers, json={
+            "name": f"レシピ{i}",
+            "materials": [
+                {"material_id": material_ids[(i + k) % len(material_ids)], "quantity": 10}
+                for k in range(5)
+            ]
+        })).json()
+        await client.post("/api/products/", headers=headers, json={
+            "name": f"商品{i}", "recipe_id": recipe["id"], "selling_price": 300
+        })
+
+    return headers
+
+
+async def measure(client: httpx.AsyncClient, url: str, headers: dict,
+                  total: int, concurrency: int) -> float:
+    """total 件のリクエストを concurrency 並列で送り、1秒あたりのリクエスト数を返す"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            response = await client.get(url, headers=headers)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    return total / (time.perf_counter() - start)
+
+
+async def main(args) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = await seed(client, args.materials, args.recipes)
+
+        print(f"{'endpoint':<10} {'concurrency':>11} {'sync req/s':>11} {'async req/s':>12} {'ratio':>6}")
+        for name, async_url, sync_url in ENDPOINTS:
+            for concurrency in args.concurrency:
+                # ウォームアップ
+                await measure(client, sync_url, headers, concurrency, concurrency)
+                await measure(client, async_url, headers, concurrency, concurrency)
+
+                sync_rps = await measure(client, sync_url, headers, args.requests, concurrency)
+                async_rps = await measure(client, async_url, headers, args.requests, concurrency)
+                print(f"{name:<10} {concurrency:>11} {sync_rps:>11.1f} {async_rps:>12.1f} "
+                      f"{async_rps / sync_rps:>6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300, help="計測ごとのリクエスト数")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50], help="同時リクエスト数")
+    parser.add_argument("--materials", type=int, default=50, help="作成する材料数")
+    parser.add_argument("--recipes", type=int, default=50, help="作成するレシピ・商品数")
+    asyncio.run(main(parser.parse_args()))
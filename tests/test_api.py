@@ -4,13 +4,43 @@ API テストサンプル
 使用方法:
 pytest tests/test_api.py
 """
+import csv
+import io
+import json
+import uuid
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import update
 from app.main import app
+from app.config import settings
+from app.database import SessionLocal
+from app.models.user import User
+from app.utils.cache import LocalLRUCache, response_cache
 
 client = TestClient(app)
 
 
+def register_and_login(store_id=None):
+    """テスト用の店舗を登録してAuthorizationヘッダーを返す"""
+    suffix = uuid.uuid4().hex[:8]
+    email = f"store_{suffix}@example.com"
+    client.post(
+        "/api/auth/register",
+        json={
+            "store_id": store_id or f"store_{suffix}",
+            "store_name": "テストベーカリー",
+            "email": email,
+            "password": "testpassword123"
+        }
+    )
+    login_response = client.post(
+        "/api/auth/login",
+        json={"email": email, "password": "testpassword123"}
+    )
+    token = login_response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
 def test_health_check():
     """ヘルスチェックのテスト"""
     response = client.get("/health")
@@ -62,6 +92,21 @@ def test_user_login():
     assert data["token_type"] == "bearer"
 
 
+def test_writes_are_locked_while_store_is_moving():
+    """シャードの移動中の店舗は読み込みのみできること"""
+    store_id = f"moving_{uuid.uuid4().hex[:8]}"
+    headers = register_and_login(store_id)
+    with SessionLocal() as db:
+        db.execute(update(User).where(User.store_id == store_id).values(shard_moving=True))
+        db.commit()
+
+    material = {"name": "小麦粉", "purchase_price": 300, "purchase_quantity": 1000, "unit": "g"}
+    response = client.post("/api/materials", json=material, headers=headers)
+    assert response.status_code == 423
+    assert client.get("/api/materials", headers=headers).status_code == 200
+    assert client.get("/api/fixed-costs/total", headers=headers).status_code == 200
+
+
 def test_material_crud():
     """材料のCRUDテスト"""
     # ユーザー登録とログイン
@@ -121,5 +166,1125 @@ def test_material_crud():
     assert delete_response.status_code == 204
 
 
+def test_material_price_change_propagates_to_recipes_and_products():
+    """材料価格の変更がレシピと商品の原価に反映されるテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    butter = client.post(
+        "/api/materials/",
+        json={"name": "バター", "purchase_price": 1000, "purchase_quantity": 500, "unit": "g"},
+        headers=headers
+    ).json()
+
+    recipe = client.post(
+        "/api/recipes/",
+        json={
+            "name": "クロワッサン",
+            "materials": [
+                {"material_id": flour["id"], "quantity": 100},
+                {"material_id": butter["id"], "quantity": 50}
+            ]
+        },
+        headers=headers
+    ).json()
+    assert recipe["material_cost"] == pytest.approx(150)
+
+    product = client.post(
+        "/api/products/",
+        json={"name": "クロワッサン", "recipe_id": recipe["id"], "profit_margin": 50},
+        headers=headers
+    ).json()
+    assert product["total_cost"] == pytest.approx(150)
+
+    # 強力粉の価格を変更
+    client.put(f"/api/materials/{flour['id']}", json={"purchase_price": 1000}, headers=headers)
+
+    recipe = client.get(f"/api/recipes/{recipe['id']}", headers=headers).json()
+    assert recipe["material_cost"] == pytest.approx(200)
+
+    product = client.get(f"/api/products/{product['id']}", headers=headers).json()
+    assert product["material_cost"] == pytest.approx(200)
+    assert product["total_cost"] == pytest.approx(200)
+    assert product["suggested_price"] == pytest.approx(400)
+
+    # バターを削除するとレシピと商品から外れる
+    client.delete(f"/api/materials/{butter['id']}", headers=headers)
+
+    product = client.get(f"/api/products/{product['id']}", headers=headers).json()
+    assert product["material_cost"] == pytest.approx(100)
+
+
+def test_bulk_recalculate_products():
+    """商品原価の一括再計算のテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={"name": "食パン", "materials": [{"material_id": flour["id"], "quantity": 300}]},
+        headers=headers
+    ).json()
+    with_fixed = client.post(
+        "/api/products/",
+        json={"name": "食パン", "recipe_id": recipe["id"], "include_fixed_cost": True},
+        headers=headers
+    ).json()
+    without_fixed = client.post(
+        "/api/products/",
+        json={"name": "食パン (ハーフ)", "recipe_id": recipe["id"], "profit_margin": 0},
+        headers=headers
+    ).json()
+    client.post(
+        "/api/fixed-costs/",
+        json={"name": "家賃", "monthly_amount": 10000},
+        headers=headers
+    )
+
+    response = client.post(
+        "/api/products/recalculate",
+        json={"total_monthly_production": 100},
+        headers=headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["updated_count"] == 2
+    assert data["recipe_count"] == 1
+    assert data["elapsed_ms"] >= 0
+
+    product = client.get(f"/api/products/{with_fixed['id']}", headers=headers).json()
+    assert product["fixed_cost_per_unit"] == pytest.approx(100)
+    assert product["total_cost"] == pytest.approx(250)
+    assert product["suggested_price"] == pytest.approx(250 / 0.7)
+    assert product["updated_at"] != with_fixed["updated_at"]
+
+    product = client.get(f"/api/products/{without_fixed['id']}", headers=headers).json()
+    assert product["total_cost"] == pytest.approx(150)
+
+    # 商品を絞り込んで再計算
+    response = client.post(
+        "/api/products/recalculate",
+        json={"product_ids": [without_fixed["id"]]},
+        headers=headers
+    )
+    assert response.json()["updated_count"] == 1
+
+
+def test_price_simulation_is_read_only():
+    """材料価格シミュレーションのテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    sugar = client.post(
+        "/api/materials/",
+        json={"name": "砂糖", "purchase_price": 200, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={"name": "バゲット", "materials": [{"material_id": flour["id"], "quantity": 200}]},
+        headers=headers
+    ).json()
+    product = client.post(
+        "/api/products/",
+        json={"name": "バゲット", "recipe_id": recipe["id"]},
+        headers=headers
+    ).json()
+    client.put(f"/api/products/{product['id']}", json={"selling_price": 400}, headers=headers)
+
+    response = client.post(
+        "/api/products/simulate",
+        json={"scenarios": [
+            {"name": "小麦粉20%値上げ", "changes": [{"material_id": flour["id"], "percent_change": 20}]},
+            {"name": "小麦粉の購入価格変更", "changes": [{"material_id": flour["id"], "purchase_price": 1000}]},
+            {"name": "砂糖のみ", "changes": [{"material_id": sugar["id"], "percent_change": 50}]}
+        ]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    scenarios = response.json()["scenarios"]
+
+    simulated = scenarios[0]["products"][0]
+    assert simulated["current_total_cost"] == pytest.approx(100)
+    assert simulated["total_cost"] == pytest.approx(120)
+    assert simulated["actual_profit_margin"] == pytest.approx(70)
+    assert scenarios[1]["products"][0]["total_cost"] == pytest.approx(200)
+    assert scenarios[2]["products"] == []
+
+    # DBは更新されない
+    stored = client.get(f"/api/products/{product['id']}", headers=headers).json()
+    assert stored["total_cost"] == pytest.approx(100)
+
+    # 購入金額と変動率の両方を指定するとエラー
+    response = client.post(
+        "/api/products/simulate",
+        json={"scenarios": [{"changes": [
+            {"material_id": flour["id"], "percent_change": 20, "purchase_price": 600}
+        ]}]},
+        headers=headers
+    )
+    assert response.status_code == 400
+
+
+def test_cost_sensitivity_report():
+    """材料ごとの原価感応度レポートのテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    butter = client.post(
+        "/api/materials/",
+        json={"name": "バター", "purchase_price": 1000, "purchase_quantity": 500, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={
+            "name": "ブリオッシュ",
+            "materials": [
+                {"material_id": flour["id"], "quantity": 100},
+                {"material_id": butter["id"], "quantity": 75}
+            ]
+        },
+        headers=headers
+    ).json()
+    product = client.post(
+        "/api/products/",
+        json={"name": "ブリオッシュ", "recipe_id": recipe["id"], "profit_margin": 50},
+        headers=headers
+    ).json()
+    client.put(f"/api/products/{product['id']}", json={"selling_price": 400}, headers=headers)
+
+    response = client.get("/api/products/cost-sensitivity", headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert len(report) == 1
+    assert report[0]["material_cost"] == pytest.approx(200)
+
+    by_material = {m["material_id"]: m for m in report[0]["materials"]}
+    assert by_material[flour["id"]]["share"] == pytest.approx(25)
+    assert by_material[butter["id"]]["share"] == pytest.approx(75)
+    assert by_material[butter["id"]]["cost_change_per_percent"] == pytest.approx(1.5)
+    assert by_material[butter["id"]]["suggested_price_change_per_percent"] == pytest.approx(3)
+    assert by_material[butter["id"]]["margin_change_per_percent"] == pytest.approx(-0.375)
+
+
+def test_nested_sub_recipes():
+    """サブレシピを含むレシピの原価計算と循環参照のテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    butter = client.post(
+        "/api/materials/",
+        json={"name": "バター", "purchase_price": 1000, "purchase_quantity": 500, "unit": "g"},
+        headers=headers
+    ).json()
+
+    # 共通の生地
+    dough = client.post(
+        "/api/recipes/",
+        json={"name": "デニッシュ生地", "materials": [{"material_id": flour["id"], "quantity": 200}]},
+        headers=headers
+    ).json()
+    assert dough["material_cost"] == pytest.approx(100)
+
+    danish = client.post(
+        "/api/recipes/",
+        json={
+            "name": "デニッシュ",
+            "materials": [{"material_id": butter["id"], "quantity": 10}],
+            "sub_recipes": [{"sub_recipe_id": dough["id"], "quantity": 0.5}]
+        },
+        headers=headers
+    ).json()
+    assert danish["material_cost"] == pytest.approx(70)
+    assert danish["sub_recipes"][0]["sub_recipe_name"] == "デニッシュ生地"
+
+    product = client.post(
+        "/api/products/",
+        json={"name": "デニッシュ", "recipe_id": danish["id"], "profit_margin": 0},
+        headers=headers
+    ).json()
+    assert product["total_cost"] == pytest.approx(70)
+
+    # 生地の材料価格の変更が親レシピと商品に伝播する
+    client.put(f"/api/materials/{flour['id']}", json={"purchase_price": 1000}, headers=headers)
+    danish = client.get(f"/api/recipes/{danish['id']}", headers=headers).json()
+    assert danish["material_cost"] == pytest.approx(120)
+    product = client.get(f"/api/products/{product['id']}", headers=headers).json()
+    assert product["total_cost"] == pytest.approx(120)
+
+    # 一括再計算でも同じ結果になる
+    client.post("/api/products/recalculate", json={}, headers=headers)
+    product = client.get(f"/api/products/{product['id']}", headers=headers).json()
+    assert product["total_cost"] == pytest.approx(120)
+
+    # 感応度レポートはサブレシピの材料も展開する
+    report = client.get("/api/products/cost-sensitivity", headers=headers).json()
+    shares = {m["material_id"]: m["share"] for m in report[0]["materials"]}
+    assert shares[flour["id"]] == pytest.approx(100 / 120 * 100)
+
+    # 循環参照は拒否される
+    response = client.put(
+        f"/api/recipes/{dough['id']}",
+        json={"sub_recipes": [{"sub_recipe_id": danish["id"], "quantity": 1}]},
+        headers=headers
+    )
+    assert response.status_code == 400
+
+
+def test_recipe_yield_per_unit_cost():
+    """出来上がり数とロス率による1個あたり原価のテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={
+            "name": "ロールパン",
+            "yield_quantity": 10,
+            "loss_rate": 20,
+            "materials": [{"material_id": flour["id"], "quantity": 800}]
+        },
+        headers=headers
+    ).json()
+    assert recipe["material_cost"] == pytest.approx(400)
+    assert recipe["cost_per_unit"] == pytest.approx(50)
+
+    product = client.post(
+        "/api/products/",
+        json={"name": "ロールパン", "recipe_id": recipe["id"], "profit_margin": 0},
+        headers=headers
+    ).json()
+    assert product["material_cost"] == pytest.approx(50)
+
+    # 出来上がり数の変更が商品に反映される
+    client.put(f"/api/recipes/{recipe['id']}", json={"loss_rate": 0}, headers=headers)
+    product = client.get(f"/api/products/{product['id']}", headers=headers).json()
+    assert product["material_cost"] == pytest.approx(40)
+
+    client.post("/api/products/recalculate", json={}, headers=headers)
+    product = client.get(f"/api/products/{product['id']}", headers=headers).json()
+    assert product["material_cost"] == pytest.approx(40)
+
+
+def test_recipe_quantities_are_converted_to_material_units():
+    """レシピの使用量を材料の単位に換算するテスト"""
+    headers = register_and_login()
+
+    # 25kg袋で購入する強力粉
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 5000, "purchase_quantity": 25, "unit": "kg"},
+        headers=headers
+    ).json()
+    milk = client.post(
+        "/api/materials/",
+        json={"name": "牛乳", "purchase_price": 250, "purchase_quantity": 1000, "unit": "g", "density": 1.03},
+        headers=headers
+    ).json()
+
+    recipe = client.post(
+        "/api/recipes/",
+        json={
+            "name": "ミルクパン",
+            "materials": [
+                {"material_id": flour["id"], "quantity": 300, "unit": "g"},
+                {"material_id": milk["id"], "quantity": 100, "unit": "ml"}
+            ]
+        },
+        headers=headers
+    ).json()
+    lines = {line["material_id"]: line for line in recipe["materials"]}
+    assert lines[flour["id"]]["quantity"] == pytest.approx(0.3)
+    assert lines[flour["id"]]["input_unit"] == "g"
+    assert lines[milk["id"]]["quantity"] == pytest.approx(103)
+    assert recipe["material_cost"] == pytest.approx(60 + 25.75)
+
+    # 材料の単位を変更すると使用量が換算し直される
+    client.put(
+        f"/api/materials/{flour['id']}",
+        json={"unit": "g", "purchase_quantity": 25000},
+        headers=headers
+    )
+    recipe = client.get(f"/api/recipes/{recipe['id']}", headers=headers).json()
+    lines = {line["material_id"]: line for line in recipe["materials"]}
+    assert lines[flour["id"]]["quantity"] == pytest.approx(300)
+    assert recipe["material_cost"] == pytest.approx(60 + 25.75)
+
+    # 換算できない単位はエラー
+    response = client.post(
+        "/api/recipes/",
+        json={"name": "エラー", "materials": [{"material_id": flour["id"], "quantity": 1, "unit": "個"}]},
+        headers=headers
+    )
+    assert response.status_code == 400
+
+
+def test_material_price_history_and_cost_as_of():
+    """材料価格の履歴と指定日時時点の原価計算のテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={"name": "食パン", "materials": [{"material_id": flour["id"], "quantity": 400}]},
+        headers=headers
+    ).json()
+    product = client.post(
+        "/api/products/",
+        json={"name": "食パン", "recipe_id": recipe["id"], "profit_margin": 0},
+        headers=headers
+    ).json()
+
+    client.put(f"/api/materials/{flour['id']}", json={"purchase_price": 750}, headers=headers)
+    # 価格以外の変更では履歴を追加しない
+    client.put(f"/api/materials/{flour['id']}", json={"name": "強力粉 (北海道産)"}, headers=headers)
+
+    history = client.get(f"/api/materials/{flour['id']}/price-history", headers=headers).json()
+    assert [h["purchase_price"] for h in history] == [500, 750]
+
+    before, after = history[0]["effective_at"], history[1]["effective_at"]
+
+    old_cost = client.get(
+        f"/api/recipes/{recipe['id']}/cost-as-of", params={"as_of": before}, headers=headers
+    ).json()
+    assert old_cost["material_cost"] == pytest.approx(200)
+    assert old_cost["missing_material_ids"] == []
+
+    new_cost = client.get(
+        f"/api/products/{product['id']}/cost-as-of", params={"as_of": after}, headers=headers
+    ).json()
+    assert new_cost["total_cost"] == pytest.approx(300)
+
+    # 履歴より前の日時は現在の単価で計算し、その材料を報告する
+    early = client.get(
+        f"/api/products/{product['id']}/cost-as-of", params={"as_of": "2000-01-01T00:00:00"}, headers=headers
+    ).json()
+    assert early["missing_material_ids"] == [flour["id"]]
+
+    # 単位を変えても、履歴の単価を現在の単位に換算して計算する (400g → 0.4kg)
+    client.put(
+        f"/api/materials/{flour['id']}",
+        json={"purchase_price": 750, "purchase_quantity": 1, "unit": "kg"},
+        headers=headers
+    )
+    history = client.get(f"/api/materials/{flour['id']}/price-history", headers=headers).json()
+    assert [h["unit"] for h in history] == ["g", "g", "kg"]
+    old_cost = client.get(
+        f"/api/recipes/{recipe['id']}/cost-as-of", params={"as_of": before}, headers=headers
+    ).json()
+    assert old_cost["material_cost"] == pytest.approx(200)
+    assert old_cost["missing_material_ids"] == []
+
+
+def test_monte_carlo_cost_simulation(monkeypatch):
+    """モンテカルロ法による原価分布のテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    butter = client.post(
+        "/api/materials/",
+        json={"name": "バター", "purchase_price": 1000, "purchase_quantity": 500, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={
+            "name": "クロワッサン",
+            "materials": [
+                {"material_id": flour["id"], "quantity": 100},
+                {"material_id": butter["id"], "quantity": 50}
+            ]
+        },
+        headers=headers
+    ).json()
+    product = client.post(
+        "/api/products/",
+        json={"name": "クロワッサン", "recipe_id": recipe["id"]},
+        headers=headers
+    ).json()
+    client.put(f"/api/products/{product['id']}", json={"selling_price": 300}, headers=headers)
+
+    # 変動幅0なら現在の原価と一致する
+    response = client.post(
+        "/api/products/monte-carlo",
+        json={"n_scenarios": 200, "default_volatility": 0},
+        headers=headers
+    )
+    assert response.status_code == 200
+    result = response.json()["products"][0]
+    assert result["total_cost"]["p50"] == pytest.approx(150)
+    assert result["actual_profit_margin"]["p99"] == pytest.approx(50)
+
+    # バターだけが変動する場合も原価・利益率の分布が計算される
+    request = {
+        "n_scenarios": 2000,
+        "distribution": "normal",
+        "default_volatility": 0,
+        "material_volatilities": [{"material_id": butter["id"], "volatility": 20}],
+        "seed": 42
+    }
+    result = client.post("/api/products/monte-carlo", json=request, headers=headers).json()["products"][0]
+    assert result["total_cost"]["p50"] < result["total_cost"]["p90"] < result["total_cost"]["p99"]
+    assert result["actual_profit_margin"]["p50"] < result["actual_profit_margin"]["p90"]
+
+    # プロセスプールに分割しても同じ形の結果を返す
+    monkeypatch.setattr(settings, "monte_carlo_parallel_threshold", 0)
+    monkeypatch.setattr(settings, "monte_carlo_max_workers", 2)
+    parallel = client.post("/api/products/monte-carlo", json=request, headers=headers).json()["products"][0]
+    assert parallel["total_cost"]["p50"] == pytest.approx(result["total_cost"]["p50"], rel=0.05)
+
+
+def test_production_plan_material_requirements():
+    """生産計画から材料の必要量を計算するテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 5000, "purchase_quantity": 25, "unit": "kg"},
+        headers=headers
+    ).json()
+    butter = client.post(
+        "/api/materials/",
+        json={"name": "バター", "purchase_price": 1000, "purchase_quantity": 500, "unit": "g"},
+        headers=headers
+    ).json()
+    dough = client.post(
+        "/api/recipes/",
+        json={
+            "name": "クロワッサン生地",
+            "yield_quantity": 20,
+            "materials": [{"material_id": flour["id"], "quantity": 1000, "unit": "g"}]
+        },
+        headers=headers
+    ).json()
+    croissant = client.post(
+        "/api/recipes/",
+        json={
+            "name": "クロワッサン",
+            "yield_quantity": 10,
+            "materials": [{"material_id": butter["id"], "quantity": 200}],
+            "sub_recipes": [{"sub_recipe_id": dough["id"], "quantity": 10}]
+        },
+        headers=headers
+    ).json()
+    product = client.post(
+        "/api/products/",
+        json={"name": "クロワッサン", "recipe_id": croissant["id"]},
+        headers=headers
+    ).json()
+    bought_in = client.post("/api/products/", json={"name": "仕入れジャム"}, headers=headers).json()
+
+    response = client.post(
+        "/api/production/requirements",
+        json={"items": [
+            {"product_id": product["id"], "quantity": 50},
+            {"product_id": bought_in["id"], "quantity": 3}
+        ]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+
+    # クロワッサン50個 = 5バッチ → 生地50個 = 2.5バッチ → 強力粉2.5kg、バター1000g
+    required = {m["material_id"]: m for m in data["materials"]}
+    assert required[flour["id"]]["quantity"] == pytest.approx(2.5)
+    assert required[flour["id"]]["unit"] == "kg"
+    assert required[butter["id"]]["quantity"] == pytest.approx(1000)
+    assert data["total_cost"] == pytest.approx(500 + 2000)
+    assert data["products_without_recipe"] == [bought_in["id"]]
+
+
+def test_inventory_ledger_and_production_depletion():
+    """在庫の入出庫記録と生産による材料の引き落としのテスト"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 5000, "purchase_quantity": 25, "unit": "kg"},
+        headers=headers
+    ).json()
+    butter = client.post(
+        "/api/materials/",
+        json={"name": "バター", "purchase_price": 1000, "purchase_quantity": 500, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={
+            "name": "バターロール",
+            "yield_quantity": 10,
+            "materials": [
+                {"material_id": flour["id"], "quantity": 500, "unit": "g"},
+                {"material_id": butter["id"], "quantity": 50}
+            ]
+        },
+        headers=headers
+    ).json()
+    product = client.post(
+        "/api/products/",
+        json={"name": "バターロール", "recipe_id": recipe["id"]},
+        headers=headers
+    ).json()
+
+    # 入庫と廃棄
+    response = client.post(
+        "/api/inventory/transactions",
+        json={"entries": [
+            {"material_id": flour["id"], "transaction_type": "purchase", "quantity": 25},
+            {"material_id": butter["id"], "transaction_type": "purchase", "quantity": 1000},
+            {"material_id": butter["id"], "transaction_type": "waste", "quantity": 100, "note": "期限切れ"}
+        ]},
+        headers=headers
+    )
+    assert response.status_code == 201
+    balances = {b["material_id"]: b["quantity"] for b in response.json()["balances"]}
+    assert balances[flour["id"]] == pytest.approx(25)
+    assert balances[butter["id"]] == pytest.approx(900)
+
+    # 廃棄に負の数は指定できない
+    response = client.post(
+        "/api/inventory/transactions",
+        json={"entries": [{"material_id": butter["id"], "transaction_type": "waste", "quantity": -1}]},
+        headers=headers
+    )
+    assert response.status_code == 400
+
+    # バターロール30個 = 3バッチ → 強力粉1.5kg、バター150g を消費
+    response = client.post(
+        "/api/inventory/production",
+        json={"items": [{"product_id": product["id"], "quantity": 30}]},
+        headers=headers
+    )
+    assert response.status_code == 201
+    assert response.json()["recorded_count"] == 2
+
+    response = client.get("/api/inventory/balances", headers=headers)
+    assert response.status_code == 200
+    balances = {b["material_id"]: b for b in response.json()}
+    assert balances[flour["id"]]["quantity"] == pytest.approx(23.5)
+    assert balances[flour["id"]]["unit"] == "kg"
+    assert balances[butter["id"]]["quantity"] == pytest.approx(750)
+
+    response = client.get(
+        "/api/inventory/transactions", params={"material_id": butter["id"]}, headers=headers
+    )
+    assert response.status_code == 200
+    assert [t["transaction_type"] for t in response.json()].count("production") == 1
+    assert sum(t["quantity"] for t in response.json()) == pytest.approx(750)
+
+
+def test_database_diagnostics(monkeypatch):
+    """データベース設定の診断エンドポイントのテスト (管理者の店舗のみ)"""
+    admin_store_id = f"admin_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(settings, "admin_store_ids", [admin_store_id])
+    headers = register_and_login(admin_store_id)
+
+    # サーバー全体の設定なので、他の店舗には見せない
+    assert client.get("/api/diagnostics/database", headers=register_and_login()).status_code == 403
+
+    response = client.get("/api/diagnostics/database", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["dialect"] == "sqlite"
+    assert data["pool"]["pool_class"] == "QueuePool"
+    assert data["pool"]["size"] == settings.db_pool_size
+    assert data["pool"]["max_overflow"] == settings.db_max_overflow
+
+    # 設定した PRAGMA が接続に反映されていること
+    active = data["active_pragmas"]
+    assert active["journal_mode"].upper() == settings.sqlite_journal_mode
+    assert active["busy_timeout"] == settings.sqlite_busy_timeout_ms
+    assert active["cache_size"] == settings.sqlite_cache_size
+    assert active["synchronous"] == 1  # NORMAL
+
+    assert client.get("/api/diagnostics/database").status_code == 401
+
+
+def test_async_list_endpoints():
+    """非同期セッションで読み込む一覧エンドポイントのテスト (店舗ごとに分離されること)"""
+    headers = register_and_login()
+    other_headers = register_and_login()
+
+    material = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={"name": "食パン", "materials": [{"material_id": material["id"], "quantity": 250}]},
+        headers=headers
+    ).json()
+    client.post("/api/products/", json={"name": "食パン", "recipe_id": recipe["id"]}, headers=headers)
+
+    materials = client.get("/api/materials/", headers=headers).json()
+    assert [m["name"] for m in materials] == ["強力粉"]
+    recipes = client.get("/api/recipes/", headers=headers).json()
+    assert recipes[0]["materials"][0]["cost"] == pytest.approx(125)
+    products = client.get("/api/products/", headers=headers).json()
+    assert products[0]["material_cost"] == pytest.approx(125)
+
+    for path in ("/api/materials/", "/api/recipes/", "/api/products/"):
+        assert client.get(path, headers=other_headers).json() == []
+        assert client.get(path).status_code == 401
+
+
+def test_cursor_pagination():
+    """キーセット方式のページングのテスト"""
+    headers = register_and_login()
+
+    material_ids = [
+        client.post(
+            "/api/materials/",
+            json={"name": f"材料{i}", "purchase_price": 100, "purchase_quantity": 1000, "unit": "g"},
+            headers=headers
+        ).json()["id"]
+        for i in range(5)
+    ]
+
+    # 1ページ目 (カーソルなしは offset 方式と同じ先頭から)
+    response = client.get("/api/materials/", params={"limit": 2}, headers=headers)
+    assert [m["id"] for m in response.json()] == material_ids[:2]
+    cursor = response.headers["X-Next-Cursor"]
+
+    # ページング中に追加された行があっても、重複や抜けなく続きを取得できる
+    added = client.post(
+        "/api/materials/",
+        json={"name": "追加", "purchase_price": 100, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()["id"]
+
+    seen = [m["id"] for m in response.json()]
+    while cursor:
+        response = client.get("/api/materials/", params={"limit": 2, "cursor": cursor}, headers=headers)
+        assert response.status_code == 200
+        seen.extend(m["id"] for m in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+    assert seen == material_ids + [added]
+
+    # 従来の offset 方式も利用できる
+    response = client.get("/api/materials/", params={"skip": 4, "limit": 10}, headers=headers)
+    assert [m["id"] for m in response.json()] == [material_ids[4], added]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/api/materials/", params={"cursor": "invalid"}, headers=headers)
+    assert response.status_code == 400
+
+    # 固定費と入出庫履歴 (新しい順)
+    for i in range(3):
+        client.post("/api/fixed-costs/", json={"name": f"固定費{i}", "monthly_amount": 1000}, headers=headers)
+    response = client.get("/api/fixed-costs/", params={"limit": 2}, headers=headers)
+    response = client.get(
+        "/api/fixed-costs/", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]}, headers=headers
+    )
+    assert [f["name"] for f in response.json()] == ["固定費2"]
+
+    client.post(
+        "/api/inventory/transactions",
+        json={"entries": [
+            {"material_id": material_id, "transaction_type": "purchase", "quantity": 1}
+            for material_id in material_ids
+        ]},
+        headers=headers
+    )
+    response = client.get("/api/inventory/transactions", params={"limit": 3}, headers=headers)
+    first_page = [t["material_id"] for t in response.json()]
+    response = client.get(
+        "/api/inventory/transactions",
+        params={"limit": 3, "cursor": response.headers["X-Next-Cursor"]},
+        headers=headers
+    )
+    assert first_page + [t["material_id"] for t in response.json()] == material_ids[::-1]
+
+
+def test_bulk_material_import():
+    """材料の一括インポートのテスト (CSV / JSON、同名の材料は更新)"""
+    headers = register_and_login()
+
+    flour = client.post(
+        "/api/materials/",
+        json={"name": "強力粉", "purchase_price": 500, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={"name": "食パン", "materials": [{"material_id": flour["id"], "quantity": 250}]},
+        headers=headers
+    ).json()
+    assert recipe["material_cost"] == pytest.approx(125)
+
+    csv_body = (
+        "name,purchase_price,purchase_quantity,unit,density\n"
+        "強力粉,800,1000,g,\n"
+        "バター,1000,500,g,0.91\n"
+        "砂糖,-100,1000,g,\n"
+        "牛乳,200,1000,ml,1.03\n"
+    )
+    response = client.post(
+        "/api/materials/import",
+        files={"file": ("materials.csv", csv_body.encode("utf-8"), "text/csv")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["updated"], data["unchanged"]) == (2, 1, 0)
+    assert [(e["row"], e["name"]) for e in data["errors"]] == [(3, "砂糖")]
+
+    materials = {m["name"]: m for m in client.get("/api/materials/", headers=headers).json()}
+    assert materials["バター"]["unit_price"] == pytest.approx(2)
+    assert materials["牛乳"]["density"] == pytest.approx(1.03)
+    assert materials["強力粉"]["id"] == flour["id"]
+    assert materials["強力粉"]["unit_price"] == pytest.approx(0.8)
+
+    # 更新した材料の価格履歴と、それを使うレシピの原価が更新されること
+    history = client.get(f"/api/materials/{flour['id']}/price-history", headers=headers).json()
+    assert [h["unit_price"] for h in history][-1] == pytest.approx(0.8)
+    recipe = client.get(f"/api/recipes/{recipe['id']}", headers=headers).json()
+    assert recipe["material_cost"] == pytest.approx(200)
+
+    # JSON 配列 (同じ内容は変更なし、単位の変更はレシピの使用量を換算)
+    response = client.post(
+        "/api/materials/import",
+        files={"file": ("materials.json", json.dumps([
+            {"name": "バター", "purchase_price": 1000, "purchase_quantity": 500, "unit": "g", "density": 0.91},
+            {"name": "強力粉", "purchase_price": 800, "purchase_quantity": 1, "unit": "kg"},
+            {"name": "塩"}
+        ]).encode("utf-8"), "application/json")},
+        headers=headers
+    )
+    data = response.json()
+    assert (data["created"], data["updated"], data["unchanged"]) == (0, 1, 1)
+    assert data["errors"][0]["row"] == 3
+    recipe = client.get(f"/api/recipes/{recipe['id']}", headers=headers).json()
+    assert recipe["materials"][0]["quantity"] == pytest.approx(0.25)
+    assert recipe["material_cost"] == pytest.approx(200)
+
+    response = client.post(
+        "/api/materials/import",
+        files={"file": ("materials.json", b"{\"name\": \"x\"}", "application/json")},
+        headers=headers
+    )
+    assert response.status_code == 400
+
+
+def test_bulk_material_import_reports_partial_failures(monkeypatch):
+    """同じ名前の行と、コミット後の読み込みエラーは行のエラーとして登録件数と一緒に返すこと"""
+    from app.utils import material_import
+    # 2行ごとにコミットする
+    monkeypatch.setattr(material_import.import_materials, "__defaults__", (2,))
+    headers = register_and_login()
+
+    # 途中から文字コードが違う (Shift_JIS) ファイル
+    csv_body = (
+        "name,purchase_price,purchase_quantity,unit\n"
+        "強力粉,500,1000,g\n"
+        "バター,1000,500,g\n"
+        "砂糖,200,1000,g\n"
+        "砂糖,300,1000,g\n"
+        + "".join(f"材料{i},100,1000,g\n" for i in range(20))
+    ).encode("utf-8") + "塩,100,1000,g\n".encode("cp932")
+    response = client.post(
+        "/api/materials/import",
+        files={"file": ("materials.csv", csv_body, "text/csv")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] >= 3
+    assert data["errors"][0] == {
+        "row": 3, "name": "砂糖", "message": "同じ名前の材料が 4 行目にもあるため、この行は使われません"
+    }
+    # 読み込めなかった行は、登録した件数と一緒にエラーとして返す
+    assert data["errors"][-1]["name"] is None
+    assert data["errors"][-1]["row"] == data["created"] + 2
+
+    materials = {m["name"]: m for m in client.get("/api/materials/", headers=headers).json()}
+    assert len(materials) == data["created"]
+    assert "塩" not in materials
+    assert materials["砂糖"]["purchase_price"] == 300
+
+
+def test_bulk_material_import_streams_json(monkeypatch):
+    """JSON 配列は要素ごとに読み込み、途中で形式が崩れていてもそれまでの行を登録すること"""
+    from app.utils import material_import
+    monkeypatch.setattr(material_import.import_materials, "__defaults__", (2,))
+    # 要素が読み込みの区切りをまたぐように、16文字ずつ読み込む
+    monkeypatch.setattr(material_import.iter_json_rows, "__defaults__", (16,))
+    headers = register_and_login()
+
+    rows = [
+        {"name": f"材料{i}", "purchase_price": 100 + i, "purchase_quantity": 1000, "unit": "g"}
+        for i in range(5)
+    ]
+    body = json.dumps(rows, ensure_ascii=False)[:-1] + ', {"name": "塩", ]'
+    response = client.post(
+        "/api/materials/import",
+        files={"file": ("materials.json", body.encode("utf-8"), "application/json")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 5
+    assert [(e["row"], e["name"]) for e in data["errors"]] == [(6, None)]
+    materials = {m["name"]: m for m in client.get("/api/materials/", headers=headers).json()}
+    assert materials["材料4"]["purchase_price"] == 104
+
+
+def test_streaming_export(monkeypatch):
+    """CSV / NDJSON の書き出しのテスト"""
+    from app.utils import export
+
+    # 少ない件数でもカーソルを複数回に分けて読み込むようにする
+    monkeypatch.setattr(export, "EXPORT_YIELD_PER", 2)
+    headers = register_and_login()
+
+    material_ids = [
+        client.post(
+            "/api/materials/",
+            json={"name": f"材料{i}", "purchase_price": 100, "purchase_quantity": 1000, "unit": "g"},
+            headers=headers
+        ).json()["id"]
+        for i in range(3)
+    ]
+    dough = client.post(
+        "/api/recipes/",
+        json={"name": "生地", "materials": [{"material_id": m, "quantity": 10} for m in material_ids]},
+        headers=headers
+    ).json()
+    client.post("/api/recipes/", json={"name": "空のレシピ"}, headers=headers)
+    bread = client.post(
+        "/api/recipes/",
+        json={
+            "name": "パン",
+            "materials": [{"material_id": material_ids[0], "quantity": 5, "unit": "kg"}],
+            "sub_recipes": [{"sub_recipe_id": dough["id"], "quantity": 2}]
+        },
+        headers=headers
+    ).json()
+    client.post("/api/products/", json={"name": "パン", "recipe_id": bread["id"]}, headers=headers)
+    client.post("/api/fixed-costs/", json={"name": "家賃", "monthly_amount": 100000}, headers=headers)
+
+    response = client.get("/api/export/materials", params={"format": "csv"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert [row["name"] for row in rows] == ["材料0", "材料1", "材料2"]
+
+    # CSV のレシピは明細1行ずつ (明細のないレシピも1行)
+    response = client.get("/api/export/recipes", headers=headers)
+    rows = list(csv.DictReader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert [(row["recipe_name"], row["line_type"]) for row in rows] == [
+        ("生地", "material"), ("生地", "material"), ("生地", "material"),
+        ("空のレシピ", ""), ("パン", "material"), ("パン", "sub_recipe")
+    ]
+
+    response = client.get("/api/export/recipes", params={"format": "ndjson"}, headers=headers)
+    recipes = [json.loads(line) for line in response.text.splitlines()]
+    assert [len(r["materials"]) for r in recipes] == [3, 0, 1]
+    assert recipes[2]["materials"][0]["input_unit"] == "kg"
+    assert recipes[2]["sub_recipes"] == [
+        {"sub_recipe_id": dough["id"], "sub_recipe_name": "生地", "quantity": 2}
+    ]
+
+    response = client.get("/api/export/all", params={"format": "ndjson"}, headers=headers)
+    types = [json.loads(line)["type"] for line in response.text.splitlines()]
+    assert types == ["materials"] * 3 + ["recipes"] * 3 + ["products", "fixed-costs"]
+
+    assert client.get("/api/export/all", params={"format": "csv"}, headers=headers).status_code == 400
+    assert client.get("/api/export/users", headers=headers).status_code == 422
+    assert client.get("/api/export/materials").status_code == 401
+
+
+# 比較用の明細をセッションに追加してしまう (フラッシュ時の SAWarning) 不具合を検出する
+@pytest.mark.filterwarnings("error::sqlalchemy.exc.SAWarning")
+def test_recipe_update_applies_line_diff():
+    """レシピの更新で、変更のない明細はそのまま残り、変更分だけが反映されること"""
+    headers = register_and_login()
+
+    material_ids = [
+        client.post(
+            "/api/materials/",
+            json={"name": f"材料{i}", "purchase_price": 100 * (i + 1), "purchase_quantity": 100, "unit": "g"},
+            headers=headers
+        ).json()["id"]
+        for i in range(3)
+    ]
+    recipe = client.post(
+        "/api/recipes/",
+        json={"name": "レシピ", "materials": [
+            {"material_id": material_ids[0], "quantity": 10},
+            {"material_id": material_ids[1], "quantity": 10}
+        ]},
+        headers=headers
+    ).json()
+    line_ids = {line["material_id"]: line["id"] for line in recipe["materials"]}
+    assert recipe["material_cost"] == pytest.approx(30)
+
+    response = client.put(
+        f"/api/recipes/{recipe['id']}",
+        json={"materials": [
+            {"material_id": material_ids[0], "quantity": 10},
+            {"material_id": material_ids[2], "quantity": 5}
+        ]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    updated = response.json()
+    lines = {line["material_id"]: line for line in updated["materials"]}
+    assert set(lines) == {material_ids[0], material_ids[2]}
+    assert lines[material_ids[0]]["id"] == line_ids[material_ids[0]]
+    assert updated["material_cost"] == pytest.approx(10 + 15)
+    assert updated["updated_at"] > recipe["updated_at"]
+
+    # 存在しない材料を含む場合は何も変更しない
+    response = client.put(
+        f"/api/recipes/{recipe['id']}",
+        json={"materials": [{"material_id": material_ids[0], "quantity": 1}, {"material_id": 999999, "quantity": 1}]},
+        headers=headers
+    )
+    assert response.status_code == 404
+    assert "999999" in response.json()["detail"]
+    recipe = client.get(f"/api/recipes/{recipe['id']}", headers=headers).json()
+    assert recipe["material_cost"] == pytest.approx(25)
+
+
+def test_conditional_get_with_etag():
+    """一覧・詳細は ETag を返し、変更がなければ If-None-Match に 304 で応答すること"""
+    headers = register_and_login()
+    material = client.post(
+        "/api/materials/",
+        json={"name": "小麦粉", "purchase_price": 300, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    recipe = client.post(
+        "/api/recipes/",
+        json={"name": "食パン", "materials": [{"material_id": material["id"], "quantity": 200}]},
+        headers=headers
+    ).json()
+
+    response = client.get("/api/materials/", headers=headers)
+    etag = response.headers["ETag"]
+    assert etag.startswith('"')
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    response = client.get("/api/materials/", headers={**headers, "If-None-Match": f'W/{etag}, "other"'})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    # クエリが違えば別の ETag
+    assert client.get("/api/materials/?limit=1", headers=headers).headers["ETag"] != etag
+
+    recipes_etag = client.get("/api/recipes/", headers=headers).headers["ETag"]
+    detail_etag = client.get(f"/api/recipes/{recipe['id']}", headers=headers).headers["ETag"]
+
+    # 材料を変更すると材料とレシピ (材料名・単価を含む) の ETag が変わる
+    client.put(f"/api/materials/{material['id']}", json={"name": "強力粉"}, headers=headers)
+    response = client.get("/api/materials/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    response = client.get("/api/recipes/", headers={**headers, "If-None-Match": recipes_etag})
+    assert response.status_code == 200
+    assert response.json()[0]["materials"][0]["material_name"] == "強力粉"
+    response = client.get(f"/api/recipes/{recipe['id']}", headers={**headers, "If-None-Match": detail_etag})
+    assert response.status_code == 200
+
+    # 固定費・商品も同様
+    fixed_etag = client.get("/api/fixed-costs/", headers=headers).headers["ETag"]
+    assert client.get("/api/fixed-costs/", headers={**headers, "If-None-Match": fixed_etag}).status_code == 304
+    client.post("/api/fixed-costs/", json={"name": "家賃", "monthly_amount": 100000}, headers=headers)
+    assert client.get("/api/fixed-costs/", headers={**headers, "If-None-Match": fixed_etag}).status_code == 200
+    products_etag = client.get("/api/products/", headers=headers).headers["ETag"]
+    assert client.get("/api/products/", headers={**headers, "If-None-Match": products_etag}).status_code == 304
+
+    # 別の店舗には同じ ETag でも 304 を返さない
+    other = register_and_login()
+    assert client.get("/api/materials/", headers={**other, "If-None-Match": etag}).status_code == 200
+
+    # 存在しない (他の店舗の) ID には If-None-Match に関係なく 404 を返す
+    for path in (f"/api/materials/{material['id']}", f"/api/recipes/{recipe['id']}",
+                 "/api/products/999999", "/api/fixed-costs/999999"):
+        assert client.get(path, headers={**other, "If-None-Match": "*"}).status_code == 404
+    assert client.get(f"/api/recipes/{recipe['id']}", headers={**headers, "If-None-Match": "*"}).status_code == 304
+
+
+def test_response_cache_is_invalidated_on_write(monkeypatch):
+    """繰り返しの読み込みはキャッシュから返し、書き込みのコミットで関係するリソースを無効化すること"""
+    # 既定では共有キャッシュがないため無効 (プロセス内のキャッシュを有効にして確認する)
+    monkeypatch.setattr(response_cache, "backend", LocalLRUCache(settings.response_cache_max_bytes))
+    admin_store_id = f"admin_{uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(settings, "admin_store_ids", [admin_store_id])
+    headers = register_and_login(admin_store_id)
+    # サーバー全体の統計なので、他の店舗には見せない
+    assert client.get("/api/diagnostics/cache", headers=register_and_login()).status_code == 403
+    material = client.post(
+        "/api/materials/",
+        json={"name": "バター", "purchase_price": 500, "purchase_quantity": 500, "unit": "g"},
+        headers=headers
+    ).json()
+    client.post(
+        "/api/recipes/",
+        json={"name": "クロワッサン", "materials": [{"material_id": material["id"], "quantity": 50}]},
+        headers=headers
+    )
+
+    before = client.get("/api/diagnostics/cache", headers=headers).json()
+    first = client.get("/api/recipes/", headers=headers)
+    second = client.get("/api/recipes/", headers=headers)
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    after = client.get("/api/diagnostics/cache", headers=headers).json()
+    assert after["backend"] == "LocalLRUCache"
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"] + 1
+
+    # キャッシュからも If-None-Match に 304 で応答する
+    response = client.get("/api/recipes/", headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+
+    # 材料を変更するとレシピのキャッシュも破棄される
+    client.put(f"/api/materials/{material['id']}", json={"purchase_price": 600}, headers=headers)
+    recipes = client.get("/api/recipes/", headers=headers).json()
+    assert recipes[0]["materials"][0]["cost"] == pytest.approx(60)
+    assert client.get("/api/diagnostics/cache", headers=headers).json()["invalidations"] > after["invalidations"]
+
+    # 別の店舗には同じ URL でもキャッシュを返さない
+    other = register_and_login()
+    assert client.get("/api/recipes/", headers=other).json() == []
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,92 @@
+"""
+応答キャッシュ (LocalLRUCache) のテスト
+
+使用方法:
+pytest tests/test_cache.py
+"""
+from app.config import settings
+from app.utils import cache as cache_module
+from app.utils.cache import CachedResponse, CacheKey, LocalLRUCache, NullCache, ResponseCache, create_backend
+
+
+def key(cache, user_id, resource, path="/api/materials/"):
+    return CacheKey(user_id, resource, cache.generation(user_id, resource), path, "")
+
+
+def entry(size):
+    # ヘッダーなしの応答の size は本文 + ENTRY_OVERHEAD_BYTES
+    return CachedResponse(b"x" * size)
+
+
+def test_lru_evicts_least_recently_used_over_max_bytes():
+    cache = LocalLRUCache(max_bytes=entry(100).size * 2)
+    first, second, third = (key(cache, 1, "materials", f"/{n}") for n in range(3))
+    cache.set(first, entry(100))
+    cache.set(second, entry(100))
+    assert cache.get(first) is not None  # first を最近使ったものにする
+    cache.set(third, entry(100))
+
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 2
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+    # 上限より大きい応答は保存しない
+    cache.set(key(cache, 1, "materials", "/large"), entry(cache.max_bytes))
+    assert cache.stats()["entries"] == 2
+
+
+def test_invalidate_only_affects_the_store_and_resource():
+    cache = LocalLRUCache(max_bytes=1024 * 1024)
+    materials = key(cache, 1, "materials")
+    recipes = key(cache, 1, "recipes")
+    other_store = key(cache, 2, "materials")
+    for cache_key in (materials, recipes, other_store):
+        cache.set(cache_key, entry(10))
+
+    ResponseCache(cache).invalidate_tables(1, ["recipe_materials"])
+    assert cache.get(recipes) is None
+    assert cache.get(materials) is not None
+    assert cache.get(other_store) is not None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_set_after_invalidation_is_ignored():
+    """読み込み中に書き込みがコミットされた場合、古い世代の応答は保存しない"""
+    cache = LocalLRUCache(max_bytes=1024 * 1024)
+    stale = key(cache, 1, "materials")
+    cache.invalidate(1, ["materials"])
+    cache.set(stale, entry(10))
+    assert cache.get(stale) is None
+    assert cache.get(key(cache, 1, "materials")) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_not_used(monkeypatch):
+    """有効期間が過ぎた応答は使わない (他のワーカーの書き込みを反映するまでの上限)"""
+    now = [100.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now[0])
+    cache = LocalLRUCache(max_bytes=1024 * 1024, ttl_seconds=5)
+    cache_key = key(cache, 1, "materials")
+    cache.set(cache_key, entry(10))
+    now[0] += 4
+    assert cache.get(cache_key) is not None
+    now[0] += 1
+    assert cache.get(cache_key) is None
+    stats = cache.stats()
+    assert (stats["expirations"], stats["entries"], stats["bytes"]) == (1, 0, 0)
+
+
+def test_local_cache_is_off_by_default(monkeypatch):
+    """共有キャッシュを設定しなければ、明示的に有効にした場合だけプロセス内のキャッシュを使う"""
+    monkeypatch.setattr(settings, "response_cache_backend", None)
+    monkeypatch.setattr(settings, "response_cache_enabled", None)
+    assert isinstance(create_backend(), NullCache)
+    monkeypatch.setattr(settings, "response_cache_enabled", True)
+    backend = create_backend()
+    assert isinstance(backend, LocalLRUCache)
+    assert backend.ttl_seconds == settings.response_cache_ttl_seconds
@@ -0,0 +1,133 @@
+"""
+原価計算エンジンのテスト
+
+使用方法:
+pytest tests/test_cost_engine.py
+"""
+import pytest
+from app.models.material import Material
+from app.models.recipe import Recipe, RecipeMaterial
+from app.models.product import Product
+from app.utils.cost_engine import CostCatalog
+
+
+def build_catalog():
+    """ORMオブジェクトと同じ内容のCostCatalogを作成"""
+    materials = [
+        Material(id=1, purchase_price=500, purchase_quantity=1000, unit_price=0.5),
+        Material(id=2, purchase_price=1000, purchase_quantity=500, unit_price=2.0),
+        Material(id=3, purchase_price=300, purchase_quantity=10, unit_price=30.0),
+    ]
+    recipes = [
+        Recipe(id=10, recipe_materials=[
+            RecipeMaterial(material_id=1, material=materials[0], quantity=100),
+            RecipeMaterial(material_id=2, material=materials[1], quantity=50),
+        ]),
+        Recipe(id=11, yield_quantity=10, loss_rate=20, recipe_materials=[
+            RecipeMaterial(material_id=1, material=materials[0], quantity=250),
+            RecipeMaterial(material_id=3, material=materials[2], quantity=2),
+        ]),
+        Recipe(id=12, recipe_materials=[]),
+    ]
+    products = [
+        Product(id=100, recipe=recipes[0], recipe_id=10, include_fixed_cost=False,
+                fixed_cost_per_unit=0, material_cost=0, profit_margin=30, selling_price=300),
+        Product(id=101, recipe=recipes[1], recipe_id=11, include_fixed_cost=True,
+                fixed_cost_per_unit=0, material_cost=0, profit_margin=0, selling_price=None),
+        Product(id=102, recipe=None, recipe_id=None, include_fixed_cost=True,
+                fixed_cost_per_unit=0, material_cost=80, profit_margin=45, selling_price=120),
+        Product(id=103, recipe=recipes[2], recipe_id=12, include_fixed_cost=False,
+                fixed_cost_per_unit=0, material_cost=10, profit_margin=20, selling_price=0),
+    ]
+
+    catalog = CostCatalog(
+        [(m.id, m.purchase_price, m.purchase_quantity, m.unit_price, m.name, m.unit) for m in materials],
+        [(r.id, r.yield_quantity, r.loss_rate) for r in recipes],
+        [(r.id, rm.material_id, rm.quantity) for r in recipes for rm in r.recipe_materials],
+        [(p.id, p.recipe_id, p.include_fixed_cost, p.fixed_cost_per_unit, p.material_cost,
+          p.profit_margin, p.selling_price, p.name) for p in products],
+    )
+    return catalog, materials, recipes, products
+
+
+def test_catalog_matches_model_calculations():
+    """ベクトル化した計算がモデルの計算と一致するテスト"""
+    catalog, _, recipes, products = build_catalog()
+
+    result = catalog.calculate(total_monthly_fixed_cost=30000, total_monthly_production=600)
+
+    for i, recipe in enumerate(recipes):
+        assert result["recipe_material_cost"][i] == pytest.approx(recipe.calculate_material_cost())
+
+    for i, product in enumerate(products):
+        product.calculate_costs(30000, 600)
+        for field in ("material_cost", "fixed_cost_per_unit", "total_cost", "suggested_price",
+                      "actual_profit_amount", "actual_profit_margin"):
+            assert result[field][i] == pytest.approx(getattr(product, field)), field
+
+
+def test_catalog_scenario_prices():
+    """単価をシナリオ×材料の2次元配列で与えた場合のテスト"""
+    catalog, _, _, _ = build_catalog()
+
+    scenarios = [catalog.unit_prices, catalog.unit_prices * 2]
+    recipe_costs = catalog.recipe_material_costs(scenarios)
+
+    assert recipe_costs.shape == (2, 3)
+    assert recipe_costs[0] == pytest.approx([150, 185, 0])
+    assert recipe_costs[1] == pytest.approx([300, 370, 0])
+
+
+def test_catalog_sub_recipes_are_costed_in_topological_order():
+    """サブレシピを段数順に計算するテスト"""
+    catalog = CostCatalog(
+        [(1, 100, 100, 1.0, "粉", "g"), (2, 100, 50, 2.0, "バター", "g")],
+        [(10, 1, 0), (11, 1, 0), (12, 1, 0)],
+        [(10, 1, 100), (11, 2, 10), (12, 2, 5)],
+        [(100, 12, False, 0, 0, 0, None, "デニッシュ")],
+        # 12 は 11 を2回分、11 は 10 を0.5回分使う
+        [(12, 11, 2), (11, 10, 0.5)],
+    )
+
+    recipe_costs = catalog.recipe_material_costs()
+    assert recipe_costs == pytest.approx([100, 70, 150])
+    assert catalog.calculate()["total_cost"][0] == pytest.approx(150)
+
+    recipe_idx, material_idx, quantities = catalog.recipe_material_quantities()
+    exploded = {(int(r), int(m)): q for r, m, q in zip(recipe_idx, material_idx, quantities)}
+    assert exploded[(2, 0)] == pytest.approx(100)
+    assert exploded[(2, 1)] == pytest.approx(25)
+
+
+def test_catalog_yield_per_unit_costs():
+    """出来上がり数とロス率から1個あたりの原価を計算するテスト"""
+    catalog = CostCatalog(
+        [(1, 100, 100, 1.0, "粉", "g")],
+        # 生地は8個分 (ロス0%)、パンは1バッチ10個でロス20%
+        [(10, 8, 0), (11, 10, 20)],
+        [(10, 1, 400), (11, 1, 40)],
+        [(100, 11, False, 0, 0, 0, None, "ロールパン")],
+        # パン1バッチで生地を4個分使う
+        [(11, 10, 4)],
+    )
+
+    recipe_costs = catalog.recipe_material_costs()
+    assert recipe_costs == pytest.approx([400, 240])
+    assert catalog.calculate()["material_cost"][0] == pytest.approx(30)
+
+
+def test_catalog_material_requirements_explodes_sub_recipes():
+    """生産計画から材料の必要量を計算するテスト"""
+    catalog = CostCatalog(
+        [(1, 100, 100, 1.0, "粉", "g"), (2, 100, 50, 2.0, "バター", "g")],
+        # 生地は1バッチ8個分、パンは1バッチ10個
+        [(10, 8, 0), (11, 10, 0)],
+        [(10, 1, 400), (11, 2, 20)],
+        [(100, 11, False, 0, 0, 0, None, "ロールパン"), (101, None, False, 0, 0, 0, None, "仕入品")],
+        # パン1バッチで生地を4個分使う
+        [(11, 10, 4)],
+    )
+
+    requirements = catalog.material_requirements([30, 5])
+    # パン30個 = 3バッチ → 生地12個 = 1.5バッチ → 粉600g、バター60g
+    assert requirements == pytest.approx([600, 60])
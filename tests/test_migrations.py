@@ -0,0 +1,93 @@
+"""
+マイグレーションのテスト
+
+使用方法:
+pytest tests/test_migrations.py
+"""
+from sqlalchemy import create_engine, inspect, text
+from app.database import Base
+from app.migrations import check_query_plans, discover_migrations, run_migrations
+from app.migrations.versions import v0001_baseline, v0002_add_missing_columns
+import app.models  # noqa: F401
+
+
+def index_names(engine):
+    inspector = inspect(engine)
+    return {
+        index["name"]
+        for table in inspector.get_table_names()
+        for index in inspector.get_indexes(table)
+    }
+
+
+def column_names(engine):
+    inspector = inspect(engine)
+    return {
+        table: {column["name"] for column in inspector.get_columns(table)}
+        for table in inspector.get_table_names() if table != "schema_migrations"
+    }
+
+
+def test_migrations_apply_once(tmp_path):
+    """新規のデータベースにすべて適用され、再実行では何も適用されないこと"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+
+    applied = run_migrations(engine)
+    assert applied == [version for version, _, _ in discover_migrations()]
+    assert run_migrations(engine) == []
+
+    # マイグレーションで作成したテーブル・列・インデックスがモデルと一致すること
+    model_engine = create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    Base.metadata.create_all(model_engine)
+    assert column_names(engine) == column_names(model_engine)
+    assert index_names(engine) == index_names(model_engine)
+
+
+def test_tenant_indexes_used_by_query_plans(tmp_path):
+    """代表的なクエリが店舗用のインデックスを使うこと (EXPLAIN QUERY PLAN)"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    run_migrations(engine)
+
+    with engine.connect() as connection:
+        results = check_query_plans(connection)
+
+    assert results
+    failed = [(r["index"], r["plan"]) for r in results if not r["ok"]]
+    assert failed == []
+
+
+def test_migrations_upgrade_legacy_database(tmp_path):
+    """マイグレーション導入前のデータベースに、不足している列・テーブル・インデックスが追加されること"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    # 最初のバージョンで作成したデータベース
+    v0001_baseline.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO recipes (user_id, name, material_cost) VALUES (1, '食パン', 100)"
+        ))
+
+    run_migrations(engine)
+
+    model_engine = create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    Base.metadata.create_all(model_engine)
+    assert column_names(engine) == column_names(model_engine)
+    assert "ix_materials_user_id_id" in index_names(engine)
+
+    with engine.connect() as connection:
+        yield_quantity, loss_rate = connection.execute(
+            text("SELECT yield_quantity, loss_rate FROM recipes")
+        ).one()
+    assert (yield_quantity, loss_rate) == (1, 0)
+
+
+def test_migrations_upgrade_database_created_just_before_migrations(tmp_path):
+    """導入直前のバージョンで作成した (v0002 の列・テーブルがすでにある) データベースにも適用できること"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        v0001_baseline.upgrade(connection)
+        v0002_add_missing_columns.upgrade(connection)
+
+    assert run_migrations(engine) == [version for version, _, _ in discover_migrations()]
+    model_engine = create_engine(f"sqlite:///{tmp_path / 'models.db'}")
+    Base.metadata.create_all(model_engine)
+    assert index_names(engine) == index_names(model_engine)
@@ -0,0 +1,240 @@
+"""
+SQLクエリ数の上限テスト (N+1 の再発防止)
+
+使用方法:
+pytest tests/test_query_counts.py
+"""
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from app.database import engine, async_engine
+from tests.test_api import client, register_and_login
+
+
+class QueryCounter:
+    """エンジンで実行されたSQL文を記録する"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries():
+    """ブロック内で実行されたSQL文を数える (同期・非同期の両方のエンジン)"""
+    counter = QueryCounter()
+    engines = (engine, async_engine.sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", counter)
+
+
+def assert_query_budget(counter, budget):
+    """クエリ数が上限以内であることを確認 (超えた場合は実行されたSQLを表示)"""
+    assert counter.count <= budget, (
+        f"{counter.count} queries (budget {budget}):\n" + "\n".join(counter.statements)
+    )
+
+
+def create_recipe_tree(headers, recipe_count):
+    """材料3つとサブレシピ (さらにその下にサブレシピ) を持つレシピを作成"""
+    material_ids = [
+        client.post(
+            "/api/materials/",
+            json={"name": f"材料{i}", "purchase_price": 100 * (i + 1), "purchase_quantity": 1000, "unit": "g"},
+            headers=headers
+        ).json()["id"]
+        for i in range(3)
+    ]
+    base = client.post(
+        "/api/recipes/",
+        json={"name": "ベース生地", "materials": [{"material_id": material_ids[0], "quantity": 100}]},
+        headers=headers
+    ).json()
+    dough = client.post(
+        "/api/recipes/",
+        json={
+            "name": "生地",
+            "materials": [{"material_id": material_ids[1], "quantity": 50}],
+            "sub_recipes": [{"sub_recipe_id": base["id"], "quantity": 1}]
+        },
+        headers=headers
+    ).json()
+
+    recipe_ids = []
+    for i in range(recipe_count):
+        recipe = client.post(
+            "/api/recipes/",
+            json={
+                "name": f"レシピ{i}",
+                "materials": [{"material_id": m, "quantity": 10 + i} for m in material_ids],
+                "sub_recipes": [{"sub_recipe_id": dough["id"], "quantity": 1}]
+            },
+            headers=headers
+        ).json()
+        recipe_ids.append(recipe["id"])
+    return recipe_ids
+
+
+def test_recipe_list_query_budget():
+    """レシピ一覧のクエリ数がレシピ件数に依存しないこと"""
+    headers = register_and_login()
+    create_recipe_tree(headers, 30)
+
+    with count_queries() as counter:
+        response = client.get("/api/recipes/", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 32
+    # ユーザー + ETag の集計 + レシピ + 材料 (材料マスタをJOIN) + サブレシピ (サブレシピをJOIN)
+    assert_query_budget(counter, 5)
+
+    # 変更がなければ、ユーザーと ETag の集計だけで 304 を返す
+    with count_queries() as counter:
+        response = client.get(
+            "/api/recipes/", headers={**headers, "If-None-Match": response.headers["ETag"]}
+        )
+    assert response.status_code == 304
+    assert_query_budget(counter, 2)
+
+
+def test_recipe_detail_query_budget():
+    """レシピ詳細のクエリ数"""
+    headers = register_and_login()
+    recipe_ids = create_recipe_tree(headers, 1)
+
+    with count_queries() as counter:
+        response = client.get(f"/api/recipes/{recipe_ids[0]}", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()["materials"]) == 3
+    # ユーザー + レシピの存在確認 + ETag の集計 + レシピ + 材料 + サブレシピ
+    assert_query_budget(counter, 6)
+
+    # 変更がなければ、明細を読み込まずに 304 を返す
+    with count_queries() as counter:
+        response = client.get(
+            f"/api/recipes/{recipe_ids[0]}", headers={**headers, "If-None-Match": response.headers["ETag"]}
+        )
+    assert response.status_code == 304
+    assert_query_budget(counter, 3)
+
+
+def test_label_print_query_budget():
+    """ラベル印刷のクエリ数が商品件数に依存しないこと"""
+    headers = register_and_login()
+    recipe_ids = create_recipe_tree(headers, 20)
+    product_ids = [
+        client.post(
+            "/api/products/",
+            json={"name": f"商品{i}", "recipe_id": recipe_id, "selling_price": 300},
+            headers=headers
+        ).json()["id"]
+        for i, recipe_id in enumerate(recipe_ids)
+    ]
+    client.post(
+        "/api/labels/settings",
+        json={
+            "preset_name": "標準", "label_width": 60, "label_height": 40,
+            "show_ingredients": True, "is_default": True
+        },
+        headers=headers
+    )
+
+    with count_queries() as counter:
+        response = client.post(
+            "/api/labels/print",
+            json={"product_ids": product_ids},
+            headers=headers
+        )
+    assert response.status_code == 200
+    # ユーザー + ラベル設定 + 商品 (レシピをJOIN) + 材料 + サブレシピ + サブレシピの段ごとに3
+    assert_query_budget(counter, 11)
+
+
+def test_recipe_create_and_update_query_budget():
+    """レシピの登録・更新のクエリ数が明細の行数に依存せず、更新は変更した行だけに書き込むこと"""
+    headers = register_and_login()
+    material_ids = [
+        client.post(
+            "/api/materials/",
+            json={"name": f"材料{i}", "purchase_price": 100, "purchase_quantity": 1000, "unit": "g"},
+            headers=headers
+        ).json()["id"]
+        for i in range(20)
+    ]
+    lines = [{"material_id": material_id, "quantity": 10} for material_id in material_ids]
+
+    with count_queries() as counter:
+        response = client.post("/api/recipes/", json={"name": "レシピ", "materials": lines}, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["material_cost"] == pytest.approx(20)
+    # 読み込みはユーザーと材料 (IN) の2回だけ (明細ごとの材料の確認や再読み込みをしない)
+    selects = [sql for sql in counter.statements if sql.startswith("SELECT")]
+    assert len(selects) == 2
+
+    recipe_id = response.json()["id"]
+    lines[3]["quantity"] = 20
+    with count_queries() as counter:
+        response = client.put(f"/api/recipes/{recipe_id}", json={"materials": lines}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["material_cost"] == pytest.approx(21)
+    # ユーザー + レシピ・明細 (3) + 材料 (IN) + 変更のUPDATE (2) + 親レシピ + 商品
+    assert_query_budget(counter, 9)
+
+    writes = [sql for sql in counter.statements if sql.startswith(("INSERT", "UPDATE", "DELETE"))]
+    line_writes = [sql for sql in writes if "recipe_materials" in sql]
+    assert len(line_writes) == 1 and line_writes[0].startswith("UPDATE recipe_materials")
+
+
+def test_material_price_change_query_budget():
+    """材料の価格変更の反映で、変更のないサブレシピを1件ずつ読み込まないこと"""
+    headers = register_and_login()
+    material = client.post(
+        "/api/materials/",
+        json={"name": "砂糖", "purchase_price": 100, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    bases = [
+        client.post(
+            "/api/recipes/",
+            json={"name": f"ベース{i}", "materials": [{"material_id": material["id"], "quantity": 10}]},
+            headers=headers
+        ).json()
+        for i in range(10)
+    ]
+    other = client.post(
+        "/api/materials/",
+        json={"name": "塩", "purchase_price": 100, "purchase_quantity": 1000, "unit": "g"},
+        headers=headers
+    ).json()
+    for i, base in enumerate(bases):
+        client.post(
+            "/api/recipes/",
+            json={
+                "name": f"レシピ{i}",
+                "materials": [{"material_id": other["id"], "quantity": 10}],
+                "sub_recipes": [{"sub_recipe_id": base["id"], "quantity": 1}]
+            },
+            headers=headers
+        )
+
+    # 塩だけが変わるため、ベース (サブレシピ) は変更のないまま計算に使われる
+    with count_queries() as counter:
+        response = client.put(f"/api/materials/{other['id']}", json={"purchase_price": 200}, headers=headers)
+    assert response.status_code == 200
+    recipes = client.get("/api/recipes/", headers=headers).json()
+    costs = {recipe["name"]: recipe["material_cost"] for recipe in recipes}
+    assert costs["レシピ0"] == pytest.approx(2 + 1)
+    # ユーザー + 材料 + 親レシピを辿る (2) + レシピ (3) + 親子関係 + サブレシピ (3) + 商品 + 応答の材料
+    # (サブレシピの件数に依存しない。UPDATE は別に数える)
+    selects = [sql for sql in counter.statements if sql.startswith("SELECT")]
+    assert len(selects) <= 13, "\n".join(selects)
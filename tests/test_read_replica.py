@@ -0,0 +1,88 @@
+"""
+読み込みレプリカへの振り分けのテスト
+
+プライマリとレプリカに別々の SQLite ファイルを使い、
+どちらのデータベースから読んだかを行の有無で確認する。
+
+使用方法:
+pytest tests/test_read_replica.py
+"""
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from app.database import RoutingSession, create_configured_engine, recent_writes
+from app.migrations import run_migrations
+from app.models.user import User
+
+
+@pytest.fixture
+def routing_session(tmp_path):
+    primary = create_configured_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_configured_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    run_migrations(primary)
+    run_migrations(replica)
+    factory = sessionmaker(class_=RoutingSession, autoflush=False, primary=primary, replica=replica)
+    yield factory
+    primary.dispose()
+    replica.dispose()
+
+
+def add_user(db, store_id):
+    user = User(store_id=store_id, email=f"{store_id}@example.com",
+                hashed_password="x", store_name=store_id)
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def store_ids(db):
+    return db.scalars(select(User.store_id)).all()
+
+
+def test_reads_go_to_replica_only_for_read_requests(routing_session):
+    """use_replica のセッションだけが SELECT をレプリカに送り、書き込みは常にプライマリ"""
+    writer = routing_session()
+    add_user(writer, "primary-store")
+    writer.close()
+
+    reader = routing_session()
+    reader.info["use_replica"] = True
+    assert store_ids(reader) == []  # レプリカには未反映
+    # 明示したバインドが優先される
+    assert reader.scalars(select(User.store_id), bind_arguments={"bind": reader.primary}).all() == [
+        "primary-store"
+    ]
+    reader.close()
+
+    default = routing_session()
+    assert store_ids(default) == ["primary-store"]
+    default.close()
+
+
+def test_read_your_writes_window(routing_session, monkeypatch):
+    """書き込んだ店舗は一定時間プライマリから読み、期限が過ぎるとレプリカに戻る"""
+    monkeypatch.setattr(recent_writes, "window_seconds", 60)
+    writer = routing_session()
+    user_id = add_user(writer, "writer-store")
+    writer.info["user_id"] = user_id
+    writer.add(User(store_id="second-store", email="second@example.com",
+                    hashed_password="x", store_name="second"))
+    writer.commit()
+    writer.close()
+
+    reader = routing_session()
+    reader.info.update(use_replica=True, user_id=user_id)
+    assert set(store_ids(reader)) == {"writer-store", "second-store"}
+    reader.close()
+
+    # 別の店舗はレプリカから読む
+    other = routing_session()
+    other.info.update(use_replica=True, user_id=user_id + 100)
+    assert store_ids(other) == []
+    other.close()
+
+    monkeypatch.setattr(recent_writes, "window_seconds", 0)
+    expired = routing_session()
+    expired.info.update(use_replica=True, user_id=user_id)
+    assert store_ids(expired) == []
+    expired.close()
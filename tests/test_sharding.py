@@ -0,0 +1,195 @@
+"""
+店舗ごとのシャーディングのテスト
+
+ディレクトリと2つのシャードに別々の SQLite ファイルを使う。
+
+使用方法:
+pytest tests/test_sharding.py
+"""
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+from app.database import (
+    RoutingSession, create_configured_async_engine, create_configured_engine
+)
+from app.migrations import run_migrations
+from app.models.inventory import InventoryBalance
+from app.models.material import Material
+from app.models.product import Product
+from app.models.recipe import Recipe, RecipeMaterial, RecipeSubRecipe
+from app.models.user import User
+from app.sharding import ShardRegistry
+from app.sharding import stores
+from app.sharding.stores import assign_shard, move_store, plan_rebalance, rebalance_plan
+
+
+@pytest.fixture
+def sharded(tmp_path, monkeypatch):
+    directory = create_configured_engine(f"sqlite:///{tmp_path / 'directory.db'}")
+    run_migrations(directory)
+    registry = ShardRegistry(
+        {"a": f"sqlite:///{tmp_path / 'shard_a.db'}", "b": f"sqlite:///{tmp_path / 'shard_b.db'}"},
+        None, create_configured_engine, create_configured_async_engine
+    )
+    monkeypatch.setattr(stores, "shards", registry)
+    monkeypatch.setattr(stores, "directory_engine", directory)
+    monkeypatch.setattr(stores, "_migrated", set())
+    factory = sessionmaker(class_=RoutingSession, autoflush=False, primary=directory,
+                           shard_engine=registry.engine)
+    yield factory, directory, registry
+    registry.dispose()
+    directory.dispose()
+
+
+def register(db, store_id):
+    user = User(store_id=store_id, email=f"{store_id}@example.com",
+                hashed_password="x", store_name=store_id)
+    db.add(user)
+    db.commit()
+    assign_shard(db, user)
+    return user
+
+
+def add_store_data(factory, user, prefix):
+    """材料・サブレシピ付きのレシピ・商品・在庫を作成"""
+    db = factory()
+    db.info["shard"] = user.shard_key
+    flour = Material(user_id=user.id, name=f"{prefix}小麦粉", purchase_price=300,
+                     purchase_quantity=1000, unit="g", unit_price=0.3)
+    dough = Recipe(user_id=user.id, name=f"{prefix}生地")
+    dough.recipe_materials.append(RecipeMaterial(material=flour, quantity=200))
+    bread = Recipe(user_id=user.id, name=f"{prefix}食パン")
+    bread.sub_recipes.append(RecipeSubRecipe(sub_recipe=dough, quantity=1))
+    db.add_all([flour, dough, bread])
+    db.flush()
+    db.add(Product(user_id=user.id, name=f"{prefix}食パン", recipe_id=bread.id))
+    db.add(InventoryBalance(material_id=flour.id, user_id=user.id, quantity=5000))
+    db.commit()
+    db.close()
+
+
+def count(engine, model, user_id):
+    with engine.connect() as connection:
+        return connection.scalar(select(func.count()).select_from(model).where(model.user_id == user_id))
+
+
+def test_store_data_is_routed_to_its_shard(sharded):
+    """店舗のデータはシャードに、ユーザーはディレクトリに読み書きされること"""
+    factory, directory, registry = sharded
+    db = factory()
+    first = register(db, "store-1")
+    second = register(db, "store-2")
+    # 店舗数の少ないシャードから順に割り当てる
+    assert (first.shard_key, second.shard_key) == ("a", "b")
+
+    add_store_data(factory, first, "A")
+    assert count(registry.engine("a"), Material, first.id) == 1
+    assert count(directory, Material, first.id) == 0
+
+    # シャードのユーザー行は外部キーのための仮の行 (認証情報は写さない)
+    with registry.engine("a").connect() as connection:
+        copy = connection.execute(select(User.__table__).where(User.__table__.c.id == first.id)).one()
+    assert (copy.email, copy.hashed_password, copy.is_active) == (f"shard-user-{first.id}@invalid", "!", False)
+
+    tenant = factory()
+    tenant.info["shard"] = first.shard_key
+    assert tenant.scalars(select(Material.name)).all() == ["A小麦粉"]
+    # ユーザーはディレクトリから読む (シャードには外部キー用の仮の行しかない)
+    assert tenant.scalar(select(func.count(User.id))) == 2
+    tenant.close()
+    db.close()
+
+
+def test_move_store_keeps_ids(sharded):
+    """店舗を移動しても ID が変わらず、移動先に同じ ID の行があれば移動を断ること"""
+    factory, directory, registry = sharded
+    db = factory()
+    first = register(db, "store-1")
+    second = register(db, "store-2")
+    add_store_data(factory, first, "A")
+    with registry.engine("a").connect() as connection:
+        ids = {name: id for id, name in connection.execute(select(Recipe.id, Recipe.name))}
+        material_id = connection.scalar(select(Material.id))
+
+    copied = move_store(db, first, "b")
+    assert copied["materials"] == 1
+    assert copied["recipe_sub_recipes"] == 1
+    assert db.get(User, first.id).shard_key == "b"
+    assert count(registry.engine("a"), Recipe, first.id) == 0
+
+    tenant = factory()
+    tenant.info["shard"] = "b"
+    bread = tenant.get(Recipe, ids["A食パン"])
+    dough = bread.sub_recipes[0].sub_recipe
+    assert dough.id == ids["A生地"]
+    assert dough.recipe_materials[0].material.id == material_id
+    product = tenant.scalars(select(Product).where(Product.user_id == first.id)).one()
+    assert product.recipe_id == bread.id
+    balance = tenant.scalars(select(InventoryBalance).where(InventoryBalance.user_id == first.id)).one()
+    assert balance.material_id == material_id
+    tenant.close()
+
+    # 移動先では移動した行の ID の次から採番される
+    add_store_data(factory, second, "B")
+    assert count(registry.engine("b"), Material, second.id) == 1
+
+    # ディレクトリにいる店舗は空いているシャードに移し、偏ったシャードからも1店舗戻す
+    third = User(store_id="store-3", email="store-3@example.com", hashed_password="x", store_name="3")
+    db.add(third)
+    db.commit()
+    plan = rebalance_plan(db)
+    assert (third.id, None, "a") in plan
+    assert sorted((source or "", target) for _, source, target in plan) == [("", "a"), ("b", "a")]
+
+    # 空になったシャードでは ID が 1 から採番され、移動先の行と重なるため移動できない
+    fourth = register(db, "store-4")
+    assert fourth.shard_key == "a"
+    add_store_data(factory, fourth, "D")
+    with pytest.raises(ValueError):
+        move_store(db, fourth, "b")
+    fourth = db.get(User, fourth.id)
+    assert (fourth.shard_key, fourth.shard_moving) == ("a", False)
+    assert count(registry.engine("a"), Material, fourth.id) == 1
+    assert count(registry.engine("b"), Material, fourth.id) == 0
+    db.close()
+
+
+def test_move_store_aborts_when_source_changes(sharded, monkeypatch):
+    """移動中にコピー元へ書き込まれた場合は、移動を中止してコピー元に残すこと"""
+    factory, directory, registry = sharded
+    db = factory()
+    user = register(db, "store-1")
+    add_store_data(factory, user, "A")
+
+    copy_store_rows = stores.copy_store_rows
+
+    def copy_then_write(source, target, user_id):
+        copied = copy_store_rows(source, target, user_id)
+        # フラグを設定する前に始まっていたリクエストの書き込み
+        with registry.engine("a").begin() as connection:
+            connection.execute(Material.__table__.update().where(Material.user_id == user_id).values(unit_price=0.5))
+        return copied
+
+    monkeypatch.setattr(stores, "copy_store_rows", copy_then_write)
+    with pytest.raises(ValueError):
+        move_store(db, user, "b")
+
+    user = db.get(User, user.id)
+    assert (user.shard_key, user.shard_moving) == ("a", False)
+    assert count(registry.engine("a"), Material, user.id) == 1
+    assert count(registry.engine("b"), Material, user.id) == 0
+    db.close()
+
+
+def test_plan_rebalance_moves_until_balanced():
+    placements = {1: "a", 2: "a", 3: "a", 4: "b", 5: None}
+    weights = {1: 50, 2: 30, 3: 20, 4: 10, 5: 5}
+    plan = plan_rebalance(placements, weights, ["a", "b"])
+    loads = {"a": 0, "b": 0}
+    final = dict(placements)
+    for user_id, _, target in plan:
+        final[user_id] = target
+    for user_id, key in final.items():
+        loads[key] += weights[user_id]
+    assert loads == {"a": 55, "b": 60} or loads == {"a": 60, "b": 55}
+    assert final[5] is not None